@@ -0,0 +1,256 @@
+"""
+分布式 hyperopt：一个协调者 + 任意多个工作进程，通过 SQLite 工作队列（user_data/hyperopts/work_queue.py）协作
+
+freqtrade hyperopt 只能在一个 joblib 进程池里并行。这里把一次 hyperopt 拆开：
+- 协调者就是 freqtrade 的 Hyperopt（持有 hyperopt.lock、optuna study，输出、.fthypt、参数导出都不变），
+  只是每一轮 ask 得到的 -j 个参数组合不再交给本机进程池，而是放进队列，等工作进程把结果送回
+- 协调者计算一次指标后把数据写到 hyperopt_results/hyperopt_tickerdata.pkl，
+  工作进程按协调者记录的命令行参数生成同样的配置，每个 epoch 以 mmap 方式读取这份数据，不再各自计算指标
+- 工作进程可以在运行中随时加入或退出（包括其他 docker compose 服务）；
+  被杀掉的工作进程领取的任务超过 lease 秒没有心跳会被重新领取
+
+每一轮的参数组合只取决于 random-state 和 -j，与工作进程的数量无关：
+同样的 --random-state 和 -j 与本机 freqtrade hyperopt 得到相同的搜索路径。
+-j 建议设为工作进程数 × --batch 的整数倍，每一轮要等最慢的任务完成。
+
+用法（项目根目录；工作进程需要能访问同一个 user_data 目录）：
+    # 协调者：-- 之后是完整的 freqtrade hyperopt 参数
+    python scripts/distributed_hyperopt.py coordinator --batch 2 -- \\
+        hyperopt --config user_data/config_double_ma.json --strategy DoubleMAStrategy \\
+        --hyperopt-loss DoubleMAHyperOptLoss --spaces buy sell -e 500 -j 16
+    # 工作进程：可以在协调者之前或之后启动，参加当前（或下一次）运行，结束后自动退出
+    python scripts/distributed_hyperopt.py worker
+    # docker compose：见 docker-compose.yml 中的 hyperopt-worker 服务
+    docker compose --profile hyperopt up -d --scale hyperopt-worker=4
+    docker compose run --rm hyperopt-worker coordinator -- hyperopt --config ...
+"""
+import argparse
+import logging
+import sys
+import threading
+import time
+import traceback
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+import rapidjson
+from filelock import FileLock, Timeout
+
+from freqtrade.exceptions import OperationalException
+from freqtrade.loggers import setup_logging_pre
+from freqtrade.optimize.hyperopt import Hyperopt
+from freqtrade.optimize.hyperopt.hyperopt_optimizer import HyperOptimizer
+from freqtrade.optimize.hyperopt_tools import hyperopt_serializer
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "user_data" / "hyperopts"))
+
+from hyperopt_config import load_config  # noqa: E402
+from work_queue import WorkQueue, worker_name  # noqa: E402
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE = Path("user_data") / "hyperopt_results" / "hyperopt_queue.sqlite"
+# 与 freqtrade 写 .fthypt 时相同
+NUMBER_MODE = rapidjson.NM_NATIVE | rapidjson.NM_NAN
+
+
+class QueuedHyperopt(Hyperopt):
+    """
+    freqtrade 的 Hyperopt，每一轮的回测交给工作队列
+    """
+
+    def __init__(self, config: dict[str, Any], queue: WorkQueue, batch: int, poll: float) -> None:
+        if config.get("analyze_per_epoch"):
+            raise OperationalException("--analyze-per-epoch is not supported by distributed hyperopt")
+        super().__init__(config)
+        self.queue = queue
+        self.batch = batch
+        self.poll = poll
+        self.published = False
+
+    def publish(self) -> None:
+        """
+        数据准备好之后，记录工作进程需要的信息并允许它们领取任务
+        """
+        hyperopter = self.hyperopter
+        self.queue.set_meta(
+            data_file=str(self.data_pickle_file.relative_to(self.config["user_data_dir"])),
+            min_date=hyperopter.min_date.isoformat(),
+            max_date=hyperopter.max_date.isoformat(),
+            market_change=hyperopter.market_change,
+            batch=self.batch,
+            lease=self.queue.lease,
+            status="running",
+        )
+        self.published = True
+        logger.info(f"Work queue {self.queue.path} is open for workers")
+
+    def run_optimizer_parallel(self, parallel, asked: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """
+        把这一轮的参数组合放进队列，按原顺序返回工作进程送回的结果
+        """
+        if not self.published:
+            self.publish()
+        ids = self.queue.put(asked)
+        results: dict[int, dict[str, Any]] = {}
+        waiting_since = time.monotonic()
+        while len(results) < len(ids):
+            done, failed = self.queue.collect()
+            if failed:
+                raise OperationalException(f"Backtest failed in a worker:\n{failed[0][1]}")
+            for task_id, result in done:
+                results[task_id] = rapidjson.loads(result, number_mode=NUMBER_MODE)
+            if done:
+                waiting_since = time.monotonic()
+            elif time.monotonic() - waiting_since > self.queue.lease and not self.queue.workers():
+                logger.info(
+                    "No active workers, waiting. Start one with `distributed_hyperopt.py worker`."
+                )
+                waiting_since = time.monotonic()
+            if len(results) < len(ids):
+                time.sleep(self.poll)
+        return [results[task_id] for task_id in ids]
+
+    def start(self) -> None:
+        try:
+            super().start()
+        finally:
+            self.queue.cancel()
+            self.queue.set_meta(status="finished")
+
+
+def coordinator(args: argparse.Namespace) -> None:
+    config = load_config(args.hyperopt_args)
+    queue = WorkQueue(args.queue, args.lease)
+    lock = FileLock(Hyperopt.get_lock_filename(config))
+    try:
+        with lock.acquire(timeout=1):
+            logging.getLogger("filelock").setLevel(logging.WARNING)
+            queue.reset(
+                run=datetime.now().isoformat(), args=args.hyperopt_args, status="starting"
+            )
+            QueuedHyperopt(config, queue, args.batch, args.poll).start()
+    except Timeout:
+        logger.info("Another running instance of freqtrade Hyperopt detected. Quitting now.")
+    finally:
+        queue.close()
+
+
+class Heartbeat(threading.Thread):
+    """
+    回测期间定时刷新心跳（单个回测可能比 lease 还长）；SQLite 连接不能跨线程，单独打开一个
+    """
+
+    def __init__(self, path: Path, lease: float, worker: str) -> None:
+        super().__init__(daemon=True)
+        self.path = path
+        self.lease = lease
+        self.worker = worker
+        self.stopped = threading.Event()
+
+    def run(self) -> None:
+        queue = WorkQueue(self.path, self.lease)
+        while not self.stopped.wait(self.lease / 3):
+            queue.heartbeat(self.worker)
+        queue.close()
+
+
+def evaluate(queue: WorkQueue, run: str, poll: float) -> None:
+    """
+    参加一次运行：按协调者的参数生成配置，领取、回测任务直到运行结束
+    """
+    name = worker_name()
+    config = load_config(queue.meta("args"))
+    hyperopter = HyperOptimizer(config, config["user_data_dir"] / queue.meta("data_file"))
+    hyperopter.init_spaces()
+    # 与协调者的 prepare_hyperopt_data 一样读取K线：回测需要由此得到的价格精度和 timeframe_detail 数据；
+    # 指标不再计算，直接读取协调者保存的数据
+    hyperopter.backtesting.load_bt_data()
+    hyperopter.min_date = datetime.fromisoformat(queue.meta("min_date"))
+    hyperopter.max_date = datetime.fromisoformat(queue.meta("max_date"))
+    hyperopter.market_change = queue.meta("market_change")
+    batch = queue.meta("batch")
+    # 与协调者使用相同的 lease
+    queue.lease = queue.meta("lease")
+    logger.info(f"Worker {name} joined run {run}")
+
+    heartbeat = Heartbeat(queue.path, queue.lease, name)
+    heartbeat.start()
+    evaluated = 0
+    try:
+        while True:
+            tasks = queue.claim(name, batch, run)
+            if not tasks:
+                if queue.meta("run") != run or queue.meta("status") != "running":
+                    break
+                time.sleep(poll)
+                continue
+            for task_id, params in tasks:
+                try:
+                    result = hyperopter.generate_optimizer(params)
+                except Exception:
+                    queue.fail(task_id, name, traceback.format_exc())
+                    raise
+                queue.complete(
+                    task_id,
+                    name,
+                    rapidjson.dumps(result, default=hyperopt_serializer, number_mode=NUMBER_MODE),
+                )
+                evaluated += 1
+    finally:
+        heartbeat.stopped.set()
+        queue.leave(name)
+    logger.info(f"Worker {name} evaluated {evaluated} epochs of run {run}")
+
+
+def worker(args: argparse.Namespace) -> None:
+    queue = WorkQueue(args.queue)
+    # 启动时队列中已结束的运行不再参加，等待下一次运行
+    finished = queue.meta("run") if queue.meta("status") == "finished" else None
+    try:
+        while True:
+            run = queue.meta("run")
+            # 等协调者准备好数据
+            if queue.meta("status") != "running" or run == finished:
+                time.sleep(args.poll)
+                continue
+            evaluate(queue, run, args.poll)
+            finished = run
+            if not args.keep_running:
+                break
+    finally:
+        queue.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="分布式 hyperopt")
+    parser.add_argument("--queue", type=Path, default=DEFAULT_QUEUE, help="队列文件")
+    parser.add_argument("--poll", type=float, default=0.2, help="没有任务或结果时的等待间隔（秒）")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    coordinate = commands.add_parser("coordinator", help="运行 hyperopt，回测交给工作进程")
+    coordinate.add_argument("--batch", type=int, default=1, help="工作进程每次领取的任务数")
+    coordinate.add_argument("--lease", type=float, default=60,
+                            help="领取的任务超过多少秒没有心跳就交给其他工作进程")
+    coordinate.add_argument("hyperopt_args", nargs=argparse.REMAINDER,
+                            help="-- 之后是 freqtrade hyperopt 的参数")
+
+    work = commands.add_parser("worker", help="领取并回测队列中的参数组合")
+    work.add_argument("--keep-running", action="store_true",
+                      help="运行结束后继续等待下一次运行（docker compose 服务）")
+
+    args = parser.parse_args()
+    setup_logging_pre()
+    if args.command == "coordinator":
+        if args.hyperopt_args[:1] == ["--"]:
+            args.hyperopt_args = args.hyperopt_args[1:]
+        coordinator(args)
+    else:
+        worker(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""
+DoubleMAStrategy 参数网格扫描
+
+不再逐个 epoch 随机采样 + 完整回测，而是对整块参数空间一次性求值：
+1. 每个交易对只计算一次均线库（所有候选周期）
+2. 把均线列广播成 (均线组合, 成交量倍数, 趋势周期, K线) 的信号张量
+3. 用 vector_backtest 对所有组合同时撮合交易
+4. 用 DoubleMAHyperOptLoss.hyperopt_loss_batch 一次给整块组合打分并排序
+
+默认只按买卖信号撮合；加上 --exit-rules 时还会按 DoubleMAStrategy.json（或策略默认值）中的
+minimal_roi / stoploss / trailing 平仓。结果用于粗筛出有希望的参数区域，
+再用 freqtrade hyperopt / backtesting 精调。
+
+用法（项目根目录）：
+    python scripts/double_ma_sweep.py --config user_data/config_double_ma.json \\
+        --datadir user_data/data/binance --timerange 20240101-20250101
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import talib
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT / "user_data" / "strategies"), str(ROOT / "user_data" / "hyperopts")]
+
+from freqtrade.configuration import TimeRange  # noqa: E402
+from freqtrade.configuration.load_config import load_config_file  # noqa: E402
+from freqtrade.constants import DRY_RUN_WALLET, UNLIMITED_STAKE_AMOUNT  # noqa: E402
+from freqtrade.data.history import load_data  # noqa: E402
+
+from DoubleMAHyperOptLoss import DoubleMAHyperOptLoss  # noqa: E402
+from DoubleMAStrategy import DoubleMAStrategy  # noqa: E402
+from indicator_kernels import build_ma_bank, double_ma_signals, ma_column  # noqa: E402
+from vector_backtest import (  # noqa: E402
+    ExitRules, concat_trade_tables, rule_trades, signal_exit_reasons,
+    signal_trades, split_by_row, trade_table,
+)
+
+
+# 每个信号块最多包含的 (组合 × K线) 元素数量，控制内存占用
+BLOCK_ELEMENTS = 20_000_000
+
+
+def parameter_grid(args) -> dict[str, list]:
+    """
+    根据策略中的参数范围和命令行步长生成各参数的取值
+    """
+    s = DoubleMAStrategy
+    volume = np.arange(s.min_volume_multiplier.low, s.min_volume_multiplier.high + 1e-9,
+                       args.volume_step)
+    return {
+        "ma_type": list(args.ma_types or s.ma_type.opt_range),
+        "fast_ma_period": list(range(s.fast_ma_period.low, s.fast_ma_period.high + 1, args.fast_step)),
+        "slow_ma_period": list(range(s.slow_ma_period.low, s.slow_ma_period.high + 1, args.slow_step)),
+        "min_volume_multiplier": [round(float(v), s.min_volume_multiplier._decimals) for v in volume],
+        "trend_filter_period": list(range(s.trend_filter_period.low, s.trend_filter_period.high + 1,
+                                          args.trend_step)),
+    }
+
+
+def sweep(data: dict[str, pd.DataFrame], starts: dict[str, int], grid: dict[str, list],
+          fee: float, rules: ExitRules | None = None):
+    """
+    对整个参数网格撮合交易
+
+    rules 为 None 时只按信号撮合，否则同时应用其中的 ROI / 止损 / 追踪止损
+
+    每次产出一个参数块：(params, table, bounds)。params 为该块每一行的参数字典，
+    table 为所有交易对合并后的交易表，第 r 行的交易位于 table[bounds[r]:bounds[r + 1]]
+    """
+    volumes = np.asarray(grid["min_volume_multiplier"], dtype=np.float64)
+    trends = grid["trend_filter_period"]
+
+    # 每个交易对只计算一次均线库
+    periods_by_type = {
+        ma_type: set(grid["fast_ma_period"]) | set(grid["slow_ma_period"])
+        for ma_type in grid["ma_type"]
+    }
+    periods_by_type.setdefault("EMA", set()).update(trends)
+    banks = {}
+    for pair, df in data.items():
+        values, columns = build_ma_bank(df["close"].to_numpy(), periods_by_type)
+        volume = df["volume"].to_numpy(dtype=np.float64)
+        # 成交量均线与 DoubleMAStrategy 相同（20 周期 SMA）
+        volume_sma = talib.SMA(volume, timeperiod=20)
+        banks[pair] = (values, {column: i for i, column in enumerate(columns)}, volume, volume_sma)
+
+    n = max(len(df) for df in data.values())
+    ma_pairs = [
+        (ma_type, fast, slow)
+        for ma_type in grid["ma_type"]
+        for fast in grid["fast_ma_period"]
+        for slow in grid["slow_ma_period"]
+        # 快线周期必须小于慢线周期
+        if fast < slow
+    ]
+    block = max(1, BLOCK_ELEMENTS // (len(volumes) * len(trends) * n))
+    for i in range(0, len(ma_pairs), block):
+        chunk = ma_pairs[i:i + block]
+        tables = []
+        for pair, df in data.items():
+            values, rows, volume, volume_sma = banks[pair]
+            fast = values[[rows[ma_column(t, f)] for t, f, _ in chunk]][:, None, None, :]
+            slow = values[[rows[ma_column(t, s)] for t, _, s in chunk]][:, None, None, :]
+            trend = values[[rows[ma_column("EMA", p)] for p in trends]][None, None, :, :]
+            close = df["close"].to_numpy(dtype=np.float64)
+            enter, exit_ = double_ma_signals(
+                close, volume, fast, slow, trend, volume_sma, volumes[None, :, None, None],
+            )
+            enter = enter.reshape(-1, len(close))
+            exit_ = exit_.reshape(-1, len(close))
+            dates = df["date"].values
+            open_ = df["open"].to_numpy(dtype=np.float64)
+            if rules is None:
+                trade_rows, entry_idx, exit_idx = signal_trades(enter, exit_, starts[pair])
+                reason = signal_exit_reasons(exit_, trade_rows, exit_idx)
+                close_rate = None
+            else:
+                trade_rows, entry_idx, exit_idx, close_rate, reason = rule_trades(
+                    enter, exit_, dates, open_, df["high"].to_numpy(dtype=np.float64),
+                    df["low"].to_numpy(dtype=np.float64), rules, fee, starts[pair],
+                )
+            tables.append(trade_table(pair, dates, open_, trade_rows, entry_idx, exit_idx,
+                                      reason, fee, close_rate))
+
+        params = [
+            {
+                "ma_type": ma_type, "fast_ma_period": fast, "slow_ma_period": slow,
+                "min_volume_multiplier": float(v), "trend_filter_period": trend,
+            }
+            for ma_type, fast, slow in chunk
+            for v in volumes
+            for trend in trends
+        ]
+        table = concat_trade_tables(tables)
+        yield params, table, split_by_row(table, len(params))
+
+
+def resolve_stake_amount(config: dict) -> float:
+    """
+    每笔交易的投入金额；"unlimited" 按 freqtrade 回测开始时的算法换算：
+    可用资金（available_capital，或 dry_run_wallet × tradable_balance_ratio）/ max_open_trades
+    """
+    stake_amount = config["stake_amount"]
+    if stake_amount != UNLIMITED_STAKE_AMOUNT:
+        return float(stake_amount)
+
+    max_open_trades = config.get("max_open_trades", -1)
+    if max_open_trades is None or max_open_trades <= 0 or max_open_trades == float("inf"):
+        sys.exit('stake_amount 为 "unlimited" 时需要在配置中设置正的 max_open_trades')
+    if "available_capital" in config:
+        capital = float(config["available_capital"])
+    else:
+        wallet = config.get("dry_run_wallet", DRY_RUN_WALLET)
+        if isinstance(wallet, dict):
+            wallet = wallet.get(config["stake_currency"], 0)
+        capital = float(wallet) * config.get("tradable_balance_ratio", 0.99)
+    return capital / max_open_trades
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="DoubleMAStrategy 参数网格扫描")
+    parser.add_argument("--config", default=str(ROOT / "user_data" / "config_double_ma.json"))
+    parser.add_argument("--datadir", default=str(ROOT / "user_data" / "data" / "binance"))
+    parser.add_argument("--timerange", default=None, help="例如 20240101-20250101")
+    parser.add_argument("--pairs", nargs="+", help="默认使用配置文件中的 pair_whitelist")
+    parser.add_argument("--fee", type=float, default=0.001, help="单边手续费率")
+    parser.add_argument("--ma-types", nargs="+", choices=["SMA", "EMA", "WMA"])
+    parser.add_argument("--fast-step", type=int, default=1)
+    parser.add_argument("--slow-step", type=int, default=1)
+    parser.add_argument("--volume-step", type=float, default=0.5)
+    parser.add_argument("--trend-step", type=int, default=50)
+    parser.add_argument("--exit-rules", action="store_true",
+                        help="按策略参数文件中的 minimal_roi / stoploss / trailing 平仓")
+    parser.add_argument("--params-file",
+                        default=str(ROOT / "user_data" / "strategies" / "DoubleMAStrategy.json"))
+    parser.add_argument("--top", type=int, default=20, help="输出前多少名")
+    parser.add_argument("--export", help="把所有组合的结果保存为 CSV")
+    args = parser.parse_args()
+
+    config = load_config_file(args.config)
+    pairs = args.pairs or config["exchange"]["pair_whitelist"]
+    timeframe = config.get("timeframe", DoubleMAStrategy.timeframe)
+    stake_amount = resolve_stake_amount(config)
+    timerange = TimeRange.parse_timerange(args.timerange)
+    startup = DoubleMAStrategy.startup_candle_count
+
+    data = load_data(Path(args.datadir), timeframe, pairs, timerange=timerange,
+                     startup_candles=startup, data_format=config.get("dataformat_ohlcv", "feather"))
+    data = {pair: df for pair, df in data.items() if len(df) > startup + 2}
+    if not data:
+        sys.exit("没有可用的K线数据")
+
+    # 回测区间：与 freqtrade 相同，去掉启动K线
+    starts = {}
+    for pair, df in data.items():
+        if timerange.startts:
+            starts[pair] = int(np.searchsorted(df["date"].values,
+                                               np.datetime64(timerange.startts, "s")))
+        else:
+            starts[pair] = startup
+    min_date = min(df["date"].iloc[starts[pair]] for pair, df in data.items())
+    max_date = max(df["date"].iloc[-1] for df in data.values())
+
+    rules = None
+    if args.exit_rules:
+        params = {}
+        if Path(args.params_file).is_file():
+            params = json.loads(Path(args.params_file).read_text())["params"]
+        rules = ExitRules.from_strategy(DoubleMAStrategy, params)
+
+    grid = parameter_grid(args)
+    started = time.perf_counter()
+    records = []
+    evaluated = 0
+    for params, table, bounds in sweep(data, starts, grid, args.fee, rules):
+        # 整块参数的交易表一次打分：row 列就是每笔交易所属的组合
+        duration = (table["close_date"] - table["open_date"]).astype("timedelta64[m]")
+        combos = pd.DataFrame(params)
+        losses = DoubleMAHyperOptLoss.hyperopt_loss_batch(
+            table["profit_ratio"], duration.astype(np.int64), table["row"], len(params),
+            min_date, max_date, config, params=combos,
+        )
+        profit_ratio_sum = np.bincount(table["row"], weights=table["profit_ratio"],
+                                       minlength=len(params))
+        records.append(combos.assign(
+            loss=losses,
+            trades=np.diff(bounds),
+            profit_ratio_sum=profit_ratio_sum,
+            # 与 results_frame 相同：开仓价值 = 投入金额 * (1 + 手续费)
+            profit_abs=profit_ratio_sum * stake_amount * (1 + args.fee),
+        ))
+        evaluated += len(params)
+        print(f"\r已评估 {evaluated} 个组合 ({time.perf_counter() - started:.1f}s)",
+              end="", flush=True)
+    print()
+
+    ranking = pd.concat(records).sort_values("loss", kind="stable").reset_index(drop=True)
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(ranking.head(args.top).to_string())
+    if args.export:
+        ranking.to_csv(args.export, index=False)
+        print(f"结果已保存到 {args.export}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Hyperopt epoch 索引库命令行
+
+把 user_data/hyperopt_results 中的 .fthypt 同步到 epoch_store 的 SQLite 库，
+之后按损失、交易数、盈亏和参数值查询，不需要加载交易明细。
+
+用法（项目根目录）：
+    # 同步（只读取上次同步之后新增的行）；hyperopt 运行期间每 10 秒同步一次
+    python scripts/hyperopt_epochs.py sync
+    python scripts/hyperopt_epochs.py sync --follow 10
+    # 每个 run 的 epoch 数和最优损失
+    python scripts/hyperopt_epochs.py runs
+    # 所有 run 中损失最小的 20 个 epoch，至少 50 笔交易、盈利、使用 EMA
+    python scripts/hyperopt_epochs.py list --top 20 --min-trades 50 --profitable --param ma_type=EMA
+    # 一个 epoch 的参数（可以直接写入策略的 JSON 参数文件）
+    python scripts/hyperopt_epochs.py show 2025-09-01_12-00-00 57
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "user_data" / "hyperopts"))
+
+from epoch_store import EpochStore  # noqa: E402
+
+
+RESULTS_DIR = ROOT / "user_data" / "hyperopt_results"
+
+
+def _param(text: str) -> tuple[str, object]:
+    name, _, value = text.partition("=")
+    try:
+        return name, json.loads(value)
+    except ValueError:
+        return name, value
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Hyperopt epoch 索引库")
+    parser.add_argument("--results", type=Path, default=RESULTS_DIR, help=".fthypt 所在目录")
+    parser.add_argument("--db", type=Path, help="SQLite 文件，默认为结果目录下的 epochs.sqlite")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    sync = commands.add_parser("sync", help="同步新增的 epoch")
+    sync.add_argument("--follow", type=float, metavar="SECONDS", help="每隔 SECONDS 秒同步一次")
+
+    commands.add_parser("runs", help="每个 run 的汇总")
+
+    listing = commands.add_parser("list", help="按损失列出 epoch")
+    listing.add_argument("--top", type=int, default=10)
+    listing.add_argument("--run", help="run_id 或结果文件名的一部分")
+    listing.add_argument("--strategy")
+    listing.add_argument("--min-trades", type=int)
+    listing.add_argument("--max-trades", type=int)
+    listing.add_argument("--max-loss", type=float)
+    listing.add_argument("--profitable", action="store_true")
+    listing.add_argument("--param", type=_param, action="append", default=[],
+                         metavar="NAME=VALUE", help="参数取值相等，可重复")
+
+    show = commands.add_parser("show", help="一个 epoch 的参数和指标")
+    show.add_argument("run", help="run_id 或结果文件名的一部分")
+    show.add_argument("epoch", type=int)
+
+    args = parser.parse_args()
+    store = EpochStore(args.db or args.results / "epochs.sqlite")
+
+    if args.command == "sync":
+        while True:
+            started = time.perf_counter()
+            added = store.sync(args.results)
+            print(f"同步了 {added} 个 epoch，用时 {time.perf_counter() - started:.2f} 秒")
+            if not args.follow:
+                break
+            time.sleep(args.follow)
+
+    elif args.command == "runs":
+        print(store.runs().to_string(index=False))
+
+    elif args.command == "list":
+        frame = store.query(
+            top=args.top, run=args.run, strategy=args.strategy,
+            min_trades=args.min_trades, max_trades=args.max_trades,
+            profitable=args.profitable, max_loss=args.max_loss, params=dict(args.param),
+        )
+        columns = ["file", "epoch", "loss", "total_trades", "profit_total", "winrate",
+                   "max_drawdown_account", "params"]
+        with pd.option_context("display.max_colwidth", None, "display.width", None):
+            print(frame[columns].to_string(index=False))
+
+    elif args.command == "show":
+        epoch = store.epoch(args.run, args.epoch)
+        if epoch is None:
+            sys.exit(f"没有找到 {args.run} 的 epoch {args.epoch}")
+        print(json.dumps(epoch, indent=2, ensure_ascii=False))
+
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
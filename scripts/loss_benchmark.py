@@ -0,0 +1,237 @@
+"""
+Hyperopt 损失函数基准测试
+
+在 10 ~ 1,000,000 笔合成交易上给损失函数计时并记录内存峰值，结果可以保存为基线 JSON；
+之后再次运行时与基线比较，耗时或内存超过阈值就以非零状态退出，可以放进 CI 或提交前检查。
+
+合成的 results 与 freqtrade 回测结果的列相同（pair、open_date、close_date、profit_ratio、
+profit_abs、trade_duration、exit_reason 等），分布大致参考真实回测：
+- 持仓时间服从对数正态分布（中位数约 10 小时），按时间周期取整
+- 约 45% 的交易盈利，盈亏幅度服从指数分布，亏损在止损处截断
+- 交易在一年内均匀开仓，按平仓时间排序
+
+用法（项目根目录）：
+    # 生成基线（在同一台机器上比较才有意义）
+    python scripts/loss_benchmark.py --save user_data/benchmarks/loss_baseline.json
+    # 修改损失函数后与基线比较
+    python scripts/loss_benchmark.py --baseline user_data/benchmarks/loss_baseline.json
+"""
+import argparse
+import json
+import platform
+import sys
+import timeit
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from freqtrade.resolvers.hyperopt_resolver import HyperOptLossResolver
+
+
+ROOT = Path(__file__).resolve().parent.parent
+# 损失函数先 import helper_paths（user_data/strategies）
+sys.path.insert(0, str(ROOT / "user_data" / "strategies"))
+
+
+DEFAULT_LOSSES = ["DoubleMAHyperOptLoss", "SampleHyperOptLoss"]
+DEFAULT_SIZES = [10, 100, 1_000, 10_000, 100_000, 1_000_000]
+PAIRS = [f"PAIR{i}/USDT" for i in range(20)]
+STAKE_AMOUNT = 100.0
+STARTING_BALANCE = 1000.0
+FEE = 0.001
+STOPLOSS = -0.1
+MIN_DATE = datetime(2024, 1, 1, tzinfo=timezone.utc)
+MAX_DATE = MIN_DATE + timedelta(days=365)
+
+
+def synthetic_results(size: int, timeframe_minutes: int = 60, seed: int = 1) -> pd.DataFrame:
+    """
+    生成 size 笔交易的 results，同样的参数总是得到同样的数据
+    """
+    rng = np.random.default_rng(seed)
+    span_minutes = int((MAX_DATE - MIN_DATE).total_seconds() // 60)
+    duration = np.maximum(
+        np.round(rng.lognormal(np.log(600), 1.0, size) / timeframe_minutes), 1
+    ).astype(np.int64) * timeframe_minutes
+    open_offset = rng.integers(0, span_minutes, size)
+    open_date = pd.Timestamp(MIN_DATE) + pd.to_timedelta(open_offset, unit="m")
+    close_date = open_date + pd.to_timedelta(duration, unit="m")
+
+    win = rng.random(size) < 0.45
+    profit_ratio = np.where(
+        win,
+        rng.exponential(0.025, size),
+        np.maximum(-rng.exponential(0.02, size), STOPLOSS),
+    ) - 2 * FEE
+    exit_reason = np.where(
+        profit_ratio <= STOPLOSS - 2 * FEE, "stop_loss", np.where(win, "roi", "exit_signal")
+    )
+    open_rate = rng.uniform(1, 100, size)
+
+    results = pd.DataFrame({
+        "pair": np.asarray(PAIRS, dtype=object)[rng.integers(0, len(PAIRS), size)],
+        "open_date": open_date,
+        "close_date": close_date,
+        "open_rate": open_rate,
+        "close_rate": open_rate * (1 + profit_ratio + 2 * FEE),
+        "fee_open": FEE,
+        "fee_close": FEE,
+        "trade_duration": duration,
+        "profit_ratio": profit_ratio,
+        "profit_abs": profit_ratio * STAKE_AMOUNT,
+        "exit_reason": exit_reason,
+        "is_short": False,
+    })
+    return results.sort_values(["close_date", "pair"], kind="stable").reset_index(drop=True)
+
+
+def load_loss(name: str, config: dict):
+    return HyperOptLossResolver.load_hyperoptloss({**config, "hyperopt_loss": name})
+
+
+def loss_call(loss, results: pd.DataFrame, config: dict):
+    """
+    与 freqtrade hyperopt 相同的调用方式
+    """
+    backtest_stats = {
+        "profit_total": results["profit_abs"].sum() / STARTING_BALANCE,
+        "total_trades": len(results),
+    }
+
+    def call():
+        return loss.hyperopt_loss_function(
+            results=results,
+            trade_count=len(results),
+            min_date=MIN_DATE,
+            max_date=MAX_DATE,
+            config=config,
+            processed={},
+            backtest_stats=backtest_stats,
+            starting_balance=STARTING_BALANCE,
+        )
+
+    return call
+
+
+def measure(call, repeat: int) -> dict:
+    """
+    耗时取多次重复中最快的一次；内存峰值单独用 tracemalloc 跑一次
+    （tracemalloc 会拖慢计算，不能和计时同时进行）。内存在计时之后测量，
+    反映的是 hyperopt 中反复调用时的稳态（loss_kernels 的暂存数组已分配好）
+    """
+    timer = timeit.Timer(call)
+    number, _ = timer.autorange()
+    seconds = min(timer.repeat(repeat, number)) / number
+    tracemalloc.start()
+    try:
+        call()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"time_us": round(seconds * 1e6, 2), "peak_bytes": peak}
+
+
+def compare(current: dict, baseline: dict, threshold: float, memory_threshold: float,
+            min_delta_us: float, min_delta_bytes: int) -> list[str]:
+    """
+    与基线比较，返回超过阈值的项；基线中没有的项不比较
+    """
+    regressions = []
+    for loss, sizes in current.items():
+        for size, values in sizes.items():
+            base = baseline.get(loss, {}).get(size)
+            if base is None:
+                continue
+            delta_us = values["time_us"] - base["time_us"]
+            if values["time_us"] > base["time_us"] * (1 + threshold) and delta_us > min_delta_us:
+                regressions.append(
+                    f"{loss} @ {size} trades: {base['time_us']:.1f} -> {values['time_us']:.1f} us"
+                )
+            delta_bytes = values["peak_bytes"] - base["peak_bytes"]
+            if (values["peak_bytes"] > base["peak_bytes"] * (1 + memory_threshold)
+                    and delta_bytes > min_delta_bytes):
+                regressions.append(
+                    f"{loss} @ {size} trades: peak {base['peak_bytes']} -> {values['peak_bytes']} bytes"
+                )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Hyperopt 损失函数基准测试")
+    parser.add_argument("--losses", nargs="+", default=DEFAULT_LOSSES,
+                        help="损失函数类名（user_data/hyperopts 中的或 freqtrade 内置的）")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--timeframe", default="1h")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save", help="把结果保存为基线 JSON")
+    parser.add_argument("--baseline", help="与该基线 JSON 比较，超过阈值时退出码为 1")
+    parser.add_argument("--threshold", type=float, default=0.25, help="允许的耗时增幅")
+    parser.add_argument("--memory-threshold", type=float, default=0.25, help="允许的内存峰值增幅")
+    parser.add_argument("--min-delta-us", type=float, default=20,
+                        help="耗时增加少于该值（微秒）时视为噪声")
+    parser.add_argument("--min-delta-bytes", type=int, default=64 * 1024,
+                        help="内存峰值增加少于该值（字节）时视为噪声")
+    args = parser.parse_args()
+
+    config = {
+        "user_data_dir": ROOT / "user_data",
+        "hyperopt_path": str(ROOT / "user_data" / "hyperopts"),
+        "timeframe": args.timeframe,
+        "stake_currency": "USDT",
+        "stake_amount": STAKE_AMOUNT,
+        "dry_run_wallet": STARTING_BALANCE,
+        "strategy": "DoubleMAStrategy",
+    }
+    timeframe_minutes = int(pd.Timedelta(args.timeframe).total_seconds() // 60)
+    losses = {name: load_loss(name, config) for name in args.losses}
+
+    current: dict[str, dict[str, dict]] = {name: {} for name in losses}
+    rows = []
+    for size in args.sizes:
+        results = synthetic_results(size, timeframe_minutes, args.seed)
+        for name, loss in losses.items():
+            values = measure(loss_call(loss, results, config), args.repeat)
+            # JSON 的键只能是字符串
+            current[name][str(size)] = values
+            rows.append({"loss": name, "trades": size, **values})
+    table = pd.DataFrame(rows)
+    table["peak_kb"] = (table.pop("peak_bytes") / 1024).round(1)
+    print(table.to_string(index=False))
+
+    if args.save:
+        path = Path(args.save)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps({
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "machine": {
+                "platform": platform.platform(),
+                "processor": platform.processor() or platform.machine(),
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "pandas": pd.__version__,
+            },
+            "seed": args.seed,
+            "timeframe": args.timeframe,
+            "results": current,
+        }, indent=2))
+        print(f"基线已保存到 {path}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        if baseline.get("seed") != args.seed or baseline.get("timeframe") != args.timeframe:
+            sys.exit("基线的 seed / timeframe 与本次运行不同，无法比较")
+        regressions = compare(current, baseline["results"], args.threshold, args.memory_threshold,
+                              args.min_delta_us, args.min_delta_bytes)
+        if regressions:
+            print("\n超过阈值：")
+            print("\n".join(f"  {line}" for line in regressions))
+            sys.exit(1)
+        print(f"\n与基线 {args.baseline} 相比没有超过阈值的退化")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+对比 loss_kernels.trade_stats 与原来的 pandas 写法
+
+原来的损失函数对 results 逐项计算：sum、胜率、mean、cumsum、expanding().max()、
+相减后再求 min 和 mean、持仓时间 mean，每一步都会创建临时 Series。
+本脚本在 10² ~ 10⁶ 笔随机交易上分别计时两种写法，并检查结果一致。
+
+用法（项目根目录）：
+    python scripts/loss_kernel_benchmark.py --sizes 100 1000 10000 100000 1000000
+"""
+import argparse
+import sys
+import timeit
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "user_data" / "hyperopts"))
+
+from loss_kernels import trade_stats  # noqa: E402
+
+
+def pandas_stats(results: pd.DataFrame) -> dict[str, float]:
+    """
+    原 DoubleMAHyperOptLoss 中的 pandas 写法
+    """
+    total_profit = results["profit_ratio"].sum()
+    win_rate = (results["profit_ratio"] > 0).sum() / len(results)
+    avg_profit = results["profit_ratio"].mean()
+    cumulative_profit = results["profit_ratio"].cumsum()
+    peak = cumulative_profit.expanding().max()
+    drawdown = cumulative_profit - peak
+    return {
+        "total_profit": total_profit,
+        "avg_profit": avg_profit,
+        "win_rate": win_rate,
+        "max_drawdown": abs(drawdown.min()),
+        "avg_drawdown": abs(drawdown.mean()),
+        "avg_trade_duration": results["trade_duration"].mean(),
+    }
+
+
+def kernel_stats(results: pd.DataFrame) -> dict[str, float]:
+    return trade_stats(results["profit_ratio"].to_numpy(), results["trade_duration"].to_numpy())
+
+
+def best_time(func, *args, repeat: int = 5) -> float:
+    """
+    多次重复取最快的一次（秒/次）
+    """
+    timer = timeit.Timer(lambda: func(*args))
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="损失函数统计内核基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[100, 1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    rows = []
+    for size in args.sizes:
+        results = pd.DataFrame({
+            "profit_ratio": rng.normal(0.002, 0.03, size),
+            "trade_duration": rng.integers(5, 3000, size),
+        })
+        expected = pandas_stats(results)
+        actual = kernel_stats(results)
+        error = max(abs(expected[name] - actual[name]) for name in expected)
+        pandas_time = best_time(pandas_stats, results)
+        kernel_time = best_time(kernel_stats, results)
+        rows.append({
+            "trades": size,
+            "pandas_us": round(pandas_time * 1e6, 1),
+            "kernel_us": round(kernel_time * 1e6, 1),
+            "speedup": round(pandas_time / kernel_time, 1),
+            "max_abs_error": error,
+        })
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
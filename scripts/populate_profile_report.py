@@ -0,0 +1,76 @@
+"""
+合并并查看 populate_* 剖析报告
+
+开启 populate_profile 后，backtesting / hyperopt 的每个进程退出时会在报告目录下写出
+populate-<pid>.json 和 populate-<pid>.folded。本脚本把它们合并成一份，
+按总耗时列出最慢的阶段和指标列，并可导出合并后的折叠栈用于生成火焰图。
+
+用法（项目根目录）：
+    python scripts/populate_profile_report.py --directory user_data/populate_profile \\
+        --top 30 --folded merged.folded
+    flamegraph.pl merged.folded > populate.svg
+"""
+import argparse
+import json
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+import pandas as pd
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def load_reports(directory: Path) -> pd.DataFrame:
+    """
+    读取目录下所有 JSON 报告，返回每个 (策略, 阶段, 列) 一行的表；
+    列名为 None 的行是整个阶段的汇总
+    """
+    totals: dict[tuple, list] = defaultdict(lambda: [0, 0.0, 0])
+    for file in sorted(directory.glob("populate-*.json")):
+        for strategy, phases in json.loads(file.read_text()).items():
+            for phase, stats in phases.items():
+                for column, values in [(None, stats), *stats["columns"].items()]:
+                    entry = totals[(strategy, phase, column)]
+                    entry[0] += values["calls"]
+                    entry[1] += values["wall_ms"]
+                    entry[2] = max(entry[2], values["peak_bytes"])
+    return pd.DataFrame(
+        [(*key, *values) for key, values in totals.items()],
+        columns=["strategy", "phase", "column", "calls", "wall_ms", "peak_bytes"],
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="合并 populate_* 剖析报告")
+    parser.add_argument("--directory", default=str(ROOT / "user_data" / "populate_profile"))
+    parser.add_argument("--top", type=int, default=20, help="每个阶段输出前多少列")
+    parser.add_argument("--folded", help="把合并后的折叠栈保存到该文件")
+    args = parser.parse_args()
+
+    table = load_reports(Path(args.directory))
+    if table.empty:
+        sys.exit(f"{args.directory} 下没有剖析报告")
+    table["ms_per_call"] = table["wall_ms"] / table["calls"]
+
+    phases = table[table["column"].isna()].sort_values("wall_ms", ascending=False)
+    columns = table[table["column"].notna()].sort_values("wall_ms", ascending=False)
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(phases.drop(columns="column").to_string(index=False))
+        for (strategy, phase), group in columns.groupby(["strategy", "phase"], sort=False):
+            print(f"\n{strategy}.{phase}")
+            print(group.head(args.top).drop(columns=["strategy", "phase"]).to_string(index=False))
+
+    if args.folded:
+        lines = [
+            f"{row.strategy};{row.phase};{str(row.column).replace(';', ',').replace(' ', '_')} "
+            f"{round(row.wall_ms * 1000)}"
+            for row in columns.itertuples()
+        ]
+        Path(args.folded).write_text("\n".join(lines) + "\n")
+        print(f"\n折叠栈已保存到 {args.folded}")
+
+
+if __name__ == "__main__":
+    main()
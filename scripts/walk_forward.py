@@ -0,0 +1,302 @@
+"""
+Walk-forward 优化
+
+把 hyperopt 的时间范围等分成 train_size + windows 段，第 i 个窗口在第 i ~ i+train_size-1 段上
+运行 hyperopt（--anchored 时从第一段开始），再用最优参数回测紧随其后的第 i+train_size 段（样本外）。
+样本外各段首尾相接，拼成一条样本外资金曲线；同时用策略当前的参数（DoubleMAStrategy.json 或默认值）
+回测每个样本外段作为对照，检查当前参数是否过拟合。
+
+- K线只加载一次、指标只计算一次（整个时间范围），保存为 joblib 数据文件；
+  各窗口在 fork 出的进程中并行优化，共享已加载的数据。每个 epoch 回测前从数据文件读取指标：
+  策略在 bot_start 中调用 shared_data.install()（DoubleMAStrategy、SampleStrategy、ichiV1）时以 mmap 方式映射，
+  否则与 freqtrade hyperopt 一样每次反序列化一份副本
+- 窗口按日期截取数据，窗口开头的指标使用窗口之前的K线计算，与实盘一致
+- 每个窗口的 epoch 数、损失函数、优化空间与 freqtrade hyperopt 的参数相同；采样器由策略决定
+- 输出的参数与 freqtrade 一样取整：JSON 中保留 13 位小数，打印时保留 5 位
+- 需要 fork（Linux / macOS / docker）
+
+用法（项目根目录）：
+    python scripts/walk_forward.py --windows 4 --train-size 3 --jobs 4 -- \\
+        hyperopt --config user_data/config_double_ma.json --strategy DoubleMAStrategy \\
+        --hyperopt-loss DoubleMAHyperOptLoss --spaces buy -e 200 --timerange 20230101-20250101
+
+结果保存在 user_data/walk_forward_results/：
+- <策略>_<时间>.json：每个窗口的日期、最优参数、训练 / 样本外 / 当前参数的指标
+- <策略>_<时间>_equity.csv：按平仓时间拼接的样本外交易和资金曲线（params 列区分最优参数和当前参数）
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import sys
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any
+
+import pandas as pd
+from joblib import load
+
+from freqtrade.configuration import TimeRange
+from freqtrade.data.converter import trim_dataframes
+from freqtrade.data.metrics import calculate_market_change
+from freqtrade.exchange import timeframe_to_seconds
+from freqtrade.loggers import setup_logging_pre
+from freqtrade.misc import round_dict
+from freqtrade.optimize.hyperopt.hyperopt_optimizer import HyperOptimizer
+from freqtrade.util.dry_run_wallet import get_dry_run_wallet
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "user_data" / "hyperopts"))
+
+from hyperopt_config import load_config  # noqa: E402
+
+
+logger = logging.getLogger(__name__)
+
+# 汇总时保留的指标
+METRICS = ["loss", "total_trades", "profit_total", "profit_total_abs", "winrate",
+           "max_drawdown_account"]
+TRADE_COLUMNS = ["pair", "open_date", "close_date", "profit_ratio", "profit_abs"]
+
+# fork 之前由主进程准备好，各窗口进程继承
+_hyperopter: HyperOptimizer
+_current_params: dict[str, Any] | None
+_epochs: int
+_random_state: int
+
+
+@dataclass
+class Window:
+    index: int
+    train_start: datetime
+    train_end: datetime
+    test_start: datetime
+    test_end: datetime
+
+
+def split_windows(
+    min_date: datetime, max_date: datetime, windows: int, train_size: int, anchored: bool,
+    timeframe: str,
+) -> list[Window]:
+    """
+    把 [min_date, max_date) 等分成 train_size + windows 段，段边界对齐到K线；
+    每个窗口的结束时间不包含在窗口内
+    """
+    step = timedelta(seconds=timeframe_to_seconds(timeframe))
+    segment = (max_date - min_date) / (train_size + windows)
+    if segment < step:
+        raise ValueError("Timerange too short for the requested number of windows")
+    bounds = [min_date + (segment * i) // step * step for i in range(train_size + windows)]
+    bounds.append(max_date)
+    return [
+        Window(
+            index=i,
+            train_start=bounds[0] if anchored else bounds[i],
+            train_end=bounds[i + train_size],
+            test_start=bounds[i + train_size],
+            test_end=bounds[i + train_size + 1],
+        )
+        for i in range(windows)
+    ]
+
+
+def use_window(hyperopter: HyperOptimizer, start: datetime, end: datetime) -> None:
+    """
+    之后的回测只使用 [start, end) 内的K线
+    """
+    last = end - timedelta(seconds=timeframe_to_seconds(hyperopter.config["timeframe"]))
+    # 按日期截取：required_startup 为 0 时 trim_dataframe 使用 timerange 的开始日期
+    hyperopter.backtesting.required_startup = 0
+    hyperopter.backtesting.timerange = TimeRange(
+        "date", "date", int(start.timestamp()), int(last.timestamp())
+    )
+    hyperopter.min_date, hyperopter.max_date = start, last
+    # 按路径读取才会 mmap（joblib 对文件对象忽略 mmap_mode）
+    processed = load(hyperopter.data_pickle_file, mmap_mode="r")
+    hyperopter.market_change = calculate_market_change(
+        trim_dataframes(processed, hyperopter.backtesting.timerange, 0), "close"
+    )
+
+
+def summary(result: dict[str, Any]) -> dict[str, Any]:
+    return {"loss": result["loss"], **{
+        name: result["results_metrics"][name] for name in METRICS if name != "loss"
+    }}
+
+
+def trades(result: dict[str, Any]) -> list[dict[str, Any]]:
+    return [
+        {name: trade[name] for name in TRADE_COLUMNS} for trade in result["results_metrics"]["trades"]
+    ]
+
+
+def optimize_window(window: Window) -> dict[str, Any]:
+    """
+    在训练段上优化，再用最优参数（和当前参数）回测样本外段；在 fork 出的进程中运行
+    """
+    from early_abort import reset
+
+    hyperopter = _hyperopter
+    logger.info(f"Window {window.index}: training {window.train_start} - {window.train_end}")
+    use_window(hyperopter, window.train_start, window.train_end)
+    study = hyperopter.get_optimizer(_random_state + window.index)
+    evaluated: dict[tuple, float] = {}
+    best: dict[str, Any] | None = None
+    for _ in range(_epochs):
+        trial = study.ask(hyperopter.o_dimensions)
+        key = tuple(sorted(trial.params.items()))
+        if key in evaluated:
+            # 与 freqtrade 一样不重复回测同样的参数
+            study.tell(trial, evaluated[key])
+            continue
+        result = hyperopter.generate_optimizer(dict(trial.params))
+        evaluated[key] = result["loss"]
+        study.tell(trial, result["loss"])
+        if best is None or result["loss"] < best["loss"]:
+            best = result
+
+    use_window(hyperopter, window.test_start, window.test_end)
+    reset(hyperopter.backtesting.strategy)
+    test = hyperopter.generate_optimizer(dict(best["params_dict"]))
+    output = {
+        **asdict(window),
+        # 与 freqtrade 的 params_details 相同，去掉 1.0110000000000001 这样的浮点误差
+        "params": round_dict(best["params_dict"], 13),
+        "params_details": best["params_details"],
+        "train": summary(best),
+        "test": summary(test),
+        "test_trades": trades(test),
+    }
+    if _current_params is not None:
+        reset(hyperopter.backtesting.strategy)
+        current = hyperopter.generate_optimizer(dict(_current_params))
+        output["current"] = summary(current)
+        output["current_trades"] = trades(current)
+    logger.info(
+        f"Window {window.index}: train loss {best['loss']:.5f}, "
+        f"out-of-sample profit {test['results_metrics']['profit_total']:.2%}"
+    )
+    return output
+
+
+def current_params(hyperopter: HyperOptimizer) -> dict[str, Any] | None:
+    """
+    策略当前的参数值（优化空间中的参数）；空间中有无法从策略取得的参数（如 roi）时返回 None
+    """
+    strategy = hyperopter.backtesting.strategy
+    params = {name: p.value for name, p in strategy.enumerate_parameters()}
+    params.setdefault("stoploss", strategy.stoploss)
+    names = [dim.name for dim in hyperopter.dimensions]
+    if not all(name in params for name in names):
+        return None
+    return {name: params[name] for name in names}
+
+
+def equity(results: list[dict[str, Any]], starting_balance: float) -> pd.DataFrame:
+    """
+    按平仓时间拼接各样本外段的交易，累计利润得到资金曲线；
+    params 列区分最优参数（optimized）和当前参数（current）
+    """
+    frames = [
+        pd.DataFrame(result[f"{key}_trades"], columns=TRADE_COLUMNS).assign(
+            window=result["index"], params=label
+        )
+        for key, label in (("test", "optimized"), ("current", "current"))
+        for result in results if f"{key}_trades" in result
+    ]
+    table = pd.concat(frames, ignore_index=True).sort_values(["params", "close_date"], kind="stable")
+    table["equity"] = starting_balance + table.groupby("params")["profit_abs"].cumsum()
+    return table.reset_index(drop=True)
+
+
+def report(results: list[dict[str, Any]]) -> pd.DataFrame:
+    rows = []
+    for result in results:
+        row = {
+            "window": result["index"],
+            "train": f"{result['train_start']:%Y-%m-%d} ~ {result['train_end']:%Y-%m-%d}",
+            "test": f"{result['test_start']:%Y-%m-%d} ~ {result['test_end']:%Y-%m-%d}",
+            "train_loss": result["train"]["loss"],
+            "train_profit": result["train"]["profit_total"],
+            "test_loss": result["test"]["loss"],
+            "test_trades": result["test"]["total_trades"],
+            "test_profit": result["test"]["profit_total"],
+            "test_drawdown": result["test"]["max_drawdown_account"],
+        }
+        if "current" in result:
+            row["current_profit"] = result["current"]["profit_total"]
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def main() -> None:
+    global _hyperopter, _current_params, _epochs, _random_state
+
+    parser = argparse.ArgumentParser(description="Walk-forward 优化")
+    parser.add_argument("--windows", type=int, default=4, help="样本外窗口数")
+    parser.add_argument("--train-size", type=int, default=3, help="训练段长度（样本外窗口的倍数）")
+    parser.add_argument("--anchored", action="store_true", help="训练段都从时间范围的开头开始")
+    parser.add_argument("--jobs", type=int, default=multiprocessing.cpu_count(), help="并行的窗口数")
+    parser.add_argument("hyperopt_args", nargs=argparse.REMAINDER,
+                        help="-- 之后是 freqtrade hyperopt 的参数")
+    args = parser.parse_args()
+    if args.hyperopt_args[:1] == ["--"]:
+        args.hyperopt_args = args.hyperopt_args[1:]
+
+    setup_logging_pre()
+    config = load_config(args.hyperopt_args)
+    results_dir = config["user_data_dir"] / "walk_forward_results"
+    results_dir.mkdir(parents=True, exist_ok=True)
+    # 单独的数据文件，不与同时运行的 freqtrade hyperopt 共用
+    data_file = config["user_data_dir"] / "hyperopt_results" / "walk_forward_tickerdata.pkl"
+
+    _hyperopter = HyperOptimizer(config, data_file)
+    _hyperopter.prepare_hyperopt()
+    _current_params = current_params(_hyperopter)
+    _epochs = config.get("epochs", 0)
+    _random_state = config.get("hyperopt_random_state") or 1
+    windows = split_windows(_hyperopter.min_date, _hyperopter.max_date + timedelta(
+        seconds=timeframe_to_seconds(config["timeframe"])
+    ), args.windows, args.train_size, args.anchored, config["timeframe"])
+
+    try:
+        # fork：各窗口进程共享已加载的K线和准备好的 HyperOptimizer；每个窗口使用新的进程
+        context = multiprocessing.get_context("fork")
+        with context.Pool(min(args.jobs, len(windows)), maxtasksperchild=1) as pool:
+            results = pool.map(optimize_window, windows, chunksize=1)
+    finally:
+        data_file.unlink(missing_ok=True)
+
+    strategy = _hyperopter.get_strategy_name()
+    name = f"{strategy}_{datetime.now():%Y-%m-%d_%H-%M-%S}"
+    starting_balance = get_dry_run_wallet(config)
+    curve = equity(results, starting_balance)
+    curve.to_csv(results_dir / f"{name}_equity.csv", index=False)
+
+    (results_dir / f"{name}.json").write_text(json.dumps({
+        "strategy": strategy,
+        "hyperopt_args": args.hyperopt_args,
+        "windows": args.windows,
+        "train_size": args.train_size,
+        "anchored": args.anchored,
+        "current_params": _current_params and round_dict(_current_params, 13),
+        "results": [
+            {key: value for key, value in result.items() if not key.endswith("_trades")}
+            for result in results
+        ],
+    }, indent=2, default=str))
+
+    table = report(results)
+    with pd.option_context("display.width", None, "display.float_format", "{:.4f}".format):
+        print(table.to_string(index=False))
+    for result in results:
+        print(f"window {result['index']}: {json.dumps(round_dict(result['params'], 5))}")
+    stitched = curve.groupby("params")["profit_abs"].sum() / starting_balance
+    for label, profit in stitched.items():
+        print(f"样本外拼接收益（{label}）: {profit:.2%}")
+    print(f"结果已保存到 {results_dir / name}.json 和 {name}_equity.csv")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+indicator_kernels 与策略原先 pandas 写法（qtpylib.crossed_above/crossed_below + .loc）的等价性测试，
+以及 DoubleMAStrategy 在 hyperopt 中（均线库 + 记忆化的信号组成部分）生成的信号与原写法的等价性测试
+"""
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+import talib.abstract as ta
+from freqtrade.data.dataprovider import DataProvider
+from freqtrade.enums import HyperoptState, RunMode
+from freqtrade.optimize.hyperopt_tools import HyperoptStateContainer
+from technical import qtpylib
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "user_data" / "strategies"))
+
+import signal_cache  # noqa: E402
+from DoubleMAStrategy import DoubleMAStrategy  # noqa: E402
+from indicator_kernels import MA_FUNCTIONS, double_ma_signals  # noqa: E402
+
+
+def random_candles(rng: np.random.Generator, size: int) -> pd.DataFrame:
+    """
+    随机游走的K线，成交量中混有 0 和个别 NaN（其后 20 根的成交量均线也是 NaN）
+    """
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, size)))
+    volume = rng.lognormal(5, 1, size)
+    volume[rng.random(size) < 0.05] = 0
+    volume[rng.integers(0, size, 2)] = np.nan
+    return pd.DataFrame({"close": close, "volume": volume})
+
+
+def reference_signals(dataframe: pd.DataFrame, ma_type: str, fast_period: int, slow_period: int,
+                      trend_period: int, min_volume_multiplier: float) -> pd.DataFrame:
+    """
+    DoubleMAStrategy 原先的写法：按当前参数计算均线，用 qtpylib 判断交叉，用 .loc 写入信号
+    """
+    dataframe = dataframe.copy()
+    ma = getattr(ta, ma_type)
+    dataframe["fast_ma"] = ma(dataframe, timeperiod=fast_period)
+    dataframe["slow_ma"] = ma(dataframe, timeperiod=slow_period)
+    dataframe["trend_filter"] = ta.EMA(dataframe, timeperiod=trend_period)
+    dataframe["volume_sma"] = ta.SMA(dataframe["volume"], timeperiod=20)
+    dataframe["ma_cross_up"] = qtpylib.crossed_above(dataframe["fast_ma"], dataframe["slow_ma"])
+    dataframe["ma_cross_down"] = qtpylib.crossed_below(dataframe["fast_ma"], dataframe["slow_ma"])
+
+    dataframe.loc[
+        (
+            dataframe["ma_cross_up"]
+            & (dataframe["close"] > dataframe["fast_ma"])
+            & (dataframe["volume"] > dataframe["volume_sma"] * min_volume_multiplier)
+            & (dataframe["close"] > dataframe["trend_filter"])
+            & (dataframe["volume"] > 0)
+        ),
+        "enter_long"
+    ] = 1
+    dataframe.loc[
+        (
+            dataframe["ma_cross_down"]
+            | (dataframe["close"] < dataframe["slow_ma"])
+        ),
+        "exit_long"
+    ] = 1
+    # freqtrade 把没有写入的信号视为 0
+    return dataframe.reindex(columns=["enter_long", "exit_long"]).fillna(0).astype(np.int8)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_double_ma_signals_match_pandas_rules(seed):
+    rng = np.random.default_rng(seed)
+    dataframe = random_candles(rng, int(rng.integers(50, 2000)))
+    ma_type = str(rng.choice(list(MA_FUNCTIONS)))
+    fast_period = int(rng.integers(5, 31))
+    slow_period = int(rng.integers(fast_period + 1, 101))
+    trend_period = int(rng.integers(slow_period + 1, 201))
+    min_volume_multiplier = float(np.round(rng.uniform(0.5, 1.5), 1))
+
+    expected = reference_signals(
+        dataframe, ma_type, fast_period, slow_period, trend_period, min_volume_multiplier
+    )
+    close = dataframe["close"].to_numpy()
+    volume = dataframe["volume"].to_numpy()
+    enter, exit_ = double_ma_signals(
+        close,
+        volume,
+        MA_FUNCTIONS[ma_type](close, timeperiod=fast_period),
+        MA_FUNCTIONS[ma_type](close, timeperiod=slow_period),
+        MA_FUNCTIONS["EMA"](close, timeperiod=trend_period),
+        MA_FUNCTIONS["SMA"](volume, timeperiod=20),
+        min_volume_multiplier,
+    )
+
+    np.testing.assert_array_equal(enter, expected["enter_long"].to_numpy())
+    np.testing.assert_array_equal(exit_, expected["exit_long"].to_numpy())
+
+
+def test_double_ma_signals_broadcast_matches_single_calls():
+    rng = np.random.default_rng(0)
+    dataframe = random_candles(rng, 500)
+    close = dataframe["close"].to_numpy()
+    volume = dataframe["volume"].to_numpy()
+    periods = [(5, 20), (10, 50), (30, 31)]
+    multipliers = np.array([0.5, 1.0, 2.5])
+    fast = np.stack([MA_FUNCTIONS["SMA"](close, timeperiod=f) for f, _ in periods])
+    slow = np.stack([MA_FUNCTIONS["SMA"](close, timeperiod=s) for _, s in periods])
+    trend = MA_FUNCTIONS["EMA"](close, timeperiod=100)
+    volume_sma = MA_FUNCTIONS["SMA"](volume, timeperiod=20)
+
+    # (组合, 倍数, K线)
+    enter, exit_ = double_ma_signals(
+        close, volume, fast[:, None, :], slow[:, None, :], trend, volume_sma,
+        multipliers[None, :, None],
+    )
+    assert enter.shape == exit_.shape == (len(periods), len(multipliers), len(close))
+    for i in range(len(periods)):
+        for j, multiplier in enumerate(multipliers):
+            single = double_ma_signals(close, volume, fast[i], slow[i], trend, volume_sma, multiplier)
+            np.testing.assert_array_equal(enter[i, j], single[0])
+            np.testing.assert_array_equal(exit_[i, j], single[1])
+
+
+def test_double_ma_strategy_signals_across_epochs():
+    """
+    与 hyperopt 相同：先按整个搜索范围计算一次均线库，之后每个 epoch 只改参数值，
+    advise_entry/advise_exit 的信号都与原写法相同；只变化的参数对应的部分会重新计算，
+    回到之前的参数时全部复用记忆化的结果
+    """
+    rng = np.random.default_rng(0)
+    dataframe = random_candles(rng, 1500)
+    dataframe["date"] = pd.date_range("2024-01-01", periods=len(dataframe), freq="1h", tz="UTC")
+    metadata = {"pair": "TEST/EPOCHS"}
+    config = {"runmode": RunMode.HYPEROPT, "spaces": ["buy"], "stake_currency": "USDT"}
+    strategy = DoubleMAStrategy(config)
+    strategy.dp = DataProvider(config, None)
+    strategy.ft_load_hyper_params(hyperopt=True)
+
+    # (参数, 应重新计算的部分)
+    epochs = [
+        (("EMA", 10, 30, 1.0, 100), {"ma_cross", "trend_mask", "volume_mask"}),
+        (("EMA", 10, 30, 1.5, 100), {"volume_mask"}),
+        (("EMA", 10, 30, 1.5, 150), {"trend_mask"}),
+        (("SMA", 10, 30, 1.5, 150), {"ma_cross"}),
+        (("WMA", 7, 45, 0.5, 60), {"ma_cross", "trend_mask", "volume_mask"}),
+        (("EMA", 10, 30, 1.0, 100), set()),
+        (("SMA", 10, 30, 1.5, 150), set()),
+    ]
+    state = HyperoptStateContainer.state
+    try:
+        HyperoptStateContainer.set_state(HyperoptState.INDICATORS)
+        indicators = strategy.advise_indicators(dataframe.copy(), metadata)
+        HyperoptStateContainer.set_state(HyperoptState.OPTIMIZE)
+        for (ma_type, fast, slow, multiplier, trend), computed in epochs:
+            strategy.ma_type.value = ma_type
+            strategy.fast_ma_period.value = fast
+            strategy.slow_ma_period.value = slow
+            strategy.min_volume_multiplier.value = multiplier
+            strategy.trend_filter_period.value = trend
+
+            before = set(signal_cache._memos)
+            result = strategy.advise_exit(strategy.advise_entry(indicators.copy(), metadata), metadata)
+            assert {key[1] for key in set(signal_cache._memos) - before} == computed
+
+            expected = reference_signals(dataframe, ma_type, fast, slow, trend, multiplier)
+            np.testing.assert_array_equal(result["enter_long"].to_numpy(), expected["enter_long"].to_numpy())
+            np.testing.assert_array_equal(result["exit_long"].to_numpy(), expected["exit_long"].to_numpy())
+    finally:
+        HyperoptStateContainer.set_state(state)
@@ -0,0 +1,105 @@
+"""
+shared_data：hyperopt 预处理数据以 copy-on-write 方式映射，以及对 freqtrade hyperopt 模块的替换
+"""
+import hashlib
+import logging
+import sys
+import types
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "user_data" / "strategies"))
+
+import shared_data  # noqa: E402
+from shared_data import HYPEROPT_MODULE, install, mapped_load  # noqa: E402
+
+
+def dump_processed(path: Path) -> dict[str, pd.DataFrame]:
+    """
+    与 freqtrade hyperopt 相同，把 {交易对: DataFrame} 用 joblib.dump 写到文件
+    """
+    rng = np.random.default_rng(0)
+    processed = {
+        pair: pd.DataFrame({
+            "date": pd.date_range("2024-01-01", periods=1000, freq="5min", tz="UTC"),
+            "open": rng.random(1000), "close": rng.random(1000), "volume": rng.random(1000),
+            "enter_long": rng.integers(0, 2, 1000),
+        })
+        for pair in ("BTC/USDT", "ETH/USDT")
+    }
+    joblib.dump(processed, path)
+    return processed
+
+
+def test_mapped_load_maps_blocks_copy_on_write(tmp_path):
+    path = tmp_path / "hyperopt_tickerdata.pkl"
+    processed = dump_processed(path)
+    digest = hashlib.sha256(path.read_bytes()).hexdigest()
+
+    # freqtrade 传入的是已打开的文件对象
+    with path.open("rb") as file:
+        loaded = mapped_load(file, mmap_mode="r")
+
+    for pair, dataframe in loaded.items():
+        # copy() 把 memmap 换成普通数组再比较内容
+        pd.testing.assert_frame_equal(dataframe.copy(), processed[pair])
+        # 日期列是 DatetimeArray，其余数值列的块直接映射到文件
+        numeric = [
+            block.values for block in dataframe._mgr.blocks if isinstance(block.values, np.ndarray)
+        ]
+        assert numeric
+        assert all(isinstance(values, np.memmap) and values.mode == "c" for values in numeric)
+
+        # 原地修改只改变本进程的副本
+        for values in numeric:
+            values[...] = 0
+        dataframe.loc[0, "close"] = -1.0
+
+    assert hashlib.sha256(path.read_bytes()).hexdigest() == digest
+    with path.open("rb") as file:
+        reloaded = mapped_load(file, mmap_mode="r")
+    for pair, dataframe in reloaded.items():
+        pd.testing.assert_frame_equal(dataframe.copy(), processed[pair])
+
+
+def test_mapped_load_without_mmap_reads_a_private_copy(tmp_path):
+    path = tmp_path / "hyperopt_tickerdata.pkl"
+    processed = dump_processed(path)
+    with path.open("rb") as file:
+        loaded = mapped_load(file)
+    for pair, dataframe in loaded.items():
+        pd.testing.assert_frame_equal(dataframe, processed[pair])
+        assert not any(isinstance(block.values, np.memmap) for block in dataframe._mgr.blocks)
+
+
+def test_install_replaces_load(monkeypatch, caplog):
+    module = types.ModuleType(HYPEROPT_MODULE)
+    module.load = joblib.load
+    monkeypatch.setitem(sys.modules, HYPEROPT_MODULE, module)
+
+    with caplog.at_level(logging.INFO, logger=shared_data.__name__):
+        install()
+        install()
+    assert module.load is mapped_load
+    # 只在实际替换时记录一次
+    assert [record.levelno for record in caplog.records] == [logging.INFO]
+
+
+def test_install_warns_when_load_is_missing(monkeypatch, caplog):
+    module = types.ModuleType(HYPEROPT_MODULE)
+    monkeypatch.setitem(sys.modules, HYPEROPT_MODULE, module)
+
+    with caplog.at_level(logging.INFO, logger=shared_data.__name__):
+        install()
+    assert not hasattr(module, "load")
+    assert [record.levelno for record in caplog.records] == [logging.WARNING]
+
+
+def test_install_does_nothing_without_hyperopt(monkeypatch, caplog):
+    monkeypatch.delitem(sys.modules, HYPEROPT_MODULE, raising=False)
+    with caplog.at_level(logging.INFO, logger=shared_data.__name__):
+        install()
+    assert not caplog.records
@@ -0,0 +1,167 @@
+"""
+streaming_indicators 与批量计算（TA-Lib、qtpylib、ichiV1._populate_batch_indicators）的等价性测试
+
+流式状态从第一根K线开始累积，之后每次只传入 freqtrade 那样的滚动窗口，
+因此每次的输出都应与"从第一根K线到当前K线"的批量计算结果的末尾相同。
+"""
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+from technical import qtpylib
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "user_data" / "strategies"))
+
+from ichiV1 import ICHIMOKU, TREND_SPANS, ichiV1  # noqa: E402
+from indicator_kernels import MA_FUNCTIONS  # noqa: E402
+from streaming_indicators import DoubleMAStream, IchiV1Stream, IndicatorStream  # noqa: E402
+
+
+def random_ohlcv(rng: np.random.Generator, size: int) -> pd.DataFrame:
+    """
+    随机游走的 5m K线，成交量中混有 0
+    """
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, size)))
+    open_ = np.concatenate([[100.0], close[:-1]]) * np.exp(rng.normal(0, 0.002, size))
+    high = np.maximum(open_, close) * np.exp(np.abs(rng.normal(0, 0.005, size)))
+    low = np.minimum(open_, close) * np.exp(-np.abs(rng.normal(0, 0.005, size)))
+    volume = rng.lognormal(5, 1, size)
+    volume[rng.random(size) < 0.05] = 0
+    return pd.DataFrame({
+        "date": pd.date_range("2024-01-01", periods=size, freq="5min", tz="UTC"),
+        "open": open_, "high": high, "low": low, "close": close, "volume": volume,
+    })
+
+
+def forming_candle(rng: np.random.Generator, candle: pd.Series) -> pd.Series:
+    """
+    还在形成中的K线：日期相同，价格是收盘前的某个中间状态
+    """
+    candle = candle.copy()
+    candle["close"] = candle["open"] * np.exp(rng.normal(0, 0.003))
+    candle["high"] = max(candle["open"], candle["close"]) * np.exp(abs(rng.normal(0, 0.002)))
+    candle["low"] = min(candle["open"], candle["close"]) * np.exp(-abs(rng.normal(0, 0.002)))
+    candle["volume"] *= rng.random()
+    return candle
+
+
+def double_ma_batch(dataframe: pd.DataFrame, ma_type: str, fast_period: int, slow_period: int,
+                    trend_period: int) -> pd.DataFrame:
+    """
+    DoubleMAStream 各列的批量算法：TA-Lib 均线、qtpylib 交叉、diff 斜率
+    """
+    close = dataframe["close"].to_numpy(dtype=np.float64)
+    result = pd.DataFrame({
+        "fast_ma": MA_FUNCTIONS[ma_type](close, timeperiod=fast_period),
+        "slow_ma": MA_FUNCTIONS[ma_type](close, timeperiod=slow_period),
+        "trend_filter": MA_FUNCTIONS["EMA"](close, timeperiod=trend_period),
+        "volume_sma": MA_FUNCTIONS["SMA"](dataframe["volume"].to_numpy(dtype=np.float64), timeperiod=20),
+    })
+    result["ma_cross_up"] = qtpylib.crossed_above(result["fast_ma"], result["slow_ma"])
+    result["ma_cross_down"] = qtpylib.crossed_below(result["fast_ma"], result["slow_ma"])
+    result["fast_ma_slope"] = result["fast_ma"].diff()
+    result["slow_ma_slope"] = result["slow_ma"].diff()
+    return result
+
+
+def ichi_batch(dataframe: pd.DataFrame) -> pd.DataFrame:
+    """
+    ichiV1 回测时的批量计算，列名换成 IchiV1Stream 的列名
+    """
+    # _populate_batch_indicators 不读取策略的任何属性
+    result = ichiV1._populate_batch_indicators(None, dataframe.reset_index(drop=True))
+    return result.rename(columns={"open": "ha_open", "high": "ha_high", "low": "ha_low"})
+
+
+def assert_matches(result: pd.DataFrame, expected: pd.DataFrame) -> None:
+    """
+    result 与 expected 末尾的 len(result) 行逐列相同（NaN 的位置也相同）
+    """
+    expected = expected.iloc[len(expected) - len(result):]
+    for column in result.columns:
+        np.testing.assert_array_equal(
+            result[column].to_numpy(dtype=np.float64),
+            expected[column].to_numpy(dtype=np.float64),
+            err_msg=column,
+        )
+
+
+def replay(rng: np.random.Generator, stream: IndicatorStream, candles: pd.DataFrame, window: int,
+           batch) -> None:
+    """
+    按不均匀的步长逐段喂入长度为 window 的滚动窗口，间或带上一根形成中的K线（同一根会先后变化两次，
+    其中一次重复上一次的价格），每次的输出都与批量计算相同
+    """
+    end = 0
+    while end < len(candles):
+        end = min(end + int(rng.integers(1, 40)), len(candles))
+        history = candles.iloc[:end]
+        assert_matches(stream.process(history.iloc[-window:]), batch(history))
+
+        if end < len(candles) and rng.random() < 0.5:
+            first = forming_candle(rng, candles.iloc[end])
+            for candle in (first, forming_candle(rng, candles.iloc[end]), first):
+                current = pd.concat([history, candle.to_frame().T.astype(history.dtypes)],
+                                    ignore_index=True)
+                assert_matches(stream.process(current.iloc[-window:], forming=True), batch(current))
+
+
+@pytest.mark.parametrize("seed", range(6))
+def test_double_ma_stream_matches_batch(seed):
+    rng = np.random.default_rng(seed)
+    ma_type = list(MA_FUNCTIONS)[seed % len(MA_FUNCTIONS)]
+    fast_period = int(rng.integers(5, 31))
+    slow_period = int(rng.integers(fast_period + 1, 101))
+    trend_period = int(rng.integers(slow_period + 1, 201))
+    candles = random_ohlcv(rng, 800)
+
+    stream = DoubleMAStream(ma_type, fast_period, slow_period, trend_period)
+    replay(rng, stream, candles, 300,
+           lambda history: double_ma_batch(history, ma_type, fast_period, slow_period, trend_period))
+
+
+@pytest.mark.parametrize("seed", range(2))
+def test_ichi_v1_stream_matches_batch(seed):
+    rng = np.random.default_rng(seed)
+    candles = random_ohlcv(rng, 900)
+
+    stream = IchiV1Stream(TREND_SPANS, **ICHIMOKU)
+    expected = ichi_batch(candles)
+    assert set(stream.columns) <= set(expected.columns)
+    replay(rng, stream, candles, 400, ichi_batch)
+
+
+def test_stream_resets_when_history_does_not_connect():
+    rng = np.random.default_rng(0)
+    candles = random_ohlcv(rng, 600)
+    params = ("EMA", 10, 30, 100)
+    stream = DoubleMAStream(*params)
+
+    stream.process(candles.iloc[:200])
+    # 同一窗口再传一次：没有新K线，直接返回已算好的行
+    assert_matches(stream.process(candles.iloc[100:200]), double_ma_batch(candles.iloc[:200], *params))
+    # 缺口之后的窗口与已处理的最后一根K线接不上，状态重置后从窗口开头重算
+    gap = candles.iloc[300:]
+    assert_matches(stream.process(gap), double_ma_batch(gap, *params))
+    # 重置后的状态可以正常续上
+    assert_matches(stream.process(candles.iloc[350:]), double_ma_batch(gap, *params))
+
+
+def test_provisional_does_not_change_committed_state():
+    rng = np.random.default_rng(0)
+    candles = random_ohlcv(rng, 300)
+    stream = IchiV1Stream(TREND_SPANS, **ICHIMOKU)
+    stream.process(candles.iloc[:200])
+    forming = pd.concat([candles.iloc[:200], forming_candle(rng, candles.iloc[200]).to_frame().T],
+                        ignore_index=True).astype(candles.dtypes)
+
+    first = stream.process(forming, forming=True)
+    # 价格不变时复用上一次的结果
+    row = stream._forming[1]
+    stream.process(forming, forming=True)
+    assert stream._forming[1] is row
+    assert_matches(first, ichi_batch(forming))
+    # 收盘后按最终价格计算，与形成中的版本无关
+    assert_matches(stream.process(candles.iloc[:201]), ichi_batch(candles.iloc[:201]))
@@ -0,0 +1,163 @@
+"""
+TimeframeCache 的增量聚合与 freqtrade 一次性 resample + merge_informative_pair 的等价性测试
+"""
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+from freqtrade.exchange import timeframe_to_seconds
+from freqtrade.strategy import merge_informative_pair
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "user_data" / "strategies"))
+
+from timeframe_cache import OHLCV, TimeframeCache  # noqa: E402
+
+PAIR = "BTC/USDT"
+TIMEFRAMES = ("15m", "1h", "8h")
+BASE = pd.Timedelta("5min")
+
+
+def random_ohlcv(rng: np.random.Generator, size: int, start: str) -> pd.DataFrame:
+    """
+    随机游走的 5m K线
+    """
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, size)))
+    open_ = np.concatenate([[100.0], close[:-1]])
+    return pd.DataFrame({
+        "date": pd.date_range(start, periods=size, freq="5min", tz="UTC"),
+        "open": open_,
+        "high": np.maximum(open_, close) * np.exp(np.abs(rng.normal(0, 0.005, size))),
+        "low": np.minimum(open_, close) * np.exp(-np.abs(rng.normal(0, 0.005, size))),
+        "close": close,
+        "volume": rng.lognormal(5, 1, size),
+    })
+
+
+def forming_candle(rng: np.random.Generator, candle: pd.Series) -> pd.DataFrame:
+    """
+    还在形成中的K线：日期相同，价格是收盘前的某个中间状态
+    """
+    candle = candle.copy()
+    candle["close"] = candle["open"] * np.exp(rng.normal(0, 0.003))
+    candle["high"] = max(candle["high"], candle["close"]) * 1.01
+    candle["low"] = min(candle["low"], candle["close"]) * 0.99
+    candle["volume"] *= rng.random()
+    return candle.to_frame().T
+
+
+def one_shot(dataframe: pd.DataFrame, forming: bool = False) -> pd.DataFrame:
+    return TimeframeCache("5m", TIMEFRAMES).merge(PAIR, dataframe, forming=forming)
+
+
+def assert_same(result: pd.DataFrame, expected: pd.DataFrame) -> None:
+    # 成交量由增量累加得到，只有浮点舍入上的差别
+    np.testing.assert_allclose(result.to_numpy(), expected.to_numpy(), rtol=1e-12, equal_nan=True)
+    assert list(result.columns) == list(expected.columns)
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_sliding_window_matches_one_shot(seed):
+    """
+    按不均匀的步长喂入滚动窗口（间或带一根形成中的K线），每次都与对整段历史一次性聚合的结果相同
+    """
+    rng = np.random.default_rng(seed)
+    # 起点不在 8h 边界上：第一根 8h K线不完整，两种方式都会丢弃
+    candles = random_ohlcv(rng, 2000, "2024-01-01 03:20")
+    cache = TimeframeCache("5m", TIMEFRAMES)
+    end = 0
+    while end < len(candles):
+        end = min(end + int(rng.integers(1, 60)), len(candles))
+        history = candles.iloc[:end]
+        window = history.iloc[-500:]
+        assert_same(cache.merge(PAIR, window), one_shot(history).iloc[-len(window):])
+
+        if end < len(candles) and rng.random() < 0.5:
+            current = pd.concat([history, forming_candle(rng, candles.iloc[end])], ignore_index=True)
+            current = current.astype(candles.dtypes)
+            window = current.iloc[-500:]
+            result = cache.merge(PAIR, window, forming=True)
+            assert_same(result, one_shot(current, forming=True).iloc[-len(window):])
+
+
+def test_matches_resample_and_merge_informative_pair():
+    """
+    与先 resample 再 merge_informative_pair(ffill=True) 相同，除了文档中说明的两处：
+    - 窗口开头不完整的大周期K线被丢弃（resample 会保留）
+    - 基础K线有缺口时，缺口中收盘的大周期K线在缺口之后的第一根基础K线上出现
+      （merge_informative_pair 按收盘前最后一根基础K线的日期合并，这根K线不存在时跳过整根大周期K线）
+    """
+    rng = np.random.default_rng(0)
+    candles = random_ohlcv(rng, 3000, "2024-01-01 03:20")
+    # 约 4 小时的缺口，缺口中有 15m/1h K线收盘
+    gap_start = 1200
+    candles = candles.drop(index=range(gap_start, gap_start + 50)).reset_index(drop=True)
+    result = one_shot(candles)
+
+    for timeframe in TIMEFRAMES:
+        # pandas 中 "m" 是月
+        freq = timeframe.replace("m", "min")
+        informative = (
+            candles.resample(freq, on="date")
+            .agg({"open": "first", "high": "max", "low": "min", "close": "last", "volume": "sum"})
+            .dropna()
+            .reset_index()
+        )
+        expected = merge_informative_pair(candles, informative, "5m", timeframe, ffill=True)
+        columns = [f"{column}_{timeframe}" for column in OHLCV]
+
+        length = pd.Timedelta(freq)
+        dates = candles["date"]
+        first_full = dates.iloc[0].ceil(freq)
+        # 第一根完整的K线走完之前，merge_informative_pair 用的是不完整的第一根
+        skip_start = dates < first_full + length - BASE
+        # 缺口之后直到下一根大周期K线走完
+        after_gap = dates.iloc[gap_start]
+        gap = (dates >= after_gap) & (dates < after_gap + length)
+        compare = ~(skip_start | gap)
+        assert compare.sum() > len(candles) * 0.9
+        np.testing.assert_allclose(
+            result.loc[compare, columns].to_numpy(),
+            expected.loc[compare, columns].to_numpy(dtype=np.float64),
+            rtol=1e-12,
+        )
+        # 开头：还没有走完的完整K线时为 NaN
+        assert result.loc[skip_start, columns].isna().all().all()
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_index_map_never_exposes_unclosed_candles(seed):
+    """
+    每根基础K线对应的大周期K线在它收盘时已经走完，而且是走完的最后一根；
+    形成中的K线即使到了大周期的收盘时间，也不会提前放出这根大周期K线
+    """
+    rng = np.random.default_rng(seed)
+    candles = random_ohlcv(rng, 1500, "2024-01-01 00:00")
+    cache = TimeframeCache("5m", TIMEFRAMES)
+    # 让一部分窗口恰好结束在 8h/1h K线的最后一根 5m K线上
+    ends = sorted(set(rng.integers(1, len(candles), 40)) | {96 * 3, 96 * 5, 12 * 100})
+    for end in ends:
+        forming = bool(rng.random() < 0.5)
+        window = candles.iloc[max(0, end - 400):end]
+        cache.update(PAIR, window, forming=forming)
+        closed = window.iloc[:-1] if forming else window
+        last_close = (closed["date"].iloc[-1] + BASE).timestamp()
+        bar_close = (window["date"] + BASE).map(pd.Timestamp.timestamp).to_numpy()
+
+        for timeframe in TIMEFRAMES:
+            seconds = timeframe_to_seconds(timeframe)
+            starts = cache.candles(PAIR, timeframe)["date"].to_numpy()
+            index = cache.index_map(PAIR, timeframe, window["date"].values)
+            known = index >= 0
+            closes = starts[index[known]] + seconds
+            # 已走完：收盘时间不晚于基础K线的收盘时间，也不晚于最后一根已收盘的基础K线
+            assert (closes <= bar_close[known]).all()
+            assert (closes <= last_close).all()
+            # 是走完的最后一根：下一根大周期K线此时还没有走完
+            following = index + 1
+            has_next = following < len(starts)
+            next_close = starts[following[has_next]] + seconds
+            assert (
+                (next_close > bar_close[has_next]) | (next_close > last_close)
+            ).all()
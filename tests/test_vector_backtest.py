@@ -0,0 +1,159 @@
+"""
+vector_backtest 的撮合规则测试：手工构造的K线序列，平仓K线、原因和价格都是已知的
+"""
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "user_data" / "strategies"))
+
+from vector_backtest import ExitRules, backtest_frames  # noqa: E402
+
+PAIR = "BTC/USDT"
+
+
+def candles(rows: list[tuple]) -> pd.DataFrame:
+    """
+    1h K线，每行为 (open, high, low, enter_long, exit_long)；第一根的日期为 2024-01-01 00:00
+    """
+    open_, high, low, enter, exit_ = zip(*rows)
+    return pd.DataFrame({
+        "date": pd.date_range("2024-01-01", periods=len(rows), freq="1h", tz="UTC"),
+        "open": open_, "high": high, "low": low, "close": open_, "volume": 1.0,
+        "enter_long": enter, "exit_long": exit_,
+    })
+
+
+def flat(count: int, price: float = 100.0) -> list[tuple]:
+    return [(price, price, price, 0, 0)] * count
+
+
+def run(rows: list[tuple], **rules) -> pd.DataFrame:
+    return backtest_frames({PAIR: candles(rows)}, ExitRules(60, **rules), fee=0.0, stake_amount=100)
+
+
+def assert_trade(trade: pd.Series, entry: int, exit_: int, reason: str, close_rate: float) -> None:
+    start = pd.Timestamp("2024-01-01", tz="UTC")
+    assert trade["open_date"] == start + pd.Timedelta(hours=entry)
+    assert trade["close_date"] == start + pd.Timedelta(hours=exit_)
+    assert trade["exit_reason"] == reason
+    assert trade["close_rate"] == pytest.approx(close_rate)
+
+
+@pytest.mark.parametrize("exit_candle, close_rate", [
+    # 120 分钟的档位在第 3 根开盘时生效，开盘价没有达到目标，按目标价成交
+    ((101, 103, 100.5, 0, 0), 102.0),
+    # 新档位生效时开盘价已经高于目标，按开盘价成交
+    ((104, 105, 103, 0, 0), 104.0),
+])
+def test_roi_decays_with_trade_duration(exit_candle, close_rate):
+    rows = [
+        (100, 100, 100, 1, 0),
+        (100, 101, 99, 0, 0),
+        # 持仓 60 分钟：目标仍为 10%
+        (101, 105, 100, 0, 0),
+        exit_candle,
+        *flat(3),
+    ]
+    results = run(rows, minimal_roi={"0": 0.10, "120": 0.02})
+    assert len(results) == 1
+    assert_trade(results.iloc[0], 1, 3, "roi", close_rate)
+
+
+def test_roi_rate_is_clipped_to_the_candle():
+    rows = [
+        (100, 100, 100, 1, 0),
+        (100, 101, 99, 0, 0),
+        # 档位从开仓起就生效，整根K线都在目标价之上：按最低价成交
+        (105, 106, 104, 0, 0),
+        *flat(3),
+    ]
+    results = run(rows, minimal_roi={"0": 0.02})
+    assert_trade(results.iloc[0], 1, 2, "roi", 104.0)
+
+
+@pytest.mark.parametrize("exit_candle, close_rate", [
+    ((99, 100, 94, 0, 0), 95.0),
+    # 开盘就跳空到止损线之下，按开盘价成交
+    ((90, 92, 89, 0, 0), 90.0),
+])
+def test_stoploss_hit(exit_candle, close_rate):
+    rows = [
+        (100, 100, 100, 1, 0),
+        (100, 101, 99, 0, 0),
+        (100, 101, 96, 0, 0),
+        exit_candle,
+        *flat(3),
+    ]
+    results = run(rows, stoploss=-0.05)
+    assert len(results) == 1
+    assert_trade(results.iloc[0], 1, 3, "stop_loss", close_rate)
+
+
+def test_trailing_stop_with_offset_carries_across_windows():
+    rows = [
+        (100, 100, 100, 1, 0),
+        # 利润没有达到 offset，只有初始止损（-10%）
+        (100, 101, 99, 0, 0),
+        # 达到 offset 之后止损线移到最高价下方 2%：108 * 0.98 = 105.84
+        (101, 108, 106, 0, 0),
+        # 之后的最高价都更低，止损线保持不动；触发点在第一个 32 根K线的窗口之后
+        *[(107, 107.5, 106.5, 0, 0)] * 60,
+        (107, 107, 105, 0, 0),
+        *flat(3, 105),
+    ]
+    results = run(rows, stoploss=-0.10, trailing_stop=True, trailing_stop_positive=0.02,
+                  trailing_stop_positive_offset=0.05, trailing_only_offset_is_reached=True)
+    assert len(results) == 1
+    assert_trade(results.iloc[0], 1, 63, "trailing_stop_loss", 108 * 0.98)
+
+
+def test_exit_signal_on_entry_candle_is_ignored():
+    rows = [
+        (100, 100, 100, 1, 0),
+        (100, 100, 100, 0, 0),
+        # 同时有买入和卖出信号：既不平仓也不再开仓
+        (100, 100, 100, 1, 1),
+        (101, 101, 101, 0, 0),
+        (102, 102, 102, 0, 1),
+        (103, 103, 103, 0, 0),
+        (103, 103, 103, 1, 1),
+        *flat(3, 103),
+    ]
+    results = run(rows)
+    assert len(results) == 1
+    assert_trade(results.iloc[0], 1, 5, "exit_signal", 103.0)
+
+
+@pytest.mark.parametrize("exit_signal, reason, close_rate", [
+    (1, "exit_signal", 100.0),
+    (0, "stop_loss", 95.0),
+])
+def test_exit_priority(exit_signal, reason, close_rate):
+    rows = [
+        (100, 100, 100, 1, 0),
+        (100, 100, 100, 0, 0),
+        (100, 100, 100, 0, exit_signal),
+        # 同一根K线同时触发止损和 ROI
+        (100, 110, 90, 0, 0),
+        *flat(3),
+    ]
+    results = run(rows, minimal_roi={"0": 0.05}, stoploss=-0.05)
+    assert_trade(results.iloc[0], 1, 3, reason, close_rate)
+
+
+def test_open_trade_is_force_exited_at_the_last_open():
+    rows = [(100, 100, 100, 1, 0), *flat(5), (104, 105, 103, 0, 0)]
+    results = run(rows)
+    assert_trade(results.iloc[0], 1, 6, "force_exit", 104.0)
+
+
+def test_empty_processed_returns_empty_results():
+    expected = run([(100, 100, 100, 1, 0), *flat(5)])
+    results = backtest_frames({}, ExitRules(60), fee=0.0, stake_amount=100)
+    assert results.empty
+    assert list(results.columns) == list(expected.columns)
+    assert (results.dtypes == expected.dtypes).all()
@@ -1,9 +1,16 @@
 from datetime import datetime
 from math import exp
+
+import numpy as np
 from pandas import DataFrame
 from freqtrade.constants import Config
 from freqtrade.optimize.hyperopt import IHyperOptLoss
 
+import helper_paths  # noqa: F401
+from early_abort import record_epoch
+from loss_kernels import segment_stats, trade_stats
+from parameter_constraints import current_parameters
+
 
 # ========================================
 # 双均线策略优化配置常量
@@ -31,6 +38,17 @@ MAX_ACCEPTED_DRAWDOWN = 0.15  # 最大接受回撤15%
 # 参数合理性权重
 REASONABLE_PARAMS_WEIGHT = 0.1  # 参数合理性权重
 
+# 各损失项的权重分配
+LOSS_WEIGHTS = {
+    'profit': 0.25,      # 利润权重25%
+    'win_rate': 0.20,    # 胜率权重20%
+    'drawdown': 0.20,    # 回撤权重20%
+    'frequency': 0.10,   # 频率权重10%
+    'duration': 0.10,    # 持仓时间权重10%
+    'trade_count': 0.10, # 交易次数权重10%
+    'params': REASONABLE_PARAMS_WEIGHT  # 参数合理性权重
+}
+
 
 class DoubleMAHyperOptLoss(IHyperOptLoss):
     """
@@ -64,174 +82,203 @@ class DoubleMAHyperOptLoss(IHyperOptLoss):
         """
         双均线策略的自定义损失函数
 
-        返回值越小，策略表现越好
+        返回值越小，策略表现越好。计算与 hyperopt_loss_batch 相同，相当于只有一个 epoch 的批量；
+        参数合理性损失使用策略记录的当前 epoch 的参数（见 parameter_constraints.track_parameters）。
+        重新计算历史 epoch 的损失时（见 surrogate_screening）通过 params 传入该 epoch 的参数，
+        此时不计入 early_abort
+        """
+        stats = trade_stats(results['profit_ratio'].to_numpy(), results['trade_duration'].to_numpy())
+        stats['trade_count'] = trade_count
+        stats = {name: np.array([value]) for name, value in stats.items()}
+        params = kwargs.get('params')
+        losses = DoubleMAHyperOptLoss.loss_components(stats, min_date, max_date, config, params)
+        total_loss = float(DoubleMAHyperOptLoss.weighted_loss(losses)[0])
+
+        # 调试信息输出（可选）
+        if kwargs.get('debug', False):
+            days = max((max_date - min_date).days, 1)
+            DoubleMAHyperOptLoss._print_debug_info(
+                stats['total_profit'][0], stats['win_rate'][0], stats['max_drawdown'][0],
+                trade_count, trade_count / days * 30, stats['avg_trade_duration'][0], total_loss,
+                losses['profit'][0], losses['win_rate'][0], losses['drawdown'][0],
+                losses['frequency'][0], losses['duration'][0], losses['trade_count'][0],
+                losses['params'][0],
+            )
+
+        if params is None:
+            record_epoch(DoubleMAHyperOptLoss, total_loss, min_date, max_date)
+        return total_loss
+
+    @staticmethod
+    def loss_lower_bound(
+        results: DataFrame,
+        trade_count: int,
+        min_date: datetime,
+        max_date: datetime,
+        config: Config,
+        *args,
+        **kwargs,
+    ) -> float:
+        """
+        回测进行到一半时最终损失的下界（见 early_abort）
+
+        results 只包含已平仓的交易，trade_count 为已平仓和持仓中的交易数。之后追加的交易只会
+        让累积利润的最大回撤和交易次数变大，所以只有这几项能给出下界：
+        - 回撤损失在 MAX_ACCEPTED_DRAWDOWN 处从 2 倍跳到 3 倍超出部分，回撤略超过阈值时损失接近 0，
+          因此只有已经超过阈值的部分计入下界
+        - 交易频率和交易次数只在已经过多时计入
+        - 参数合理性损失与交易无关，按当前 epoch 的参数计入
+        利润、胜率和持仓时间都可能被之后的交易改善，下界取 0
+        """
+        stats = trade_stats(results['profit_ratio'].to_numpy())
+        days = max((max_date - min_date).days, 1)
+        trades_per_month = trade_count / days * 30
+        drawdown_bound = max(stats['max_drawdown'] - MAX_ACCEPTED_DRAWDOWN, 0) * 3
+        frequency_bound = max(trades_per_month - 30, 0) * 0.05
+        trade_count_bound = max(trade_count - TARGET_TRADES_MAX, 0) * 0.005
+        return (
+            drawdown_bound * LOSS_WEIGHTS['drawdown']
+            + frequency_bound * LOSS_WEIGHTS['frequency']
+            + trade_count_bound * LOSS_WEIGHTS['trade_count']
+            + float(DoubleMAHyperOptLoss._calculate_params_reasonable_loss(current_parameters()))
+            * LOSS_WEIGHTS['params']
+        )
+
+    @staticmethod
+    def hyperopt_loss_batch(
+        profit_ratio: np.ndarray,
+        trade_duration: np.ndarray,
+        epoch: np.ndarray,
+        epochs: int,
+        min_date: datetime,
+        max_date: datetime,
+        config: Config,
+        params: dict[str, np.ndarray] | None = None,
+    ) -> np.ndarray:
+        """
+        一次计算多个 epoch 的损失
+
+        所有 epoch 的交易拼接成一列，epoch[i] 为第 i 笔交易所属的 epoch（0 ~ epochs-1），
+        格式要求见 loss_kernels.segment_stats。
+
+        :param profit_ratio: 每笔交易的 profit_ratio
+        :param trade_duration: 每笔交易的持仓时间（分钟）
+        :param params: 每个 epoch 的参数 {参数名: 长度为 epochs 的数组}，用于参数合理性损失；
+                       不传时使用策略记录的当前参数
+        :return: 长度为 epochs 的损失数组，与逐个调用 hyperopt_loss_function 的结果
+                 相差在浮点舍入误差以内
         """
+        stats = segment_stats(profit_ratio, trade_duration, epoch, epochs)
+        losses = DoubleMAHyperOptLoss.loss_components(stats, min_date, max_date, config, params)
+        return DoubleMAHyperOptLoss.weighted_loss(losses)
 
-        # ========================================
-        # 1. 基础指标计算
-        # ========================================
+    @staticmethod
+    def loss_components(
+        stats: dict[str, np.ndarray],
+        min_date: datetime,
+        max_date: datetime,
+        config: Config,
+        params: dict | None = None,
+    ) -> dict[str, np.ndarray]:
+        """
+        由 loss_kernels 的交易统计计算各损失项（键与 LOSS_WEIGHTS 相同）
 
+        :param params: 参数值，每个值为单个数或每个 epoch 一个值的数组；不传时使用 current_parameters()
+        """
+        if params is None:
+            params = current_parameters()
         # 计算时间范围（天数）
         days = (max_date - min_date).days
         if days == 0:
             days = 1  # 避免除零错误
 
-        # 基础交易指标
-        total_profit = results['profit_ratio'].sum() if len(results) > 0 else 0
-        win_rate = (results['profit_ratio'] > 0).sum() / len(results) if len(results) > 0 else 0
-        avg_profit = results['profit_ratio'].mean() if len(results) > 0 else 0
-
-        # 回撤相关指标 - 从策略统计信息中获取
-        # 注意：在Hyperopt中，max_drawdown需要通过其他方式获取
-        # 这里使用近似方法：基于交易利润计算
-        if len(results) > 0:
-            # 计算累积利润
-            cumulative_profit = results['profit_ratio'].cumsum()
-            # 计算最大回撤（从最高点到最低点的最大跌幅）
-            peak = cumulative_profit.expanding().max()
-            drawdown = cumulative_profit - peak
-            max_drawdown = abs(drawdown.min()) if len(drawdown) > 0 else 0
-            avg_drawdown = abs(drawdown.mean()) if len(drawdown) > 0 else 0
-        else:
-            max_drawdown = 0
-            avg_drawdown = 0
-
+        total_profit = stats['total_profit']
+        win_rate = stats['win_rate']
+        max_drawdown = stats['max_drawdown']
+        trade_count = stats['trade_count']
         # 交易频率指标
-        trades_per_day = trade_count / days
-        trades_per_month = trades_per_day * 30
-
-        # 持仓时间指标
-        avg_trade_duration = results['trade_duration'].mean() if len(results) > 0 else 0
-
-        # ========================================
-        # 2. 各指标损失计算
-        # ========================================
-
-        # 2.1 利润损失
-        if total_profit > 0:
-            # 利润为正时，鼓励更高利润
-            profit_loss = max(0, 1 - total_profit / EXPECTED_MAX_PROFIT)
-        else:
-            # 利润为负时，给予重罚
-            profit_loss = 2 + abs(total_profit)
-
-        # 2.2 胜率损失（目标40-60%胜率）
-        if win_rate < TARGET_WIN_RATE_MIN:
-            win_rate_loss = (TARGET_WIN_RATE_MIN - win_rate) * 2
-        elif win_rate > TARGET_WIN_RATE_MAX:
-            win_rate_loss = (win_rate - TARGET_WIN_RATE_MAX) * 1.5
-        else:
-            # 在最优范围内，给与奖励
-            distance_from_optimal = abs(win_rate - TARGET_WIN_RATE_OPTIMAL)
-            win_rate_loss = distance_from_optimal * 0.5
-
-        # 2.3 回撤损失
-        if max_drawdown > MAX_ACCEPTED_DRAWDOWN:
-            drawdown_loss = (max_drawdown - MAX_ACCEPTED_DRAWDOWN) * 3
-        else:
-            drawdown_loss = max_drawdown * 2
-
-        # 2.4 交易频率损失（目标每月10-30笔）
-        if trades_per_month < 10:
-            freq_loss = (10 - trades_per_month) * 0.1
-        elif trades_per_month > 30:
-            freq_loss = (trades_per_month - 30) * 0.05
-        else:
-            freq_loss = 0
-
-        # 2.5 持仓时间损失（避免持仓过长）
-        if avg_trade_duration > MAX_ACCEPTED_TRADE_DURATION:
-            duration_loss = (avg_trade_duration - MAX_ACCEPTED_TRADE_DURATION) / 1000
-        else:
-            duration_loss = 0
-
-        # 2.6 交易次数损失（确保有足够样本）
-        if trade_count < TARGET_TRADES_MIN:
-            trade_count_loss = (TARGET_TRADES_MIN - trade_count) * 0.01
-        elif trade_count > TARGET_TRADES_MAX:
-            trade_count_loss = (trade_count - TARGET_TRADES_MAX) * 0.005
-        else:
-            trade_count_loss = 0
-
-        # 2.7 参数合理性损失
-        params_reasonable_loss = DoubleMAHyperOptLoss._calculate_params_reasonable_loss(config)
-
-        # ========================================
-        # 3. 综合评分
-        # ========================================
-
-        # 各损失项的权重分配
-        weights = {
-            'profit': 0.25,      # 利润权重25%
-            'win_rate': 0.20,    # 胜率权重20%
-            'drawdown': 0.20,    # 回撤权重20%
-            'frequency': 0.10,   # 频率权重10%
-            'duration': 0.10,    # 持仓时间权重10%
-            'trade_count': 0.10, # 交易次数权重10%
-            'params': REASONABLE_PARAMS_WEIGHT  # 参数合理性权重
+        trades_per_month = trade_count / days * 30
+        avg_trade_duration = stats['avg_trade_duration']
+
+        return {
+            # 利润为正时鼓励更高利润，利润为负时给予重罚
+            'profit': np.where(
+                total_profit > 0,
+                np.maximum(0, 1 - total_profit / EXPECTED_MAX_PROFIT),
+                2 + np.abs(total_profit),
+            ),
+            # 胜率：超出目标范围按距离惩罚，范围内按与最优胜率的距离给小额损失
+            'win_rate': np.select(
+                [win_rate < TARGET_WIN_RATE_MIN, win_rate > TARGET_WIN_RATE_MAX],
+                [(TARGET_WIN_RATE_MIN - win_rate) * 2, (win_rate - TARGET_WIN_RATE_MAX) * 1.5],
+                np.abs(win_rate - TARGET_WIN_RATE_OPTIMAL) * 0.5,
+            ),
+            'drawdown': np.where(
+                max_drawdown > MAX_ACCEPTED_DRAWDOWN,
+                (max_drawdown - MAX_ACCEPTED_DRAWDOWN) * 3,
+                max_drawdown * 2,
+            ),
+            # 目标每月10-30笔
+            'frequency': np.select(
+                [trades_per_month < 10, trades_per_month > 30],
+                [(10 - trades_per_month) * 0.1, (trades_per_month - 30) * 0.05],
+                0.0,
+            ),
+            # 避免持仓过长
+            'duration': np.where(
+                avg_trade_duration > MAX_ACCEPTED_TRADE_DURATION,
+                (avg_trade_duration - MAX_ACCEPTED_TRADE_DURATION) / 1000,
+                0.0,
+            ),
+            # 确保有足够样本
+            'trade_count': np.select(
+                [trade_count < TARGET_TRADES_MIN, trade_count > TARGET_TRADES_MAX],
+                [(TARGET_TRADES_MIN - trade_count) * 0.01, (trade_count - TARGET_TRADES_MAX) * 0.005],
+                0.0,
+            ),
+            'params': np.broadcast_to(
+                DoubleMAHyperOptLoss._calculate_params_reasonable_loss(params), trade_count.shape
+            ),
         }
 
-        total_loss = (
-            profit_loss * weights['profit'] +
-            win_rate_loss * weights['win_rate'] +
-            drawdown_loss * weights['drawdown'] +
-            freq_loss * weights['frequency'] +
-            duration_loss * weights['duration'] +
-            trade_count_loss * weights['trade_count'] +
-            params_reasonable_loss * weights['params']
-        )
-
-        # 调试信息输出（可选）
-        if kwargs.get('debug', False):
-            DoubleMAHyperOptLoss._print_debug_info(
-                total_profit, win_rate, max_drawdown, trade_count,
-                trades_per_month, avg_trade_duration, total_loss,
-                profit_loss, win_rate_loss, drawdown_loss,
-                freq_loss, duration_loss, trade_count_loss, params_reasonable_loss
-            )
-
-        return total_loss
+    @staticmethod
+    def weighted_loss(losses: dict[str, np.ndarray]) -> np.ndarray:
+        """
+        各损失项按 LOSS_WEIGHTS 加权求和
+        """
+        return sum(losses[name] * weight for name, weight in LOSS_WEIGHTS.items())
 
     @staticmethod
-    def _calculate_params_reasonable_loss(config: Config) -> float:
+    def _calculate_params_reasonable_loss(params: dict) -> np.ndarray:
         """
         计算参数合理性损失
         确保快慢线周期比例合理，避免过拟合
+
+        :param params: 参数值，每个值为单个数或每个 epoch 一个值的数组；缺少的参数按策略默认值
         """
-        try:
-            # 获取当前的参数值
-            strategy_config = config.get('strategy', {})
-            fast_period = strategy_config.get('fast_ma_period', 10)
-            slow_period = strategy_config.get('slow_ma_period', 30)
-            trend_period = strategy_config.get('trend_filter_period', 100)
-
-            # 计算参数合理性评分
-            params_loss = 0
-
-            # 1. 快慢线周期比例合理性（快线应明显小于慢线）
-            period_ratio = fast_period / slow_period
-            if period_ratio > 0.8:
-                params_loss += (period_ratio - 0.8) * 2  # 快慢线差距太小
-            elif period_ratio < 0.1:
-                params_loss += (0.1 - period_ratio) * 1  # 快慢线差距太大
-
-            # 2. 趋势过滤周期应大于慢线周期
-            if trend_period <= slow_period:
-                params_loss += (slow_period - trend_period + 1) * 0.01
-
-            # 3. 避免极端参数值
-            if fast_period < 3 or fast_period > 100:
-                params_loss += 0.5
-            if slow_period < 10 or slow_period > 200:
-                params_loss += 0.5
-            if trend_period < 20 or trend_period > 500:
-                params_loss += 0.5
-
-            return params_loss
-
-        except Exception:
-            # 如果无法获取参数，返回默认值
-            return 0.1
+        fast_period = np.asarray(params.get('fast_ma_period', 10), dtype=np.float64)
+        slow_period = np.asarray(params.get('slow_ma_period', 30), dtype=np.float64)
+        trend_period = np.asarray(params.get('trend_filter_period', 100), dtype=np.float64)
+
+        # 1. 快慢线周期比例合理性（快线应明显小于慢线）
+        period_ratio = fast_period / slow_period
+        params_loss = np.where(
+            period_ratio > 0.8,
+            (period_ratio - 0.8) * 2,  # 快慢线差距太小
+            np.maximum(0.1 - period_ratio, 0.0),  # 快慢线差距太大
+        )
+
+        # 2. 趋势过滤周期应大于慢线周期
+        params_loss += np.where(trend_period <= slow_period, (slow_period - trend_period + 1) * 0.01, 0.0)
+
+        # 3. 避免极端参数值
+        params_loss += 0.5 * (
+            ((fast_period < 3) | (fast_period > 100)).astype(np.float64)
+            + ((slow_period < 10) | (slow_period > 200))
+            + ((trend_period < 20) | (trend_period > 500))
+        )
+
+        return params_loss
 
     @staticmethod
     def _print_debug_info(total_profit, win_rate, max_drawdown, trade_count,
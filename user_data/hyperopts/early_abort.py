@@ -0,0 +1,144 @@
+"""
+Hyperopt 提前终止没有希望的 epoch
+
+损失函数类可以提供一个可选的下界方法：
+
+    @staticmethod
+    def loss_lower_bound(results, trade_count, min_date, max_date, config, **kwargs) -> float
+
+results 是回测进行到一半时已平仓的交易（profit_ratio、trade_duration 两列，按平仓顺序），
+trade_count 是最终交易数的下界（已平仓 + 持仓中）。返回值必须不大于之后无论再发生什么交易
+得到的最终损失。回测过程中这个下界一旦超过本进程已完成 epoch 的最小损失，
+这个 epoch 就不可能成为最优结果，策略随即停止开新仓，剩余K线上只需把持仓跑完。
+
+被终止的 epoch 的交易停在终止时刻，它的最终损失仍不小于下界，所以不会被选为最优结果；
+但它报告给采样器的损失与完整回测不同，同一个 random-state 的搜索路径可能因此改变。
+
+默认关闭，在配置文件中开启：
+
+    "hyperopt_early_abort": {
+        "enabled": true,
+        "check_every": 24
+    }
+
+check_every 为每隔多少根K线检查一次下界。需要策略在 bot_loop_start 中调用
+epoch_monitor(self).update(current_time)，并在返回 True 后拒绝开仓
+（DoubleMAStrategy 的 bot_loop_start / confirm_trade_entry 是完整示例）；
+损失函数需要提供 loss_lower_bound，并在 hyperopt_loss_function 末尾调用 record_epoch。
+"""
+import atexit
+import logging
+import math
+from datetime import datetime
+
+from pandas import DataFrame
+
+from freqtrade.persistence import LocalTrade
+
+
+logger = logging.getLogger(__name__)
+
+# 本进程已完成 epoch 的最小损失。hyperopt 的每个工作进程各自记录：
+# 只会比全局最优更宽松，不会错误地终止可能成为最优的 epoch
+_best_loss = math.inf
+# 给出损失的损失函数类，以及回测区间（同一次 hyperopt 中所有 epoch 相同）
+_loss_class = None
+_dates: tuple[datetime, datetime] | None = None
+_aborted = 0
+_checked = 0
+
+
+def record_epoch(loss_class, loss: float, min_date: datetime, max_date: datetime) -> None:
+    """
+    损失函数在 hyperopt_loss_function 末尾调用，记录本 epoch 的最终损失
+    """
+    global _best_loss, _loss_class, _dates
+    _loss_class = loss_class
+    _dates = (min_date, max_date)
+    _best_loss = min(_best_loss, loss)
+
+
+def reset(strategy) -> None:
+    """
+    开始新的一组 epoch（例如 walk-forward 从训练窗口换到样本外窗口）：
+    清除已记录的最小损失和策略实例的 EpochMonitor，之后的 epoch 不会因为之前的结果被终止
+    """
+    global _best_loss
+    _best_loss = math.inf
+    strategy.__dict__.pop("_epoch_monitor", None)
+
+
+def _log_stats() -> None:
+    if _checked:
+        logger.info(f"Hyperopt early abort: {_aborted}/{_checked} epochs aborted")
+
+
+atexit.register(_log_stats)
+
+
+class EpochMonitor:
+    """
+    跟踪一个策略实例当前 epoch 的已平仓交易，按间隔计算损失下界
+    """
+
+    def __init__(self, config: dict, check_every: int) -> None:
+        self.config = config
+        self.check_every = max(int(check_every), 1)
+        self._last_time: datetime | None = None
+        self._reset()
+
+    def _reset(self) -> None:
+        self.aborted = False
+        self._candles = 0
+        self._seen = 0
+        self._profit: list[float] = []
+        self._duration: list[float] = []
+
+    def update(self, current_time: datetime) -> bool:
+        """
+        每根K线调用一次；返回 True 表示当前 epoch 已被终止，不应再开新仓
+        """
+        global _aborted, _checked
+        if self._last_time is None or current_time <= self._last_time:
+            # 时间倒退说明开始了新的 epoch
+            self._reset()
+            _checked += 1
+        self._last_time = current_time
+        if self.aborted or _loss_class is None:
+            return self.aborted
+        self._candles += 1
+        if self._candles % self.check_every:
+            return False
+
+        # 已平仓交易按平仓顺序追加，只需处理上次检查之后新增的部分
+        closed = LocalTrade.bt_trades
+        for trade in closed[self._seen:]:
+            self._profit.append(trade.close_profit)
+            self._duration.append((trade.close_date_utc - trade.open_date_utc).total_seconds() // 60)
+        self._seen = len(closed)
+        results = DataFrame({"profit_ratio": self._profit, "trade_duration": self._duration})
+        bound = _loss_class.loss_lower_bound(
+            results=results,
+            trade_count=len(closed) + len(LocalTrade.bt_trades_open),
+            min_date=_dates[0],
+            max_date=_dates[1],
+            config=self.config,
+        )
+        if bound > _best_loss:
+            self.aborted = True
+            _aborted += 1
+            logger.debug(f"Epoch aborted at {current_time}: lower bound {bound:.5f} > {_best_loss:.5f}")
+        return self.aborted
+
+
+def epoch_monitor(strategy) -> EpochMonitor | None:
+    """
+    策略实例的 EpochMonitor；未开启 hyperopt_early_abort 时返回 None
+    """
+    if "_epoch_monitor" not in strategy.__dict__:
+        settings = strategy.config.get("hyperopt_early_abort", {})
+        strategy._epoch_monitor = (
+            EpochMonitor(strategy.config, settings.get("check_every", 24))
+            if settings.get("enabled", False) else None
+        )
+    return strategy._epoch_monitor
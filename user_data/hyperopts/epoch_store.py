@@ -0,0 +1,269 @@
+"""
+Hyperopt epoch 索引库
+
+freqtrade 把每个 epoch 作为一行 JSON 追加到 user_data/hyperopt_results/*.fthypt，
+每行都带着全部交易（几十 KB）；hyperopt-list / hyperopt-show 每次查询都要把整个文件反序列化一遍，
+几万个 epoch 时要等很久。
+
+本模块把 epoch 的参数、损失和汇总指标（不含交易）同步到一个 SQLite 库中，
+按损失、交易数建了索引，最优 N 个、按条件筛选、按 run 比较都只读这几列：
+- runs：每个 .fthypt 文件一行，记录策略、时间周期、时间范围和已同步到的字节位置
+- epochs：每个 epoch 一行，主键 (run_id, epoch)；参数以 JSON 保存，可以用 json_extract 筛选
+
+.fthypt 文件只会追加，同步时从上次的字节位置继续读，只解析新增的完整行；
+hyperopt 运行期间也可以反复同步（scripts/hyperopt_epochs.py sync --follow）。
+库使用 WAL 模式，多个进程可以同时追加、查询。
+"""
+import json
+import math
+import sqlite3
+from pathlib import Path
+from typing import Any
+
+import pandas as pd
+
+from freqtrade.optimize.hyperopt.hyperopt_optimizer import MAX_LOSS
+
+
+# 从 results_metrics 中保存的汇总指标 {名称: 列类型}
+METRICS = {
+    "total_trades": "INTEGER",
+    "wins": "INTEGER",
+    "draws": "INTEGER",
+    "losses": "INTEGER",
+    "profit_total": "REAL",
+    "profit_total_abs": "REAL",
+    "profit_mean": "REAL",
+    "winrate": "REAL",
+    "max_drawdown_account": "REAL",
+    "max_drawdown_abs": "REAL",
+    "holding_avg_s": "REAL",
+    "sharpe": "REAL",
+    "sortino": "REAL",
+    "calmar": "REAL",
+    "expectancy": "REAL",
+    "profit_factor": "REAL",
+}
+
+# 每次提交的 epoch 数
+COMMIT_EVERY = 1000
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    file TEXT UNIQUE NOT NULL,
+    strategy TEXT,
+    timeframe TEXT,
+    timerange TEXT,
+    synced_bytes INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS epochs (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    epoch INTEGER NOT NULL,
+    loss REAL NOT NULL,
+    is_best INTEGER NOT NULL,
+    is_initial_point INTEGER NOT NULL,
+    {", ".join(f"{name} {kind}" for name, kind in METRICS.items())},
+    params TEXT NOT NULL,
+    params_details TEXT NOT NULL,
+    PRIMARY KEY (run_id, epoch)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS epochs_loss ON epochs (loss);
+CREATE INDEX IF NOT EXISTS epochs_run_loss ON epochs (run_id, loss);
+CREATE INDEX IF NOT EXISTS epochs_trades ON epochs (total_trades);
+"""
+
+_INSERT = f"INSERT OR REPLACE INTO epochs VALUES ({', '.join('?' * (len(METRICS) + 7))})"
+
+
+def _row(run_id: int, epoch: dict) -> tuple:
+    metrics = epoch["results_metrics"]
+    # 损失函数可能返回 NaN / inf（例如交易太少时的比率），NaN 写入 REAL NOT NULL 会失败，
+    # 与 freqtrade 对交易数不足的 epoch 一样按 MAX_LOSS 记录
+    loss = epoch["loss"] if math.isfinite(epoch["loss"]) else MAX_LOSS
+    return (
+        run_id,
+        epoch["current_epoch"],
+        loss,
+        int(epoch.get("is_best", False)),
+        int(epoch.get("is_initial_point", False)),
+        *(metrics.get(name) for name in METRICS),
+        json.dumps(epoch["params_dict"]),
+        json.dumps(epoch["params_details"]),
+    )
+
+
+def _run_condition(run: int | str) -> tuple[str, Any]:
+    """
+    run 为 run_id 或结果文件名的一部分
+    """
+    if isinstance(run, int) or str(run).isdigit():
+        return "r.run_id = ?", int(run)
+    return "r.file LIKE ?", f"%{run}%"
+
+
+class EpochStore:
+    """
+    epoch 索引库
+
+    :param path: SQLite 文件路径，不存在时创建
+    """
+
+    def __init__(self, path: Path | str) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(self.path, timeout=30)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self.db.close()
+
+    def _run_id(self, file: Path, epoch: dict) -> int:
+        metrics = epoch["results_metrics"]
+        self.db.execute(
+            "INSERT OR IGNORE INTO runs (file, strategy, timeframe, timerange) VALUES (?, ?, ?, ?)",
+            (file.name, metrics.get("strategy_name"), metrics.get("timeframe"),
+             metrics.get("timerange")),
+        )
+        return self.db.execute("SELECT run_id FROM runs WHERE file = ?", (file.name,)).fetchone()[0]
+
+    def append(self, file: Path | str, epochs: list[dict]) -> None:
+        """
+        追加 epoch（格式与 .fthypt 的每一行相同），file 为所属的结果文件名
+        """
+        if not epochs:
+            return
+        with self.db:
+            run_id = self._run_id(Path(file), epochs[0])
+            self.db.executemany(_INSERT, [_row(run_id, epoch) for epoch in epochs])
+
+    def sync_file(self, file: Path) -> int:
+        """
+        同步一个 .fthypt 文件上次同步之后新增的完整行，返回新增的 epoch 数
+        """
+        row = self.db.execute("SELECT run_id, synced_bytes FROM runs WHERE file = ?",
+                              (file.name,)).fetchone()
+        run_id, offset = row if row else (None, 0)
+        if file.stat().st_size <= offset:
+            return 0
+
+        added = 0
+        batch = []
+        with file.open("rb") as f:
+            f.seek(offset)
+            for line in f:
+                # 最后一行可能还没写完，留到下次同步
+                if not line.endswith(b"\n"):
+                    break
+                offset += len(line)
+                epoch = json.loads(line)
+                if run_id is None:
+                    with self.db:
+                        run_id = self._run_id(file, epoch)
+                batch.append(_row(run_id, epoch))
+                if len(batch) >= COMMIT_EVERY:
+                    added += self._commit(run_id, batch, offset)
+                    batch = []
+        if run_id is not None:
+            added += self._commit(run_id, batch, offset)
+        return added
+
+    def _commit(self, run_id: int, rows: list[tuple], offset: int) -> int:
+        # epoch 和同步位置在同一个事务中写入，中断后重新同步不会漏行或重复
+        with self.db:
+            self.db.executemany(_INSERT, rows)
+            self.db.execute("UPDATE runs SET synced_bytes = ? WHERE run_id = ?", (offset, run_id))
+        return len(rows)
+
+    def sync(self, results_dir: Path | str) -> int:
+        """
+        同步目录下所有 .fthypt 文件，返回新增的 epoch 数
+        """
+        return sum(self.sync_file(file) for file in sorted(Path(results_dir).glob("*.fthypt")))
+
+    def runs(self) -> pd.DataFrame:
+        """
+        每个 run 的 epoch 数、最优损失和所在的 epoch
+        """
+        return pd.read_sql_query(
+            """
+            SELECT r.run_id, r.file, r.strategy, r.timeframe, r.timerange,
+                   COUNT(e.epoch) AS epochs, MIN(e.loss) AS best_loss,
+                   (SELECT epoch FROM epochs WHERE run_id = r.run_id ORDER BY loss LIMIT 1)
+                       AS best_epoch
+            FROM runs r LEFT JOIN epochs e ON e.run_id = r.run_id
+            GROUP BY r.run_id ORDER BY r.run_id
+            """,
+            self.db,
+        )
+
+    def query(
+        self,
+        top: int | None = 10,
+        run: int | str | None = None,
+        strategy: str | None = None,
+        min_trades: int | None = None,
+        max_trades: int | None = None,
+        profitable: bool = False,
+        max_loss: float | None = None,
+        params: dict[str, Any] | None = None,
+    ) -> pd.DataFrame:
+        """
+        按损失从小到大列出满足条件的 epoch
+
+        :param run: run_id 或结果文件名（可以只写文件名的一部分）
+        :param params: 参数取值相等的条件，例如 {"ma_type": "EMA"}
+        """
+        where, args = [], []
+        if run is not None:
+            condition, value = _run_condition(run)
+            where.append(condition)
+            args.append(value)
+        if strategy is not None:
+            where.append("r.strategy = ?")
+            args.append(strategy)
+        if min_trades is not None:
+            where.append("e.total_trades >= ?")
+            args.append(min_trades)
+        if max_trades is not None:
+            where.append("e.total_trades <= ?")
+            args.append(max_trades)
+        if profitable:
+            where.append("e.profit_total > 0")
+        if max_loss is not None:
+            where.append("e.loss <= ?")
+            args.append(max_loss)
+        for name, value in (params or {}).items():
+            where.append("json_extract(e.params, ?) = ?")
+            args.extend((f"$.{name}", value))
+
+        sql = f"""
+            SELECT r.file, e.epoch, e.loss, {", ".join(f"e.{name}" for name in METRICS)}, e.params
+            FROM epochs e JOIN runs r ON r.run_id = e.run_id
+            {"WHERE " + " AND ".join(where) if where else ""}
+            ORDER BY e.loss
+            {"LIMIT ?" if top else ""}
+        """
+        if top:
+            args.append(top)
+        return pd.read_sql_query(sql, self.db, params=args)
+
+    def epoch(self, run: int | str, epoch: int) -> dict | None:
+        """
+        一个 epoch 的全部字段（参数按空间分组），不存在时返回 None
+        """
+        condition, value = _run_condition(run)
+        cursor = self.db.execute(
+            # 先确定 run，再按主键查找
+            f"SELECT r.file, e.* FROM runs r CROSS JOIN epochs e ON e.run_id = r.run_id "
+            f"WHERE {condition} AND e.epoch = ?",
+            (value, epoch),
+        )
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        row = dict(zip((column[0] for column in cursor.description), row))
+        row["params"] = json.loads(row["params"])
+        row["params_details"] = json.loads(row["params_details"])
+        return row
@@ -0,0 +1,24 @@
+"""
+按 freqtrade hyperopt 的命令行参数生成配置
+
+scripts/distributed_hyperopt.py、scripts/walk_forward.py 等脚本在 `--` 之后接收完整的
+`freqtrade hyperopt` 参数，用这里的 load_config 得到与 freqtrade hyperopt 完全相同的配置。
+"""
+from typing import Any
+
+from freqtrade.commands import Arguments
+from freqtrade.commands.optimize_commands import setup_optimize_configuration
+from freqtrade.enums import RunMode
+from freqtrade.exceptions import OperationalException
+
+
+def load_config(argv: list[str]) -> dict[str, Any]:
+    """
+    按 freqtrade hyperopt 的命令行参数生成配置
+    """
+    args = Arguments(argv).get_parsed_arg()
+    if args.get("command") != "hyperopt":
+        raise OperationalException(
+            "Expected freqtrade hyperopt arguments, e.g. `-- hyperopt --config ...`"
+        )
+    return setup_optimize_configuration(args, RunMode.HYPEROPT)
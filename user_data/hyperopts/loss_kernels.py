@@ -0,0 +1,141 @@
+"""
+Hyperopt 损失函数共用的交易统计内核
+
+输入是连续的 numpy 数组（results["profit_ratio"].to_numpy() 等），
+一次算出损失函数常用的统计量，代替对 results 的多次 pandas 遍历：
+- trade_stats：单个 epoch（一份 results）
+- segment_stats：多个 epoch 的交易拼接在一起，按 epoch 编号分段统计
+
+回撤按交易利润的累积和近似计算（hyperopt 中拿不到按资金曲线计算的 max_drawdown）：
+累积利润与其历史最高点之差的最小值，与
+    cumulative = results["profit_ratio"].cumsum()
+    drawdown = cumulative - cumulative.expanding().max()
+相同。
+
+trade_stats 的中间结果写在模块级的暂存数组中，数组只在交易数超过当前容量时才重新分配，
+hyperopt 的每个 epoch 不再创建临时 Series。暂存数组不是线程安全的（hyperopt 的工作进程是单线程的）。
+"""
+import numpy as np
+
+
+# 暂存数组：[累积利润, 历史最高点/回撤], [是否盈利]
+_scratch_float = np.empty((2, 0))
+_scratch_bool = np.empty(0, dtype=bool)
+
+
+def _scratch(n: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    global _scratch_float, _scratch_bool
+    if _scratch_float.shape[1] < n:
+        # 按 2 的幂扩容，交易数在附近波动时不会反复分配
+        size = 1 << max(n - 1, 1).bit_length()
+        _scratch_float = np.empty((2, size))
+        _scratch_bool = np.empty(size, dtype=bool)
+    return _scratch_float[0, :n], _scratch_float[1, :n], _scratch_bool[:n]
+
+
+def trade_stats(
+    profit_ratio: np.ndarray, trade_duration: np.ndarray | None = None, drawdown: bool = True
+) -> dict[str, float]:
+    """
+    一个 epoch 的交易统计
+
+    :param profit_ratio: 每笔交易的 profit_ratio，按平仓时间排序
+    :param trade_duration: 每笔交易的持仓时间（分钟），可不传
+    :param drawdown: 是否计算回撤；回撤占了大部分计算量，不需要时应关闭
+    :return: trade_count、total_profit、avg_profit、win_rate、max_drawdown、avg_drawdown
+             （回撤为正数，drawdown=False 时没有这两项）、avg_trade_duration、max_trade_duration；
+             没有交易时全部为 0
+    """
+    profit_ratio = np.ascontiguousarray(profit_ratio, dtype=np.float64)
+    n = len(profit_ratio)
+    if n == 0:
+        stats = {"trade_count": 0, "total_profit": 0.0, "avg_profit": 0.0, "win_rate": 0.0}
+        if drawdown:
+            stats.update(max_drawdown=0.0, avg_drawdown=0.0)
+        return {**stats, "avg_trade_duration": 0.0, "max_trade_duration": 0.0}
+
+    cumulative, drawdowns, wins = _scratch(n)
+    np.greater(profit_ratio, 0, out=wins)
+    total_profit = float(profit_ratio.sum())
+    stats = {
+        "trade_count": n,
+        "total_profit": total_profit,
+        "avg_profit": total_profit / n,
+        "win_rate": np.count_nonzero(wins) / n,
+    }
+    if drawdown:
+        np.cumsum(profit_ratio, out=cumulative)
+        np.maximum.accumulate(cumulative, out=drawdowns)
+        np.subtract(cumulative, drawdowns, out=drawdowns)
+        stats["max_drawdown"] = abs(float(drawdowns.min()))
+        stats["avg_drawdown"] = abs(float(drawdowns.mean()))
+
+    avg_trade_duration = max_trade_duration = 0.0
+    if trade_duration is not None:
+        trade_duration = np.asarray(trade_duration)
+        avg_trade_duration = float(trade_duration.mean())
+        max_trade_duration = float(trade_duration.max())
+
+    stats["avg_trade_duration"] = avg_trade_duration
+    stats["max_trade_duration"] = max_trade_duration
+    return stats
+
+
+def segment_stats(
+    profit_ratio: np.ndarray,
+    trade_duration: np.ndarray,
+    epoch: np.ndarray,
+    epochs: int,
+) -> dict[str, np.ndarray]:
+    """
+    按 epoch 分段的交易统计，键与 trade_stats 相同，每个值都是长度为 epochs 的数组
+
+    全部使用分段归约（bincount / reduceat），不按 epoch 循环。
+    同一 epoch 内的交易按平仓时间排序；不同 epoch 可以交错，会先按 epoch 稳定排序。
+    参数可以是 numpy 数组，也可以是 pyarrow 的 Array / ChunkedArray。
+
+    :param epoch: 每笔交易所属的 epoch（0 ~ epochs-1）
+    """
+    profit_ratio = np.asarray(profit_ratio, dtype=np.float64)
+    trade_duration = np.asarray(trade_duration, dtype=np.float64)
+    epoch = np.asarray(epoch, dtype=np.int64)
+    if len(epoch) > 1 and (np.diff(epoch) < 0).any():
+        order = np.argsort(epoch, kind="stable")
+        profit_ratio, trade_duration, epoch = profit_ratio[order], trade_duration[order], epoch[order]
+
+    counts = np.bincount(epoch, minlength=epochs)
+    total_profit = np.bincount(epoch, weights=profit_ratio, minlength=epochs)
+    wins = np.bincount(epoch, weights=profit_ratio > 0, minlength=epochs)
+    duration = np.bincount(epoch, weights=trade_duration, minlength=epochs)
+    nonempty = counts > 0
+    # 没有交易的 epoch 按 0 计算
+    divisor = np.maximum(counts, 1)
+
+    max_drawdown = np.zeros(epochs)
+    drawdown_sum = np.zeros(epochs)
+    max_trade_duration = np.zeros(epochs)
+    if len(profit_ratio):
+        starts = (np.cumsum(counts) - counts)[nonempty]
+        # 分段累积利润：全局累积和减去本段之前的累积和
+        prefix = np.concatenate(([0.0], np.cumsum(profit_ratio)))
+        cumulative = prefix[1:] - np.repeat(prefix[starts], counts[nonempty])
+        # 分段历史最高点：每段整体抬高到前面所有段之上，全局的累积最大值就不会跨段，
+        # 再取最高点所在位置的原值，避免抬高带来的舍入误差
+        shifted = cumulative + epoch * (np.ptp(cumulative) + 1.0)
+        is_peak = shifted == np.maximum.accumulate(shifted)
+        peak_idx = np.maximum.accumulate(np.where(is_peak, np.arange(len(shifted)), 0))
+        drawdown = cumulative - cumulative[peak_idx]
+        max_drawdown[nonempty] = np.abs(np.minimum.reduceat(drawdown, starts))
+        drawdown_sum[nonempty] = np.add.reduceat(drawdown, starts)
+        max_trade_duration[nonempty] = np.maximum.reduceat(trade_duration, starts)
+
+    return {
+        "trade_count": counts,
+        "total_profit": total_profit,
+        "avg_profit": total_profit / divisor,
+        "win_rate": wins / divisor,
+        "max_drawdown": max_drawdown,
+        "avg_drawdown": np.abs(drawdown_sum / divisor),
+        "avg_trade_duration": duration / divisor,
+        "max_trade_duration": max_trade_duration,
+    }
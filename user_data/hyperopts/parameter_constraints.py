@@ -0,0 +1,330 @@
+"""
+Hyperopt 参数约束
+
+策略用 parameter_constraints 属性声明可优化参数之间的约束，例如：
+
+    parameter_constraints = (
+        "fast_ma_period <= 0.8 * slow_ma_period",
+        "slow_ma_period < trend_filter_period",
+    )
+
+每条约束由参数名和 < / <= 组成，右侧（或左侧）的参数可以乘一个正系数，
+也可以连写："fast_ma_period < slow_ma_period < trend_filter_period"。
+
+随机采样时很大一部分点违反这类约束，回测之后再由损失函数惩罚就白白花掉了一次回测。
+ConstrainedSampler 包装 optuna 的采样器，在回测之前修复违反约束的点：
+- 逐个参数采样（sample_independent）时，按已确定的参数推出当前参数的可行区间，
+  不在区间内就重新采样，多次仍不满足时截断到区间内
+- 多个参数一起采样（sample_relative，如 NSGA 的交叉）时，按顺序把每个参数截断到可行区间
+可行区间由约束在各参数范围上反复收缩得到，所以先采样的参数不会让后面的参数无值可取。
+
+在策略中使用（DoubleMAStrategy 是完整示例）：
+
+    class HyperOpt:
+        @staticmethod
+        def generate_estimator(dimensions, **kwargs):
+            from parameter_constraints import constrained_sampler
+            return constrained_sampler(MyStrategy, dimensions, kwargs["random_state"])
+
+hyperopt 的工作进程中，策略在 bot_loop_start 中调用 track_parameters(self)，
+损失函数就可以用 current_parameters() 读取当前 epoch 的参数值。
+"""
+import atexit
+import logging
+import math
+import re
+import warnings
+from collections.abc import Callable, Iterable
+from typing import Any
+
+from optuna.distributions import BaseDistribution, FloatDistribution, IntDistribution
+from optuna.exceptions import ExperimentalWarning
+from optuna.samplers import BaseSampler
+
+from freqtrade.exceptions import OperationalException
+from freqtrade.optimize.hyperopt.hyperopt_optimizer import INITIAL_POINTS, optuna_samplers_dict
+
+
+logger = logging.getLogger(__name__)
+
+_TERM = re.compile(r"^(?:(\d+(?:\.\d*)?|\.\d+)\s*\*\s*)?([A-Za-z_]\w*)$")
+_OPERATOR = re.compile(r"\s*(<=|<)\s*")
+
+# 本进程中参数值正在被 hyperopt 使用的策略实例
+_strategy = None
+_adjusted = 0
+_sampled = 0
+
+
+class Constraint:
+    """
+    left < factor * right（strict）或 left <= factor * right
+    """
+
+    def __init__(self, left: str, right: str, factor: float = 1.0, strict: bool = True) -> None:
+        if factor <= 0:
+            raise OperationalException(f"参数约束的系数必须为正数：{factor}")
+        self.left = left
+        self.right = right
+        self.factor = factor
+        self.strict = strict
+
+    def satisfied(self, values: dict[str, Any]) -> bool:
+        bound = self.factor * values[self.right]
+        return values[self.left] < bound if self.strict else values[self.left] <= bound
+
+    def __repr__(self) -> str:
+        factor = "" if self.factor == 1 else f"{self.factor:g} * "
+        return f"{self.left} {'<' if self.strict else '<='} {factor}{self.right}"
+
+
+def _term(text: str, declaration: str) -> tuple[float, str]:
+    match = _TERM.match(text.strip())
+    if match is None:
+        raise OperationalException(f"无法解析参数约束 {declaration!r}：{text!r}")
+    return float(match.group(1) or 1), match.group(2)
+
+
+def parse_constraints(declarations: Iterable[str]) -> list[Constraint]:
+    """
+    解析策略的 parameter_constraints 声明
+    """
+    constraints = []
+    for declaration in declarations:
+        parts = _OPERATOR.split(declaration.strip())
+        if len(parts) < 3:
+            raise OperationalException(f"参数约束 {declaration!r} 中没有 < 或 <=")
+        terms = [_term(text, declaration) for text in parts[::2]]
+        for (left_factor, left), operator, (right_factor, right) in zip(
+            terms, parts[1::2], terms[1:]
+        ):
+            constraints.append(Constraint(left, right, right_factor / left_factor, operator == "<"))
+    return constraints
+
+
+def _below(dist: BaseDistribution, bound: float, strict: bool) -> float:
+    """
+    dist 的取值中小于（strict）或不大于 bound 的最大值
+    """
+    if not dist.step:
+        return math.nextafter(bound, -math.inf) if strict else bound
+    tolerance = dist.step * 1e-9
+    value = dist.low + math.floor((bound - dist.low + tolerance) / dist.step) * dist.step
+    if strict and value >= bound - tolerance:
+        value -= dist.step
+    return value if isinstance(dist, IntDistribution) else round(value, 12)
+
+
+def _above(dist: BaseDistribution, bound: float, strict: bool) -> float:
+    """
+    dist 的取值中大于（strict）或不小于 bound 的最小值
+    """
+    if not dist.step:
+        return math.nextafter(bound, math.inf) if strict else bound
+    tolerance = dist.step * 1e-9
+    value = dist.low + math.ceil((bound - dist.low - tolerance) / dist.step) * dist.step
+    if strict and value <= bound + tolerance:
+        value += dist.step
+    return value if isinstance(dist, IntDistribution) else round(value, 12)
+
+
+class ConstrainedSampler(BaseSampler):
+    """
+    在 base 采样器给出的点违反约束时修复该点的采样器
+
+    :param base: 实际采样的 optuna 采样器
+    :param constraints: parse_constraints 的结果
+    :param distributions: 参与优化的参数 {参数名: 分布}（freqtrade 的 dimensions）
+    :param fixed: 约束中用到、但不参与优化的参数的取值
+    :param retries: 逐个参数采样时，不满足约束最多重新采样的次数
+    """
+
+    def __init__(
+        self,
+        base: BaseSampler,
+        constraints: list[Constraint],
+        distributions: dict[str, BaseDistribution],
+        fixed: dict[str, float] | None = None,
+        retries: int = 10,
+    ) -> None:
+        self.base = base
+        self.constraints = constraints
+        self.retries = retries
+        self.fixed = dict(fixed or {})
+        names = {c.left for c in constraints} | {c.right for c in constraints}
+        for name in names - set(distributions) - set(self.fixed):
+            raise OperationalException(f"参数约束中的 {name} 既不参与优化也没有给出取值")
+        for name in names & set(distributions):
+            if not isinstance(distributions[name], (IntDistribution, FloatDistribution)):
+                raise OperationalException(f"参数约束只支持数值参数，{name} 不是")
+        self.distributions = {
+            name: dist for name, dist in distributions.items() if name in names
+        }
+        # sample_relative 给出的值，逐个参数采样时作为已确定的参数
+        self._relative: dict[int, dict[str, Any]] = {}
+        self._adjusted_trials: set[int] = set()
+
+    def feasible_range(self, name: str, known: dict[str, Any]) -> tuple[float, float]:
+        """
+        known 中的参数已确定时，name 的可行区间；low > high 表示已无可行值
+        """
+        ranges = {n: (dist.low, dist.high) for n, dist in self.distributions.items()}
+        ranges.update((n, (v, v)) for n, v in self.fixed.items())
+        ranges.update((n, (v, v)) for n, v in known.items() if n in ranges)
+        # 每条约束收紧左侧的上界和右侧的下界，直到不再变化（链式约束最多传递约束条数次）
+        for _ in range(len(self.constraints) + 1):
+            changed = False
+            for c in self.constraints:
+                left_low, left_high = ranges[c.left]
+                right_low, right_high = ranges[c.right]
+                if c.left in self.distributions and c.left not in known:
+                    high = _below(self.distributions[c.left], c.factor * right_high, c.strict)
+                    if high < left_high:
+                        ranges[c.left] = (left_low, high)
+                        changed = True
+                if c.right in self.distributions and c.right not in known:
+                    low = _above(self.distributions[c.right], left_low / c.factor, c.strict)
+                    if low > right_low:
+                        ranges[c.right] = (low, right_high)
+                        changed = True
+            if not changed:
+                break
+        return ranges[name]
+
+    def _known(self, trial) -> dict[str, Any]:
+        return {**self._relative.get(trial.number, {}), **trial.params}
+
+    def _repair(self, trial, name: str, value: Any, known: dict[str, Any]) -> Any:
+        low, high = self.feasible_range(name, known)
+        if low > high:
+            logger.warning(f"trial {trial.number}: 已确定的参数 {known} 下 {name} 无法满足约束")
+            return value
+        if low <= value <= high:
+            return value
+        self._adjusted_trials.add(trial.number)
+        return min(max(value, low), high)
+
+    def infer_relative_search_space(self, study, trial) -> dict[str, BaseDistribution]:
+        return self.base.infer_relative_search_space(study, trial)
+
+    def sample_relative(self, study, trial, search_space) -> dict[str, Any]:
+        params = self.base.sample_relative(study, trial, search_space)
+        known = dict(trial.params)
+        for name, value in params.items():
+            if name in self.distributions and name not in known:
+                params[name] = self._repair(trial, name, value, known)
+            known[name] = params[name]
+        self._relative[trial.number] = params
+        return params
+
+    def sample_independent(self, study, trial, param_name, param_distribution) -> Any:
+        value = self.base.sample_independent(study, trial, param_name, param_distribution)
+        if param_name not in self.distributions:
+            return value
+        known = self._known(trial)
+        low, high = self.feasible_range(param_name, known)
+        for _ in range(self.retries):
+            if low <= value <= high or low > high:
+                break
+            self._adjusted_trials.add(trial.number)
+            value = self.base.sample_independent(study, trial, param_name, param_distribution)
+        return self._repair(trial, param_name, value, known)
+
+    def before_trial(self, study, trial) -> None:
+        self.base.before_trial(study, trial)
+
+    def after_trial(self, study, trial, state, values) -> None:
+        global _adjusted, _sampled
+        _sampled += 1
+        _adjusted += trial.number in self._adjusted_trials
+        self._relative.pop(trial.number, None)
+        self._adjusted_trials.discard(trial.number)
+        self.base.after_trial(study, trial, state, values)
+
+    def reseed_rng(self) -> None:
+        self.base.reseed_rng()
+
+    def __str__(self) -> str:
+        return f"{self.base} + {len(self.constraints)} parameter constraints"
+
+
+def _log_stats() -> None:
+    if _sampled:
+        logger.info(f"Constrained sampler: {_adjusted}/{_sampled} trials resampled or repaired")
+
+
+atexit.register(_log_stats)
+
+
+def base_sampler(name: str, random_state: int | None) -> BaseSampler:
+    """
+    与 freqtrade 按名称创建采样器的方式相同
+    """
+    if name not in optuna_samplers_dict:
+        raise OperationalException(f"Optuna Sampler {name} not supported.")
+    with warnings.catch_warnings():
+        warnings.filterwarnings(action="ignore", category=ExperimentalWarning)
+        if name in ("NSGAIIISampler", "NSGAIISampler"):
+            return optuna_samplers_dict[name](seed=random_state, population_size=INITIAL_POINTS)
+        if name in ("GPSampler", "TPESampler", "CmaEsSampler"):
+            return optuna_samplers_dict[name](seed=random_state, n_startup_trials=INITIAL_POINTS)
+        return optuna_samplers_dict[name](seed=random_state)
+
+
+def _fixed_values(strategy_class, constraints: list[Constraint], distributions: dict) -> dict:
+    """
+    约束中用到、但不参与优化的参数按策略中的取值固定
+    """
+    names = {c.left for c in constraints} | {c.right for c in constraints}
+    return {
+        name: getattr(strategy_class, name).value for name in names if name not in distributions
+    }
+
+
+def feasibility_check(strategy_class, dimensions: list) -> Callable[[dict], bool] | None:
+    """
+    检查一组参数是否满足策略的 parameter_constraints 的函数；策略没有声明约束时返回 None
+    """
+    constraints = parse_constraints(getattr(strategy_class, "parameter_constraints", ()))
+    if not constraints:
+        return None
+    fixed = _fixed_values(strategy_class, constraints, {dim.name for dim in dimensions})
+    return lambda params: all(c.satisfied({**fixed, **params}) for c in constraints)
+
+
+def constrained_sampler(
+    strategy_class,
+    dimensions: list,
+    random_state: int | None,
+    sampler: str | BaseSampler = "NSGAIIISampler",
+) -> BaseSampler:
+    """
+    按策略类的 parameter_constraints 创建 ConstrainedSampler；策略没有声明约束时返回原采样器
+
+    :param dimensions: freqtrade 传给 generate_estimator 的 dimensions
+    :param sampler: 实际采样的采样器：名称（与 generate_estimator 可返回的名称相同）或采样器实例
+    """
+    base = base_sampler(sampler, random_state) if isinstance(sampler, str) else sampler
+    constraints = parse_constraints(getattr(strategy_class, "parameter_constraints", ()))
+    if not constraints:
+        return base
+    distributions = {dim.name: dim for dim in dimensions}
+    fixed = _fixed_values(strategy_class, constraints, distributions)
+    return ConstrainedSampler(base, constraints, distributions, fixed)
+
+
+def track_parameters(strategy) -> None:
+    """
+    记录本进程中正在回测的策略实例，供损失函数读取当前 epoch 的参数
+    """
+    global _strategy
+    _strategy = strategy
+
+
+def current_parameters() -> dict[str, Any]:
+    """
+    track_parameters 记录的策略实例的参数值；没有记录时为空
+    """
+    if _strategy is None:
+        return {}
+    return {name: param.value for name, param in _strategy.enumerate_parameters()}
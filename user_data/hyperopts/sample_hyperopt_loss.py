@@ -6,6 +6,9 @@ from pandas import DataFrame
 from freqtrade.constants import Config
 from freqtrade.optimize.hyperopt import IHyperOptLoss
 
+import helper_paths  # noqa: F401
+from loss_kernels import trade_stats
+
 
 # Define some constants:
 
@@ -47,8 +50,11 @@ class SampleHyperOptLoss(IHyperOptLoss):
         """
         Objective function, returns smaller number for better results
         """
-        total_profit = results["profit_ratio"].sum()
-        trade_duration = results["trade_duration"].mean()
+        stats = trade_stats(
+            results["profit_ratio"].to_numpy(), results["trade_duration"].to_numpy(), drawdown=False
+        )
+        total_profit = stats["total_profit"]
+        trade_duration = stats["avg_trade_duration"]
 
         trade_loss = 1 - 0.25 * exp(-((trade_count - TARGET_TRADES) ** 2) / 10**5.8)
         profit_loss = max(0, 1 - total_profit / EXPECTED_MAX_PROFIT)
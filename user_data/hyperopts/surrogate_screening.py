@@ -0,0 +1,378 @@
+"""
+Hyperopt 代理模型预筛选
+
+user_data/hyperopt_results 中保存了以往每次 hyperopt 的全部 epoch，但新的 hyperopt 总是从随机点开始。
+开启预筛选后，在同一策略、同一时间周期、时间范围和交易对、且固定参数相同的历史 epoch 上训练一个梯度提升树回归模型
+（scikit-learn，freqtrade 的 hyperopt 依赖），用来预测参数组合的损失：
+前 trials 个 trial（默认与 freqtrade 的初始随机点数相同）不再直接使用随机点，
+而是每个 trial 随机抽取 1 / top_fraction 个候选组合，只把预测损失最小的一个交给真正的回测。
+之后的 trial 交还给原采样器，它以这批筛选过的点作为初始种群继续搜索。
+
+- 历史结果中没有记录当时使用的损失函数，所有历史 epoch 都按本次的损失函数用保存的交易重新计算损失
+- 模型拟合的是损失的排名（0 ~ 1），不受 MAX_LOSS 等极端值影响；重复的参数组合取平均
+- 模型只能从见过的区域外推，历史中不同的参数组合越多（不同的 --random-state）效果越好
+- 参数不在本次搜索范围内、或缺少本次优化的参数的历史 epoch 不参与训练
+- 本次不优化的参数（其他空间的策略参数、ROI、止损、追踪止损、max_open_trades）取值不同的历史 epoch 不参与训练
+- 历史 epoch 少于 min_history 时不预筛选
+- 策略声明了 parameter_constraints 时，只从满足约束的候选中选取
+
+默认关闭，在配置文件中开启：
+
+    "hyperopt_surrogate": {
+        "enabled": true,
+        "trials": 30,
+        "top_fraction": 0.1,
+        "min_history": 50
+    }
+
+generate_estimator 拿不到配置，需要策略在 bot_start 中把 self.config 和当前交易对列表记到 HyperOpt 上，
+再在 generate_estimator 中调用 surrogate_sampler（DoubleMAStrategy、SampleStrategy 是完整示例）。
+本模块依赖 scikit-learn，只应在开启预筛选时导入。
+"""
+import json
+import logging
+import math
+from collections.abc import Callable
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pandas as pd
+from optuna.distributions import BaseDistribution, CategoricalDistribution
+from optuna.samplers import BaseSampler
+from sklearn.ensemble import GradientBoostingRegressor
+
+from freqtrade.optimize.hyperopt.hyperopt_optimizer import INITIAL_POINTS, MAX_LOSS
+from freqtrade.optimize.hyperopt_tools import HyperoptTools
+from freqtrade.resolvers.hyperopt_resolver import HyperOptLossResolver
+from freqtrade.strategy.hyper import detect_parameters
+
+from parameter_constraints import base_sampler, feasibility_check
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTINGS = {
+    "enabled": False,
+    "trials": INITIAL_POINTS,
+    "top_fraction": 0.1,
+    "min_history": 50,
+}
+
+# 候选中满足约束的太少时，最多抽取的轮数
+MAX_DRAW_ROUNDS = 20
+
+TRAILING_KEYS = (
+    "trailing_stop",
+    "trailing_stop_positive",
+    "trailing_stop_positive_offset",
+    "trailing_only_offset_is_reached",
+)
+
+
+def history_files(config: dict, strategy_name: str) -> list[Path]:
+    """
+    策略的历史 hyperopt 结果文件（与 freqtrade 的命名方式相同）
+    """
+    directory = Path(config["user_data_dir"]) / "hyperopt_results"
+    return sorted(directory.glob(f"strategy_{strategy_name}_*.fthypt"))
+
+
+def _contains(dist: BaseDistribution, value: Any) -> bool:
+    try:
+        return dist._contains(dist.to_internal_repr(value))
+    except (TypeError, ValueError):
+        return False
+
+
+def not_optimized_params(strategy_class, config: dict) -> dict[str, dict]:
+    """
+    本次 hyperopt 中固定不变的参数，格式与 epoch 的 params_not_optimized 相同
+    （freqtrade 的 get_no_optimize_params 和 HyperOptimizer._get_no_optimize_details）
+
+    策略参数取类上的参数对象（加载参数文件后的值）；ROI、止损等取配置中的值
+    （加载策略时 freqtrade 会把策略最终使用的值写回配置）
+    """
+    params: dict[str, dict] = {"buy": {}, "sell": {}, "protection": {}}
+    for space in list(params):
+        for name, param in detect_parameters(strategy_class, space):
+            if not param.optimize or not HyperoptTools.has_space(config, space):
+                params[param.category or space][name] = param.value
+    if not HyperoptTools.has_space(config, "roi"):
+        params["roi"] = {str(key): value for key, value in config["minimal_roi"].items()}
+    if not HyperoptTools.has_space(config, "stoploss"):
+        params["stoploss"] = {"stoploss": config["stoploss"]}
+    if not HyperoptTools.has_space(config, "trailing"):
+        params["trailing"] = {key: config.get(key) for key in TRAILING_KEYS}
+    if not HyperoptTools.has_space(config, "trades"):
+        params["max_open_trades"] = {"max_open_trades": config["max_open_trades"]}
+    return params
+
+
+def _same_fixed_params(epoch: dict, fixed: dict[str, dict]) -> bool:
+    """
+    epoch 中这些参数的取值与本次相同（当时参与优化的在 params_details，固定的在 params_not_optimized）
+    """
+    for section, values in fixed.items():
+        stored = {
+            **epoch.get("params_not_optimized", {}).get(section, {}),
+            **epoch.get("params_details", {}).get(section, {}),
+        }
+        if section == "roi":
+            # ROI 表整体比较，多出的时间点也会改变结果
+            if stored != values:
+                return False
+        elif any(name not in stored or stored[name] != value for name, value in values.items()):
+            return False
+    return True
+
+
+def rescore(loss, epoch: dict, config: dict) -> float:
+    """
+    用 epoch 保存的交易按当前的损失函数重新计算损失，调用方式与 freqtrade hyperopt 相同
+    """
+    metrics = epoch["results_metrics"]
+    trade_count = metrics["total_trades"]
+    if trade_count < config.get("hyperopt_min_trades", 1):
+        return MAX_LOSS
+    results = pd.DataFrame(metrics["trades"])
+    for column in ("open_date", "close_date"):
+        results[column] = pd.to_datetime(results[column], utc=True)
+    return float(loss.hyperopt_loss_function(
+        results=results,
+        trade_count=trade_count,
+        min_date=datetime.fromtimestamp(metrics["backtest_start_ts"] / 1000, tz=timezone.utc),
+        max_date=datetime.fromtimestamp(metrics["backtest_end_ts"] / 1000, tz=timezone.utc),
+        config=config,
+        processed={},
+        backtest_stats=metrics,
+        starting_balance=metrics["starting_balance"],
+        # 损失函数可能依赖参数值（如 DoubleMAHyperOptLoss 的参数合理性损失）
+        params=epoch["params_dict"],
+    ))
+
+
+def load_history(
+    config: dict,
+    strategy_class,
+    distributions: dict[str, BaseDistribution],
+    pairlist: list[str] | None = None,
+) -> pd.DataFrame:
+    """
+    与本次 hyperopt 可比的历史 epoch：每行为一个 epoch 的参数和重新计算的损失（loss 列）
+
+    要求策略、时间周期、时间范围、固定参数（见 not_optimized_params）都相同；
+    给出 pairlist 时还要求回测的交易对相同（不计顺序）
+    """
+    loss = HyperOptLossResolver.load_hyperoptloss(config)
+    timerange = config.get("timerange")
+    fixed = not_optimized_params(strategy_class, config)
+    pairs = None if pairlist is None else set(pairlist)
+    rows = []
+    for file in history_files(config, strategy_class.__name__):
+        with file.open() as f:
+            for line in f:
+                epoch = json.loads(line)
+                metrics = epoch["results_metrics"]
+                params = epoch["params_dict"]
+                if (
+                    metrics.get("timeframe") != config["timeframe"]
+                    or (timerange and metrics.get("timerange") != timerange)
+                    or (pairs is not None and set(metrics.get("pairlist", ())) != pairs)
+                    or not _same_fixed_params(epoch, fixed)
+                    or not all(
+                        name in params and _contains(dist, params[name])
+                        for name, dist in distributions.items()
+                    )
+                ):
+                    continue
+                rows.append({
+                    **{name: params[name] for name in distributions},
+                    "loss": rescore(loss, epoch, config),
+                })
+    return pd.DataFrame(rows, columns=[*distributions, "loss"])
+
+
+def encode(params: pd.DataFrame, distributions: dict[str, BaseDistribution]) -> np.ndarray:
+    """
+    参数转为模型的特征：数值参数原样使用，分类参数 one-hot 编码
+    """
+    columns = []
+    for name, dist in distributions.items():
+        if isinstance(dist, CategoricalDistribution):
+            values = params[name].to_numpy(dtype=object)
+            columns.extend((values == choice).astype(np.float64) for choice in dist.choices)
+        else:
+            columns.append(params[name].to_numpy(dtype=np.float64))
+    return np.column_stack(columns)
+
+
+def fit_model(history: pd.DataFrame, distributions: dict[str, BaseDistribution], seed: int | None):
+    """
+    在历史 epoch 上拟合损失排名的回归模型
+
+    同一组参数可能在多次 hyperopt 中出现（例如相同的 --random-state），先按参数取平均，
+    避免重复的点在训练中占过大的权重
+    """
+    history = history.groupby(list(distributions), as_index=False, sort=False)["loss"].mean()
+    model = GradientBoostingRegressor(
+        n_estimators=200, max_depth=3, learning_rate=0.05, subsample=0.8, random_state=seed
+    )
+    model.fit(encode(history, distributions), history["loss"].rank(pct=True).to_numpy())
+    return model
+
+
+def _native(value: Any) -> Any:
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def random_candidates(
+    distributions: dict[str, BaseDistribution], size: int, rng: np.random.Generator
+) -> pd.DataFrame:
+    """
+    在搜索空间中均匀抽取 size 个参数组合
+    """
+    columns = {}
+    for name, dist in distributions.items():
+        if isinstance(dist, CategoricalDistribution):
+            choices = np.empty(len(dist.choices), dtype=object)
+            choices[:] = dist.choices
+            columns[name] = choices[rng.integers(len(dist.choices), size=size)]
+        elif dist.step:
+            count = int(round((dist.high - dist.low) / dist.step)) + 1
+            values = dist.low + dist.step * rng.integers(count, size=size)
+            columns[name] = values if isinstance(dist.low, int) else np.round(values, 12)
+        elif dist.log:
+            columns[name] = np.exp(rng.uniform(np.log(dist.low), np.log(dist.high), size))
+        else:
+            columns[name] = rng.uniform(dist.low, dist.high, size)
+    return pd.DataFrame(columns)
+
+
+class SurrogateSampler(BaseSampler):
+    """
+    前 trials 个 trial 从随机候选中选取代理模型预测最优的组合，之后交给 base 采样器
+
+    :param base: 预筛选结束后使用的采样器
+    :param distributions: 参与优化的参数 {参数名: 分布}
+    :param model: fit_model 拟合的模型
+    :param feasible: 判断候选是否满足参数约束的函数，可为 None
+    """
+
+    def __init__(
+        self,
+        base: BaseSampler,
+        distributions: dict[str, BaseDistribution],
+        model,
+        trials: int = INITIAL_POINTS,
+        top_fraction: float = 0.1,
+        feasible: Callable[[dict], bool] | None = None,
+        seed: int | None = None,
+    ) -> None:
+        self.base = base
+        self.distributions = distributions
+        self.model = model
+        self.trials = trials
+        self.candidates = max(math.ceil(1 / top_fraction), 1)
+        self.feasible = feasible
+        self._rng = np.random.default_rng(seed)
+
+    def _screening(self, trial) -> bool:
+        return trial.number < self.trials
+
+    def _draw(self, study) -> pd.DataFrame:
+        """
+        抽取候选：满足约束、且本次 hyperopt 中没有出现过（freqtrade 会跳过重复的点）
+        """
+        names = list(self.distributions)
+        seen = {
+            tuple(trial.params.get(name) for name in names)
+            for trial in study.get_trials(deepcopy=False)
+        }
+        drawn = []
+        count = 0
+        for _ in range(MAX_DRAW_ROUNDS):
+            batch = random_candidates(self.distributions, self.candidates, self._rng)
+            keep = [
+                tuple(map(_native, row)) not in seen
+                and (self.feasible is None or self.feasible(dict(zip(names, map(_native, row)))))
+                for row in batch.itertuples(index=False)
+            ]
+            drawn.append(batch[keep])
+            count += sum(keep)
+            if count >= self.candidates:
+                break
+        return pd.concat(drawn, ignore_index=True).head(self.candidates)
+
+    def infer_relative_search_space(self, study, trial) -> dict[str, BaseDistribution]:
+        if self._screening(trial):
+            return dict(self.distributions)
+        return self.base.infer_relative_search_space(study, trial)
+
+    def sample_relative(self, study, trial, search_space) -> dict[str, Any]:
+        if not self._screening(trial):
+            return self.base.sample_relative(study, trial, search_space)
+        candidates = self._draw(study)
+        if candidates.empty:
+            # 没有可用的候选时交给 sample_independent
+            return {}
+        best = candidates.iloc[int(np.argmin(self.model.predict(encode(candidates, self.distributions))))]
+        return {name: _native(best[name]) for name in self.distributions}
+
+    def sample_independent(self, study, trial, param_name, param_distribution) -> Any:
+        return self.base.sample_independent(study, trial, param_name, param_distribution)
+
+    def before_trial(self, study, trial) -> None:
+        self.base.before_trial(study, trial)
+
+    def after_trial(self, study, trial, state, values) -> None:
+        self.base.after_trial(study, trial, state, values)
+
+    def reseed_rng(self) -> None:
+        self.base.reseed_rng()
+        self._rng = np.random.default_rng()
+
+    def __str__(self) -> str:
+        return f"{self.base} + surrogate screening"
+
+
+def surrogate_sampler(
+    strategy_class,
+    dimensions: list,
+    random_state: int | None,
+    config: dict,
+    sampler: str | BaseSampler = "NSGAIIISampler",
+    pairlist: list[str] | None = None,
+) -> BaseSampler:
+    """
+    按配置中的 hyperopt_surrogate 创建 SurrogateSampler；未开启或历史 epoch 不足时返回原采样器
+
+    :param config: 运行时的配置（策略在 bot_start 中记录的 HyperOpt.config）
+    :param sampler: 预筛选结束后使用的采样器：名称或采样器实例
+    :param pairlist: 本次回测的交易对，只使用同样交易对的历史 epoch；None 表示不检查
+    """
+    base = base_sampler(sampler, random_state) if isinstance(sampler, str) else sampler
+    settings = {**DEFAULT_SETTINGS, **config.get("hyperopt_surrogate", {})}
+    if not settings["enabled"]:
+        return base
+
+    distributions = {dim.name: dim for dim in dimensions}
+    history = load_history(config, strategy_class, distributions, pairlist)
+    if len(history) < settings["min_history"]:
+        logger.info(
+            f"Surrogate screening disabled: {len(history)} past epochs "
+            f"(min_history {settings['min_history']})"
+        )
+        return base
+
+    model = fit_model(history, distributions, random_state)
+    screening = SurrogateSampler(
+        base, distributions, model, settings["trials"], settings["top_fraction"],
+        feasibility_check(strategy_class, dimensions), random_state,
+    )
+    logger.info(
+        f"Surrogate screening: model fitted on {len(history)} past epochs, first "
+        f"{screening.trials} trials pick the best of {screening.candidates} candidates"
+    )
+    return screening
@@ -0,0 +1,240 @@
+"""
+Hyperopt 工作队列
+
+freqtrade 的 hyperopt 只能在一个进程里用 joblib 进程池并行，user_data/hyperopt.lock 又让同一时间只能运行一个，
+一次 hyperopt 没法分给多个独立进程或容器。本模块提供一个基于 SQLite 文件的队列，
+由 scripts/distributed_hyperopt.py 组织成协调者 / 工作进程模式：
+
+- 协调者持有唯一的 optuna study（采样器状态只在这里），把 ask 得到的参数组合放进队列（tasks 表），
+  收回结果后 tell 给 study，并照常写 .fthypt
+- 工作进程每次领取 batch 个任务，回测后把结果写回；回测期间定时刷新心跳
+- 工作进程可以随时加入；退出时把没做完的任务放回队列。进程被杀掉时，
+  超过 lease 秒没有心跳的任务会被其他工作进程重新领取
+- 同一个任务的结果只接受第一份
+
+库使用 WAL 模式，所有进程各自打开连接；领取任务在 BEGIN IMMEDIATE 事务中进行，不会重复领取。
+队列文件需要放在所有进程都能访问的本地磁盘上（例如 docker compose 挂载的 user_data），
+SQLite 不支持网络文件系统上的并发写入。
+"""
+import json
+import os
+import socket
+import sqlite3
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id INTEGER PRIMARY KEY,
+    params TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    claimed_at REAL,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state, task_id);
+CREATE TABLE IF NOT EXISTS workers (
+    worker TEXT PRIMARY KEY,
+    joined_at REAL NOT NULL,
+    heartbeat REAL NOT NULL,
+    evaluated INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+# 任务状态：pending 等待领取，claimed 已被领取，done 已有结果，failed 回测出错，collected 协调者已收回
+PENDING = "pending"
+CLAIMED = "claimed"
+DONE = "done"
+FAILED = "failed"
+COLLECTED = "collected"
+
+
+def worker_name() -> str:
+    """
+    工作进程的名称：主机名（容器中为容器 ID）和进程号
+    """
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class WorkQueue:
+    """
+    hyperopt 工作队列
+
+    :param path: SQLite 文件路径，不存在时创建
+    :param lease: 领取的任务超过多少秒没有心跳就可以被重新领取
+    """
+
+    def __init__(self, path: Path | str, lease: float = 60) -> None:
+        self.path = Path(path)
+        self.lease = lease
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # 手动管理事务，领取任务时需要 BEGIN IMMEDIATE
+        self.db = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self.db.close()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        """
+        BEGIN IMMEDIATE 事务：正常结束时提交；出错或被中断（KeyboardInterrupt 等）时回滚，
+        不会把写锁留在连接上
+        """
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            # 部分错误（如磁盘已满）SQLite 已经自动回滚
+            if self.db.in_transaction:
+                self.db.execute("ROLLBACK")
+            raise
+        self.db.execute("COMMIT")
+
+    def reset(self, **values: Any) -> None:
+        """
+        开始新的一次运行：清空任务、工作进程和运行信息，再记录 values
+        """
+        with self._transaction():
+            for table in ("tasks", "workers", "meta"):
+                self.db.execute(f"DELETE FROM {table}")
+            self.set_meta(**values)
+
+    def set_meta(self, **values: Any) -> None:
+        """
+        记录运行信息（值需要可以 JSON 序列化）
+        """
+        self.db.executemany(
+            "INSERT OR REPLACE INTO meta VALUES (?, ?)",
+            [(key, json.dumps(value)) for key, value in values.items()],
+        )
+
+    def meta(self, key: str, default: Any = None) -> Any:
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def put(self, params: list[dict]) -> list[int]:
+        """
+        放入参数组合，返回任务编号
+        """
+        with self._transaction():
+            return [
+                self.db.execute("INSERT INTO tasks (params) VALUES (?)", (json.dumps(p),)).lastrowid
+                for p in params
+            ]
+
+    def claim(self, worker: str, size: int, run: str | None = None) -> list[tuple[int, dict]]:
+        """
+        领取最多 size 个任务：等待领取的，或领取者超过 lease 秒没有心跳的
+
+        :param run: 工作进程加入的运行（meta 中的 run）；队列已换成另一次运行时不领取
+        """
+        now = time.time()
+        with self._transaction():
+            rows = []
+            if run is None or self.meta("run") == run:
+                rows = self.db.execute(
+                    "SELECT task_id, params FROM tasks "
+                    "WHERE state = ? OR (state = ? AND claimed_at < ?) ORDER BY task_id LIMIT ?",
+                    (PENDING, CLAIMED, now - self.lease, size),
+                ).fetchall()
+            self.db.executemany(
+                "UPDATE tasks SET state = ?, worker = ?, claimed_at = ? WHERE task_id = ?",
+                [(CLAIMED, worker, now, task_id) for task_id, _ in rows],
+            )
+            self._heartbeat(worker, now)
+        return [(task_id, json.loads(params)) for task_id, params in rows]
+
+    def _heartbeat(self, worker: str, now: float) -> None:
+        self.db.execute(
+            "INSERT INTO workers (worker, joined_at, heartbeat) VALUES (?, ?, ?) "
+            "ON CONFLICT (worker) DO UPDATE SET heartbeat = excluded.heartbeat",
+            (worker, now, now),
+        )
+        self.db.execute(
+            "UPDATE tasks SET claimed_at = ? WHERE worker = ? AND state = ?", (now, worker, CLAIMED)
+        )
+
+    def heartbeat(self, worker: str) -> None:
+        """
+        刷新工作进程和它领取的任务的心跳
+        """
+        with self._transaction():
+            self._heartbeat(worker, time.time())
+
+    def complete(self, task_id: int, worker: str, result: str) -> bool:
+        """
+        写回任务结果（JSON 字符串）；任务已有结果时忽略，返回 False
+        """
+        with self._transaction():
+            updated = self.db.execute(
+                "UPDATE tasks SET state = ?, worker = ?, result = ? WHERE task_id = ? AND state IN (?, ?)",
+                (DONE, worker, result, task_id, PENDING, CLAIMED),
+            ).rowcount
+            self.db.execute("UPDATE workers SET evaluated = evaluated + ? WHERE worker = ?",
+                            (updated, worker))
+            self._heartbeat(worker, time.time())
+        return bool(updated)
+
+    def fail(self, task_id: int, worker: str, error: str) -> None:
+        """
+        记录回测出错的任务
+        """
+        self.db.execute(
+            "UPDATE tasks SET state = ?, worker = ?, error = ? WHERE task_id = ? AND state IN (?, ?)",
+            (FAILED, worker, error, task_id, PENDING, CLAIMED),
+        )
+
+    def leave(self, worker: str) -> None:
+        """
+        工作进程退出：没做完的任务放回队列
+        """
+        with self._transaction():
+            self.db.execute(
+                "UPDATE tasks SET state = ?, worker = NULL, claimed_at = NULL "
+                "WHERE worker = ? AND state = ?",
+                (PENDING, worker, CLAIMED),
+            )
+            self.db.execute("DELETE FROM workers WHERE worker = ?", (worker,))
+
+    def collect(self) -> tuple[list[tuple[int, str]], list[tuple[int, str]]]:
+        """
+        收回已完成的任务：返回 ([(任务编号, 结果)], [(任务编号, 错误)])。
+        收回后清空结果，队列文件不会随 epoch 数增长
+        """
+        with self._transaction():
+            done = self.db.execute(
+                "SELECT task_id, result FROM tasks WHERE state = ? ORDER BY task_id", (DONE,)
+            ).fetchall()
+            failed = self.db.execute(
+                "SELECT task_id, error FROM tasks WHERE state = ? ORDER BY task_id", (FAILED,)
+            ).fetchall()
+            self.db.executemany(
+                "UPDATE tasks SET state = ?, result = NULL WHERE task_id = ?",
+                [(COLLECTED, task_id) for task_id, _ in done + failed],
+            )
+        return done, failed
+
+    def workers(self) -> int:
+        """
+        lease 秒内有心跳的工作进程数
+        """
+        return self.db.execute(
+            "SELECT COUNT(*) FROM workers WHERE heartbeat >= ?", (time.time() - self.lease,)
+        ).fetchone()[0]
+
+    def cancel(self) -> None:
+        """
+        丢弃还没领取的任务（运行结束时）
+        """
+        self.db.execute("DELETE FROM tasks WHERE state = ?", (PENDING,))
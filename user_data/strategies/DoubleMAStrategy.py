@@ -8,6 +8,7 @@ from datetime import datetime, timedelta, timezone
 from pandas import DataFrame
 from typing import Optional, Union
 
+from freqtrade.enums import RunMode
 from freqtrade.strategy import (
     IStrategy,
     Trade,
@@ -32,8 +33,13 @@ from freqtrade.strategy import (
 
 # --------------------------------
 # Add your lib to import here
-import talib.abstract as ta
-from technical import qtpylib
+import helper_paths  # noqa: F401
+from column_pruning import required_columns, wanted
+from indicator_kernels import ma_bank_frame, ma_column, ma_cross_masks, volume_mask
+from populate_profiler import profiled_populate
+import shared_data
+from signal_cache import cached_populate, memoize
+from streaming_indicators import DoubleMAStream
 
 
 class DoubleMAStrategy(IStrategy):
@@ -88,6 +94,9 @@ class DoubleMAStrategy(IStrategy):
     # 启动所需的最小K线数量
     startup_candle_count: int = 50
 
+    # 实盘/模拟盘使用流式指标：每根新K线只增量更新最新一行（见 streaming_indicators.py）
+    use_streaming_indicators = True
+
     # ========================================
     # 可优化参数定义
     # ========================================
@@ -123,10 +132,41 @@ class DoubleMAStrategy(IStrategy):
         space="buy", optimize=True, load=True
     )
 
+    # 参数之间的约束：hyperopt 采样时就修复违反约束的点，不再为它们跑回测（见 parameter_constraints）
+    parameter_constraints = (
+        "fast_ma_period <= 0.8 * slow_ma_period",  # 快线应明显小于慢线
+        "slow_ma_period < trend_filter_period",    # 趋势过滤周期应大于慢线周期
+    )
+
+    # 信号各组成部分依赖的参数：hyperopt 时按这些参数的值记忆化（见 signal_cache.memoize），
+    # 例如只有 min_volume_multiplier 变化时只重新计算成交量条件
+    signal_dependencies = {
+        'ma_cross': ('ma_type', 'fast_ma_period', 'slow_ma_period'),
+        'trend_mask': ('trend_filter_period',),
+        'volume_mask': ('min_volume_multiplier',),
+    }
+
     # ========================================
     # 策略方法
     # ========================================
 
+    def bot_start(self, **kwargs) -> None:
+        """
+        初始化每个交易对的流式指标状态，记录 HyperOpt.generate_estimator 需要的配置和交易对，
+        hyperopt 中让每个 epoch 以 mmap 方式读取预处理数据（见 shared_data）
+        """
+        self._ma_streams: dict[str, DoubleMAStream] = {}
+        self.HyperOpt.config = self.config
+        if self.dp.runmode == RunMode.HYPEROPT:
+            self.HyperOpt.pairlist = self.dp.current_whitelist()
+        shared_data.install()
+
+    def _use_streaming(self) -> bool:
+        """
+        是否使用流式指标（仅实盘/模拟盘）
+        """
+        return self.use_streaming_indicators and self.dp.runmode.value in ('live', 'dry_run')
+
     def informative_pairs(self):
         """
         定义额外的参考数据
@@ -134,41 +174,84 @@ class DoubleMAStrategy(IStrategy):
         """
         return []
 
+    @profiled_populate
+    @cached_populate
     def populate_indicators(self, dataframe: DataFrame, metadata: dict) -> DataFrame:
         """
         计算所有需要的指标
+
+        均线部分使用"均线库"：一次性算好所有候选 (均线类型, 周期) 的均线，
+        populate_entry_trend 再按当前参数取列。hyperopt 只在开始时调用一次本方法，
+        此时 .range 返回整个搜索范围；回测/实盘时 .range 只包含当前参数值，
+        因此只会计算实际用到的几条均线。
+
+        实盘/模拟盘改用流式指标，每个交易对只增量计算新增的K线。
         """
 
-        # 根据选择的均线类型计算快慢线
-        if self.ma_type.value == "SMA":
-            # 简单移动平均线
-            dataframe['fast_ma'] = ta.SMA(dataframe, timeperiod=self.fast_ma_period.value)
-            dataframe['slow_ma'] = ta.SMA(dataframe, timeperiod=self.slow_ma_period.value)
-        elif self.ma_type.value == "EMA":
-            # 指数移动平均线
-            dataframe['fast_ma'] = ta.EMA(dataframe, timeperiod=self.fast_ma_period.value)
-            dataframe['slow_ma'] = ta.EMA(dataframe, timeperiod=self.slow_ma_period.value)
-        elif self.ma_type.value == "WMA":
-            # 加权移动平均线
-            dataframe['fast_ma'] = ta.WMA(dataframe, timeperiod=self.fast_ma_period.value)
-            dataframe['slow_ma'] = ta.WMA(dataframe, timeperiod=self.slow_ma_period.value)
+        if self._use_streaming():
+            return self._populate_streaming_indicators(dataframe, metadata)
 
-        # 趋势过滤指标 - 使用更大周期的EMA判断整体趋势
-        dataframe['trend_filter'] = ta.EMA(dataframe, timeperiod=self.trend_filter_period.value)
+        # 快慢线的候选周期（每种均线类型都需要）
+        ma_periods = set(self.fast_ma_period.range) | set(self.slow_ma_period.range)
+        periods_by_type = {ma_type: set(ma_periods) for ma_type in self.ma_type.range}
 
-        # 成交量指标
-        dataframe['volume_sma'] = ta.SMA(dataframe['volume'], timeperiod=20)
+        # 趋势过滤指标 - 使用更大周期的EMA判断整体趋势
+        periods_by_type.setdefault('EMA', set()).update(self.trend_filter_period.range)
 
-        # 计算均线交叉信号
-        dataframe['ma_cross_up'] = qtpylib.crossed_above(dataframe['fast_ma'], dataframe['slow_ma'])
-        dataframe['ma_cross_down'] = qtpylib.crossed_below(dataframe['fast_ma'], dataframe['slow_ma'])
+        # 成交量指标 volume_sma 与均线库放在同一个块中，每个交易对只 concat 一次
+        bank = ma_bank_frame(dataframe, periods_by_type, volume_sma_period=20)
 
-        # 计算趋势方向 (快线相对于慢线的斜率)
-        dataframe['fast_ma_slope'] = dataframe['fast_ma'] - dataframe['fast_ma'].shift(1)
-        dataframe['slow_ma_slope'] = dataframe['slow_ma'] - dataframe['slow_ma'].shift(1)
+        return pd.concat([dataframe, bank], axis=1)
 
-        return dataframe
+    def _populate_streaming_indicators(self, dataframe: DataFrame, metadata: dict) -> DataFrame:
+        """
+        用流式状态计算指标，直接输出均线、交叉信号等列（无需再从均线库中选取）
+        """
+        params = (
+            self.ma_type.value,
+            self.fast_ma_period.value,
+            self.slow_ma_period.value,
+            self.trend_filter_period.value,
+        )
+        stream = self._ma_streams.get(metadata['pair'])
+        if stream is None or stream.params != params:
+            stream = self._ma_streams[metadata['pair']] = DoubleMAStream(*params)
+
+        return pd.concat([dataframe, stream.process(dataframe)], axis=1)
+
+    def _ma_signal_columns(self) -> tuple[str, str, str]:
+        """
+        快线、慢线、趋势线所在的列：流式指标直接输出这三列，否则按当前参数从均线库中选取
+        """
+        if self._use_streaming():
+            return 'fast_ma', 'slow_ma', 'trend_filter'
+        return (
+            ma_column(self.ma_type.value, self.fast_ma_period.value),
+            ma_column(self.ma_type.value, self.slow_ma_period.value),
+            ma_column('EMA', self.trend_filter_period.value),
+        )
+
+    def _populate_ma_signals(self, dataframe: DataFrame) -> None:
+        """
+        按当前参数从均线库中选取快线、慢线和趋势线
+        """
+        fast, slow, trend = self._ma_signal_columns()
+        dataframe['fast_ma'] = dataframe[fast]
+        dataframe['slow_ma'] = dataframe[slow]
+        dataframe['trend_filter'] = dataframe[trend]
 
+    def _ma_cross(self, dataframe: DataFrame, metadata: dict) -> tuple[np.ndarray, np.ndarray]:
+        """
+        信号中只依赖快慢线的部分：(金叉 & 收盘价 > 快线, 死叉 | 收盘价 < 慢线)，按均线参数记忆化
+        """
+        fast, slow, _ = self._ma_signal_columns()
+        return memoize(self, 'ma_cross', dataframe, metadata, lambda: ma_cross_masks(
+            dataframe['close'].to_numpy(dtype=np.float64),
+            dataframe[fast].to_numpy(dtype=np.float64),
+            dataframe[slow].to_numpy(dtype=np.float64),
+        ))
+
+    @profiled_populate
     def populate_entry_trend(self, dataframe: DataFrame, metadata: dict) -> DataFrame:
         """
         生成买入信号
@@ -177,48 +260,53 @@ class DoubleMAStrategy(IStrategy):
         2. 价格在快线上方（确认上涨趋势）
         3. 成交量放大（确认信号强度）
         4. 整体趋势向上（可选）
-        """
-
-        dataframe.loc[
-            (
-                # 主要信号：金叉
-                dataframe['ma_cross_up']
-
-                # 价格确认：当前价格高于快线
-                & (dataframe['close'] > dataframe['fast_ma'])
 
-                # 成交量确认：成交量大于平均水平
-                & (dataframe['volume'] > dataframe['volume_sma'] * self.min_volume_multiplier.value)
-
-                # 可选：整体趋势向上（价格高于趋势线）
-                & (dataframe['close'] > dataframe['trend_filter'])
+        买入条件拆成三部分（均线、趋势、成交量），分别按各自依赖的参数记忆化，
+        每个 epoch 只重新计算参数发生变化的部分。
+        """
 
-                # 确保成交量不为0
-                & (dataframe['volume'] > 0)
-            ),
-            'enter_long'
-        ] = 1
+        trend = self._ma_signal_columns()[2]
+        # fast_ma/slow_ma/trend_filter 列只用于绘图和回测分析；hyperopt 不需要，
+        # 省去每个 epoch 在几百列的宽表上插入三列的开销。开启指标剪枝时回测也不需要
+        if (
+            not self._use_streaming()
+            and self.config.get('runmode') != RunMode.HYPEROPT
+            and wanted(required_columns(self, dataframe, metadata),
+                       'fast_ma', 'slow_ma', 'trend_filter')
+        ):
+            self._populate_ma_signals(dataframe)
+
+        close = dataframe['close'].to_numpy(dtype=np.float64)
+        volume = dataframe['volume'].to_numpy(dtype=np.float64)
+        ma_enter, _ = self._ma_cross(dataframe, metadata)
+        trend_ok = memoize(self, 'trend_mask', dataframe, metadata, lambda: np.greater(
+            close, dataframe[trend].to_numpy(dtype=np.float64)
+        ))
+        volume_ok = memoize(self, 'volume_mask', dataframe, metadata, lambda: volume_mask(
+            volume,
+            dataframe['volume_sma'].to_numpy(dtype=np.float64),
+            self.min_volume_multiplier.value,
+        ))
+
+        # 记忆化的数组会在之后的 epoch 中复用，写入 dataframe 的必须是新数组
+        dataframe['enter_long'] = (ma_enter & trend_ok & volume_ok).view(np.int8)
 
         return dataframe
 
+    @profiled_populate
     def populate_exit_trend(self, dataframe: DataFrame, metadata: dict) -> DataFrame:
         """
         生成卖出信号
         卖出条件：
         1. 死叉信号（快线下穿慢线）
         2. 或价格跌破慢线
-        """
 
-        dataframe.loc[
-            (
-                # 主要信号：死叉
-                dataframe['ma_cross_down']
+        与买入信号共用记忆化的均线部分（见 _ma_cross），backtesting / hyperopt 中不会重复计算。
+        """
 
-                # 或者价格跌破慢线
-                | (dataframe['close'] < dataframe['slow_ma'])
-            ),
-            'exit_long'
-        ] = 1
+        _, ma_exit = self._ma_cross(dataframe, metadata)
+        # 记忆化的数组会在之后的 epoch 中复用，写入 dataframe 的必须是新数组
+        dataframe['exit_long'] = ma_exit.astype(np.int8)
 
         return dataframe
 
@@ -226,6 +314,21 @@ class DoubleMAStrategy(IStrategy):
     # 可选：自定义方法
     # ========================================
 
+    def bot_loop_start(self, current_time: datetime, **kwargs) -> None:
+        """
+        hyperopt 中记录当前 epoch 的参数供损失函数读取（见 parameter_constraints），
+        并检查当前 epoch 的损失下界，已不可能成为最优结果时停止开仓（见 early_abort）
+        """
+        if self.dp.runmode != RunMode.HYPEROPT:
+            return
+        # early_abort、parameter_constraints 在 hyperopts 目录中（helper_paths 已加入 sys.path），
+        # 依赖 optuna，只在 hyperopt 中导入
+        from early_abort import epoch_monitor
+        from parameter_constraints import track_parameters
+        track_parameters(self)
+        monitor = epoch_monitor(self)
+        self._entries_blocked = monitor is not None and monitor.update(current_time)
+
     def confirm_trade_entry(self, pair: str, order_type: str, amount: float,
                           rate: float, time_in_force: str, current_time: datetime,
                           entry_tag: Optional[str], side: str, **kwargs) -> bool:
@@ -233,7 +336,7 @@ class DoubleMAStrategy(IStrategy):
         可选：确认交易进入
         可以在这里添加额外的交易确认逻辑
         """
-        return True
+        return not self.__dict__.get('_entries_blocked', False)
 
     def confirm_trade_exit(self, pair: str, trade: Trade, order_type: str,
                          amount: float, rate: float, time_in_force: str,
@@ -260,6 +363,29 @@ class DoubleMAStrategy(IStrategy):
         """
         return proposed_stake
 
+    class HyperOpt:
+        # 运行时的配置和 hyperopt 的交易对，由 bot_start 设置
+        # （generate_estimator 只能拿到 dimensions 和 random_state）
+        config: dict = {}
+        pairlist: list[str] | None = None
+
+        @staticmethod
+        def generate_estimator(dimensions: list, **kwargs):
+            """
+            使用 freqtrade 默认的 NSGAIIISampler：开启 hyperopt_surrogate 时先用历史 epoch 预筛选
+            初始点（见 surrogate_screening），并在回测前修复违反 parameter_constraints 的点
+            """
+            from parameter_constraints import constrained_sampler
+            random_state = kwargs.get("random_state")
+            config = DoubleMAStrategy.HyperOpt.config
+            sampler = "NSGAIIISampler"
+            if config.get("hyperopt_surrogate", {}).get("enabled", False):
+                # 依赖 scikit-learn，只在开启预筛选时导入
+                from surrogate_screening import surrogate_sampler
+                sampler = surrogate_sampler(DoubleMAStrategy, dimensions, random_state, config,
+                                            pairlist=DoubleMAStrategy.HyperOpt.pairlist)
+            return constrained_sampler(DoubleMAStrategy, dimensions, random_state, sampler)
+
     # ========================================
     # 绘图配置（可选）
     # ========================================
@@ -0,0 +1,148 @@
+"""
+指标列剪枝
+
+很多策略在 populate_indicators 中计算的指标比买卖信号实际用到的多（模板里的示例指标、
+只用于绘图的列等）。开启剪枝后，策略可以只计算 populate_entry_trend / populate_exit_trend
+真正读取的列（绘图时再加上 plot_config 中的列），节省回测和 hyperopt 的 CPU 与内存。
+
+需要的列有两种来源：
+- 声明：策略的 indicator_inputs 属性，列出买卖信号读取的指标列
+- 推断：在一小段数据上先完整计算一次指标，再用会记录列读取的 DataFrame
+  运行一次 populate_entry_trend / populate_exit_trend，读到的列就是需要的列
+
+推断使用的是当前参数，而 hyperopt 中不同参数可能读取不同的列，
+所以 hyperopt 只使用声明；回测/绘图时两者取并集，推断出声明中缺少的列时给出警告。
+custom_exit 等回调通过 dp.get_analyzed_dataframe 读取的列无法推断，需要写进 indicator_inputs。
+
+默认关闭，在配置文件中开启：
+
+    "indicator_pruning": {
+        "enabled": true
+    }
+
+策略在 populate_indicators 中用 wanted(required, "列名", ...) 判断是否计算某个指标，
+required 由 required_columns() 给出；为 None 表示不剪枝，全部计算。
+"""
+import inspect
+import logging
+
+from pandas import DataFrame
+
+from freqtrade.constants import DEFAULT_DATAFRAME_COLUMNS
+
+
+logger = logging.getLogger(__name__)
+
+# 只在这些运行模式下剪枝（实盘/模拟盘中 FreqUI 可能查看任意列）
+PRUNE_RUNMODES = ("backtest", "hyperopt", "plot")
+
+# 推断时使用的K线数量（至少为启动K线数的两倍）
+PROBE_ROWS = 500
+
+
+class _RecordingFrame(DataFrame):
+    """
+    记录列读取（df["x"]、df[["x", "y"]]、df.x）的 DataFrame
+    """
+
+    _metadata = ["_reads"]
+
+    @property
+    def _constructor(self):
+        return _RecordingFrame
+
+    def __getitem__(self, key):
+        reads = self.__dict__.get("_reads")
+        if reads is not None:
+            if isinstance(key, str):
+                reads.add(key)
+            elif isinstance(key, (list, tuple)):
+                reads.update(k for k in key if isinstance(k, str))
+        return super().__getitem__(key)
+
+
+def _runmode(config: dict) -> str | None:
+    return getattr(config.get("runmode"), "value", config.get("runmode"))
+
+
+def plot_columns(plot_config: dict) -> set[str]:
+    """
+    plot_config 中用到的列
+    """
+    columns = set(plot_config.get("main_plot", {}))
+    for subplot in plot_config.get("subplots", {}).values():
+        columns.update(subplot)
+    return columns
+
+
+def infer_signal_inputs(strategy, dataframe: DataFrame, metadata: dict) -> set[str]:
+    """
+    在 dataframe 的最后一段上推断买卖信号读取的列
+
+    调用的是去掉装饰器（缓存、剖析）之后的原始方法，推断本身不会写缓存或计入剖析
+    """
+    rows = max(PROBE_ROWS, 2 * strategy.startup_candle_count)
+    # 只取原始K线列：populate_entry_trend 中调用时 dataframe 已经带有指标列
+    sample = dataframe[DEFAULT_DATAFRAME_COLUMNS].iloc[-rows:].copy()
+    cls = type(strategy)
+    strategy._pruning_probe = True
+    try:
+        indicators = inspect.unwrap(cls.populate_indicators)(strategy, sample, metadata)
+        columns = set(indicators.columns)
+        reads: set[str] = set()
+        frame = _RecordingFrame(indicators.copy())
+        frame._reads = reads
+        # 与 freqtrade 的 advise_entry / advise_exit 相同，先创建 tag 列
+        frame.loc[:, "enter_tag"] = ""
+        frame = inspect.unwrap(cls.populate_entry_trend)(strategy, frame, metadata)
+        frame.loc[:, "exit_tag"] = ""
+        inspect.unwrap(cls.populate_exit_trend)(strategy, frame, metadata)
+    finally:
+        strategy._pruning_probe = False
+    return reads & columns
+
+
+def required_columns(strategy, dataframe: DataFrame, metadata: dict) -> set[str] | None:
+    """
+    populate_indicators 需要计算的列；返回 None 表示不剪枝
+
+    结果按策略实例缓存，每个进程只推断一次
+    """
+    config = strategy.config
+    runmode = _runmode(config)
+    if (
+        not config.get("indicator_pruning", {}).get("enabled", False)
+        or runmode not in PRUNE_RUNMODES
+        or strategy.__dict__.get("_pruning_probe", False)
+    ):
+        return None
+    if "_required_columns" in strategy.__dict__:
+        return strategy._required_columns
+
+    declared = getattr(strategy, "indicator_inputs", None)
+    if runmode == "hyperopt":
+        if declared is None:
+            logger.info(f"{type(strategy).__name__} 没有声明 indicator_inputs，hyperopt 中不剪枝")
+        required = None if declared is None else set(declared)
+    else:
+        required = infer_signal_inputs(strategy, dataframe, metadata)
+        if declared is not None:
+            missing = required - set(declared) - set(DEFAULT_DATAFRAME_COLUMNS)
+            if missing:
+                logger.warning(
+                    f"{type(strategy).__name__}.indicator_inputs 缺少买卖信号读取的列：{sorted(missing)}"
+                )
+            required |= set(declared)
+        if runmode == "plot":
+            required |= plot_columns(getattr(strategy, "plot_config", None) or {})
+    if required is not None:
+        logger.info(f"{type(strategy).__name__} 只计算指标列：{sorted(required)}")
+    strategy._required_columns = required
+    return required
+
+
+def wanted(required: set[str] | None, *columns: str) -> bool:
+    """
+    columns 中是否有需要计算的列
+    """
+    return required is None or not required.isdisjoint(columns)
@@ -0,0 +1,27 @@
+"""
+辅助模块的导入路径
+
+freqtrade 按文件路径加载策略和 hyperopt 损失函数，只在加载期间临时把文件所在目录放进 sys.path。
+hyperopt 并行时，joblib/loky 工作进程按启动时的 sys.path 导入策略和损失函数引用的模块
+（indicator_kernels、loss_kernels 等），目录不在 sys.path 中就会 ModuleNotFoundError。
+
+策略和损失函数在导入这些辅助模块之前先 `import helper_paths`：导入本模块时把
+user_data/strategies 和 user_data/hyperopts 加到 sys.path 末尾，之后启动的工作进程都能导入。
+hyperopt 中 freqtrade 先加载策略再加载损失函数，所以 user_data/hyperopts 下的损失函数导入本模块时，
+user_data/strategies 已经在 sys.path 中。
+策略用到的 user_data/hyperopts 模块（early_abort、surrogate_screening 等）依赖 optuna / scikit-learn，
+只在 hyperopt 中用到的地方导入。
+"""
+import sys
+from pathlib import Path
+
+
+HELPER_DIRS = (
+    Path(__file__).resolve().parent,
+    Path(__file__).resolve().parent.parent / "hyperopts",
+)
+
+for directory in map(str, HELPER_DIRS):
+    # freqtrade 加载时临时插在最前面的那一项随后会被移除，只看后面是否已经有了
+    if directory not in sys.path[1:]:
+        sys.path.append(directory)
@@ -1,5 +1,6 @@
 # --- Do not remove these libs ---
 from freqtrade.strategy.interface import IStrategy
+from freqtrade.strategy import DecimalParameter, IntParameter
 from pandas import DataFrame
 import talib.abstract as ta
 import freqtrade.vendor.qtpylib.indicators as qtpylib
@@ -12,6 +13,21 @@ from freqtrade.strategy import merge_informative_pair
 import numpy as np
 from freqtrade.strategy import stoploss_from_open
 
+from freqtrade.exchange import timeframe_to_prev_date
+
+import helper_paths  # noqa: F401
+from indicator_kernels import ema_bank_frame
+from populate_profiler import profiled_populate
+import shared_data
+from streaming_indicators import IchiV1Stream
+from timeframe_cache import TimeframeCache
+
+
+# trend_{close,open}_<时间尺度> 的 EMA 周期（5m K线数），周期 1 即价格本身
+TREND_SPANS = {'5m': 1, '15m': 3, '30m': 6, '1h': 12, '2h': 24, '4h': 48, '6h': 72, '8h': 96}
+TREND_SOURCES = ('close', 'open')
+ICHIMOKU = dict(conversion_line_period=20, base_line_periods=60, laggin_span=120, displacement=30)
+
 
 class ichiV1(IStrategy):
 
@@ -25,6 +41,14 @@ class ichiV1(IStrategy):
         #"buy_min_fan_magnitude_gain": 1.008 # NOTE: Very save value (Win% ~90%), only the biggest moves 1.008,
     }
 
+    # 可以 hyperopt 的买入参数，默认值即上面的设置
+    buy_trend_above_senkou_level = IntParameter(1, 8, default=buy_params['buy_trend_above_senkou_level'], space='buy')
+    buy_trend_bullish_level = IntParameter(1, 8, default=buy_params['buy_trend_bullish_level'], space='buy')
+    buy_fan_magnitude_shift_value = IntParameter(1, 8, default=buy_params['buy_fan_magnitude_shift_value'], space='buy')
+    buy_min_fan_magnitude_gain = DecimalParameter(
+        1.000, 1.010, decimals=3, default=buy_params['buy_min_fan_magnitude_gain'], space='buy'
+    )
+
     # Sell hyperspace params:
     # NOTE: was 15m but kept bailing out in dryrun
     sell_params = {
@@ -47,6 +71,11 @@ class ichiV1(IStrategy):
 
     startup_candle_count = 96
     process_only_new_candles = False
+    # 实盘/模拟盘使用流式指标：每个 tick 只计算新收盘和形成中的K线（见 streaming_indicators.py）
+    use_streaming_indicators = True
+    # 15m 及以上的 trend_{close,open} 改用由 5m K线聚合出的真实大周期K线的收盘/开盘价（只用已走完的K线，
+    # 见 timeframe_cache.py），而不是 5m 价格的 EMA 近似；会改变信号，默认关闭
+    use_resampled_trend = False
 
     trailing_stop = False
     #trailing_stop_positive = 0.002
@@ -87,36 +116,68 @@ class ichiV1(IStrategy):
         }
     }
 
+    def bot_start(self, **kwargs) -> None:
+        """
+        初始化每个交易对的流式指标状态和大周期K线缓存；hyperopt 中让每个 epoch 以 mmap 方式读取预处理数据（见 shared_data）
+        """
+        self._streams: dict[str, IchiV1Stream] = {}
+        self._timeframes = TimeframeCache(self.timeframe, [label for label in TREND_SPANS if label != self.timeframe])
+        shared_data.install()
+
+    def _use_streaming(self) -> bool:
+        """
+        是否使用流式指标（仅实盘/模拟盘）
+        """
+        return self.use_streaming_indicators and self.dp.runmode.value in ('live', 'dry_run')
+
+    def _forming(self, dataframe: DataFrame) -> bool:
+        """
+        交易所返回了未收盘的K线：最后一行每个 tick 都会变化，不能写入增量状态
+        """
+        return (
+            self.dp.runmode.value in ('live', 'dry_run')
+            and not dataframe.empty
+            and dataframe['date'].iloc[-1] >= timeframe_to_prev_date(self.timeframe)
+        )
+
+    @profiled_populate
     def populate_indicators(self, dataframe: DataFrame, metadata: dict) -> DataFrame:
+        # 大周期K线要在换成 Heikin Ashi 之前由原始 OHLCV 聚合
+        resampled = self._resampled_trend(dataframe, metadata) if self.use_resampled_trend else None
 
+        if self._use_streaming():
+            dataframe = self._populate_streaming_indicators(dataframe, metadata)
+        else:
+            dataframe = self._populate_batch_indicators(dataframe)
+
+        if resampled is not None:
+            dataframe[list(resampled.columns)] = resampled.to_numpy()
+            dataframe['fan_magnitude'] = (dataframe['trend_close_1h'] / dataframe['trend_close_8h'])
+            dataframe['fan_magnitude_gain'] = dataframe['fan_magnitude'] / dataframe['fan_magnitude'].shift(1)
+
+        return pd.concat([dataframe, self._condition_levels(dataframe)], axis=1)
+
+    def _populate_batch_indicators(self, dataframe: DataFrame) -> DataFrame:
+        """
+        回测/hyperopt：一次性计算全部指标
+        """
         heikinashi = qtpylib.heikinashi(dataframe)
         dataframe['open'] = heikinashi['open']
         #dataframe['close'] = heikinashi['close']
         dataframe['high'] = heikinashi['high']
         dataframe['low'] = heikinashi['low']
 
-        dataframe['trend_close_5m'] = dataframe['close']
-        dataframe['trend_close_15m'] = ta.EMA(dataframe['close'], timeperiod=3)
-        dataframe['trend_close_30m'] = ta.EMA(dataframe['close'], timeperiod=6)
-        dataframe['trend_close_1h'] = ta.EMA(dataframe['close'], timeperiod=12)
-        dataframe['trend_close_2h'] = ta.EMA(dataframe['close'], timeperiod=24)
-        dataframe['trend_close_4h'] = ta.EMA(dataframe['close'], timeperiod=48)
-        dataframe['trend_close_6h'] = ta.EMA(dataframe['close'], timeperiod=72)
-        dataframe['trend_close_8h'] = ta.EMA(dataframe['close'], timeperiod=96)
-
-        dataframe['trend_open_5m'] = dataframe['open']
-        dataframe['trend_open_15m'] = ta.EMA(dataframe['open'], timeperiod=3)
-        dataframe['trend_open_30m'] = ta.EMA(dataframe['open'], timeperiod=6)
-        dataframe['trend_open_1h'] = ta.EMA(dataframe['open'], timeperiod=12)
-        dataframe['trend_open_2h'] = ta.EMA(dataframe['open'], timeperiod=24)
-        dataframe['trend_open_4h'] = ta.EMA(dataframe['open'], timeperiod=48)
-        dataframe['trend_open_6h'] = ta.EMA(dataframe['open'], timeperiod=72)
-        dataframe['trend_open_8h'] = ta.EMA(dataframe['open'], timeperiod=96)
+        # 趋势扇面：收盘价和 Heikin Ashi 开盘价在各时间尺度上的 EMA，一次算成一个块再 concat
+        trend = ema_bank_frame(
+            dataframe, TREND_SOURCES, TREND_SPANS.values(),
+            [f'trend_{source}_{label}' for source in TREND_SOURCES for label in TREND_SPANS],
+        )
+        dataframe = pd.concat([dataframe, trend], axis=1)
 
         dataframe['fan_magnitude'] = (dataframe['trend_close_1h'] / dataframe['trend_close_8h'])
         dataframe['fan_magnitude_gain'] = dataframe['fan_magnitude'] / dataframe['fan_magnitude'].shift(1)
 
-        ichimoku = ftt.ichimoku(dataframe, conversion_line_period=20, base_line_periods=60, laggin_span=120, displacement=30)
+        ichimoku = ftt.ichimoku(dataframe, **ICHIMOKU)
         dataframe['chikou_span'] = ichimoku['chikou_span']
         dataframe['tenkan_sen'] = ichimoku['tenkan_sen']
         dataframe['kijun_sen'] = ichimoku['kijun_sen']
@@ -131,84 +192,86 @@ class ichiV1(IStrategy):
 
         return dataframe
 
-
+    def _populate_streaming_indicators(self, dataframe: DataFrame, metadata: dict) -> DataFrame:
+        """
+        与 _populate_batch_indicators 输出相同的列，但只增量更新新增的K线
+        """
+        stream = self._streams.get(metadata['pair'])
+        if stream is None:
+            stream = self._streams[metadata['pair']] = IchiV1Stream(TREND_SPANS, **ICHIMOKU)
+
+        indicators = stream.process(dataframe, forming=self._forming(dataframe))
+        dataframe[['open', 'high', 'low']] = indicators[['ha_open', 'ha_high', 'ha_low']].to_numpy()
+        indicators = indicators.drop(columns=['ha_open', 'ha_high', 'ha_low'])
+        # chikou_span 是收盘价向过去平移，由之后的K线决定，直接从收盘价得到
+        indicators['chikou_span'] = dataframe['close'].shift(-ICHIMOKU['displacement'] + 1)
+
+        return pd.concat([dataframe, indicators], axis=1)
+
+    def _resampled_trend(self, dataframe: DataFrame, metadata: dict) -> DataFrame:
+        """
+        15m 及以上的 trend_{close,open}：每根 5m K线收盘时已走完的最后一根大周期K线的收盘/开盘价
+        （大周期K线由 TimeframeCache 增量聚合，最早的一根 8h K线要等 96~191 根 5m K线之后才有）
+        """
+        resampled = self._timeframes.merge(
+            metadata['pair'], dataframe, columns=TREND_SOURCES, forming=self._forming(dataframe)
+        )
+        return resampled.rename(columns=lambda column: f'trend_{column}')
+
+    def _condition_levels(self, dataframe: DataFrame) -> DataFrame:
+        """
+        买入条件是逐级累进的（第 L 级要求前 L 个时间尺度都满足），预先算出每根K线满足到第几级，
+        populate_buy_trend 对任意参数组合都只需比较：
+        - above_senkou_level：trend_close_5m、15m、... 依次同时高于 senkou_a 和 senkou_b 的级数
+        - bullish_level：trend_close_5m、15m、... 依次高于对应 trend_open 的级数
+        - fan_magnitude_rise：fan_magnitude 高于之前连续多少根K线（最多算到 buy_fan_magnitude_shift_value 的上限）
+        与 NaN 的比较为 False，和原来的 pandas 条件相同
+        """
+        n = len(dataframe)
+        senkou_a = dataframe['senkou_a'].to_numpy()
+        senkou_b = dataframe['senkou_b'].to_numpy()
+        above, bullish = np.ones(n, dtype=bool), np.ones(n, dtype=bool)
+        above_level, bullish_level = np.zeros(n, dtype=np.int8), np.zeros(n, dtype=np.int8)
+        for label in TREND_SPANS:
+            trend_close = dataframe[f'trend_close_{label}'].to_numpy()
+            above &= (trend_close > senkou_a) & (trend_close > senkou_b)
+            above_level += above
+            bullish &= trend_close > dataframe[f'trend_open_{label}'].to_numpy()
+            bullish_level += bullish
+
+        fan = dataframe['fan_magnitude'].to_numpy()
+        previous = np.full(n, np.nan)
+        rising = np.ones(n, dtype=bool)
+        rise = np.zeros(n, dtype=np.int8)
+        for shift in range(1, max(self.buy_fan_magnitude_shift_value.high,
+                                  self.buy_fan_magnitude_shift_value.value) + 1):
+            previous[shift:] = fan[:-shift]
+            previous[:shift] = np.nan
+            rising &= previous < fan
+            rise += rising
+
+        return DataFrame(
+            {'above_senkou_level': above_level, 'bullish_level': bullish_level,
+             'fan_magnitude_rise': rise},
+            index=dataframe.index,
+        )
+
+
+    @profiled_populate
     def populate_buy_trend(self, dataframe: DataFrame, metadata: dict) -> DataFrame:
-
-        conditions = []
-
-        # Trending market
-        if self.buy_params['buy_trend_above_senkou_level'] >= 1:
-            conditions.append(dataframe['trend_close_5m'] > dataframe['senkou_a'])
-            conditions.append(dataframe['trend_close_5m'] > dataframe['senkou_b'])
-
-        if self.buy_params['buy_trend_above_senkou_level'] >= 2:
-            conditions.append(dataframe['trend_close_15m'] > dataframe['senkou_a'])
-            conditions.append(dataframe['trend_close_15m'] > dataframe['senkou_b'])
-
-        if self.buy_params['buy_trend_above_senkou_level'] >= 3:
-            conditions.append(dataframe['trend_close_30m'] > dataframe['senkou_a'])
-            conditions.append(dataframe['trend_close_30m'] > dataframe['senkou_b'])
-
-        if self.buy_params['buy_trend_above_senkou_level'] >= 4:
-            conditions.append(dataframe['trend_close_1h'] > dataframe['senkou_a'])
-            conditions.append(dataframe['trend_close_1h'] > dataframe['senkou_b'])
-
-        if self.buy_params['buy_trend_above_senkou_level'] >= 5:
-            conditions.append(dataframe['trend_close_2h'] > dataframe['senkou_a'])
-            conditions.append(dataframe['trend_close_2h'] > dataframe['senkou_b'])
-
-        if self.buy_params['buy_trend_above_senkou_level'] >= 6:
-            conditions.append(dataframe['trend_close_4h'] > dataframe['senkou_a'])
-            conditions.append(dataframe['trend_close_4h'] > dataframe['senkou_b'])
-
-        if self.buy_params['buy_trend_above_senkou_level'] >= 7:
-            conditions.append(dataframe['trend_close_6h'] > dataframe['senkou_a'])
-            conditions.append(dataframe['trend_close_6h'] > dataframe['senkou_b'])
-
-        if self.buy_params['buy_trend_above_senkou_level'] >= 8:
-            conditions.append(dataframe['trend_close_8h'] > dataframe['senkou_a'])
-            conditions.append(dataframe['trend_close_8h'] > dataframe['senkou_b'])
-
-        # Trends bullish
-        if self.buy_params['buy_trend_bullish_level'] >= 1:
-            conditions.append(dataframe['trend_close_5m'] > dataframe['trend_open_5m'])
-
-        if self.buy_params['buy_trend_bullish_level'] >= 2:
-            conditions.append(dataframe['trend_close_15m'] > dataframe['trend_open_15m'])
-
-        if self.buy_params['buy_trend_bullish_level'] >= 3:
-            conditions.append(dataframe['trend_close_30m'] > dataframe['trend_open_30m'])
-
-        if self.buy_params['buy_trend_bullish_level'] >= 4:
-            conditions.append(dataframe['trend_close_1h'] > dataframe['trend_open_1h'])
-
-        if self.buy_params['buy_trend_bullish_level'] >= 5:
-            conditions.append(dataframe['trend_close_2h'] > dataframe['trend_open_2h'])
-
-        if self.buy_params['buy_trend_bullish_level'] >= 6:
-            conditions.append(dataframe['trend_close_4h'] > dataframe['trend_open_4h'])
-
-        if self.buy_params['buy_trend_bullish_level'] >= 7:
-            conditions.append(dataframe['trend_close_6h'] > dataframe['trend_open_6h'])
-
-        if self.buy_params['buy_trend_bullish_level'] >= 8:
-            conditions.append(dataframe['trend_close_8h'] > dataframe['trend_open_8h'])
-
-        # Trends magnitude
-        conditions.append(dataframe['fan_magnitude_gain'] >= self.buy_params['buy_min_fan_magnitude_gain'])
-        conditions.append(dataframe['fan_magnitude'] > 1)
-
-        for x in range(self.buy_params['buy_fan_magnitude_shift_value']):
-            conditions.append(dataframe['fan_magnitude'].shift(x+1) < dataframe['fan_magnitude'])
-
-        if conditions:
-            dataframe.loc[
-                reduce(lambda x, y: x & y, conditions),
-                'buy'] = 1
+        # 各级条件已在 populate_indicators 中合并成级数（见 _condition_levels）
+        dataframe.loc[
+            (dataframe['above_senkou_level'] >= self.buy_trend_above_senkou_level.value)
+            & (dataframe['bullish_level'] >= self.buy_trend_bullish_level.value)
+            & (dataframe['fan_magnitude_gain'] >= self.buy_min_fan_magnitude_gain.value)
+            & (dataframe['fan_magnitude'] > 1)
+            & (dataframe['fan_magnitude_rise'] >= self.buy_fan_magnitude_shift_value.value),
+            'buy'] = 1
 
         return dataframe
 
 
+    @profiled_populate
     def populate_sell_trend(self, dataframe: DataFrame, metadata: dict) -> DataFrame:
 
         conditions = []
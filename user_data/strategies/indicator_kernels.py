@@ -0,0 +1,238 @@
+"""
+NumPy 指标内核
+
+策略共用的向量化指标工具：输入输出都是连续的 numpy 数组，
+尽量避免在 hyperopt 的每一轮中重复调用 TA-Lib 或创建临时 pandas 对象。
+"""
+from typing import Iterable
+
+import numpy as np
+import talib
+from pandas import DataFrame
+
+
+# 均线类型 -> TA-Lib 函数
+MA_FUNCTIONS = {
+    "SMA": talib.SMA,
+    "EMA": talib.EMA,
+    "WMA": talib.WMA,
+}
+
+
+def ma_column(ma_type: str, period: int) -> str:
+    """
+    均线库中 (均线类型, 周期) 对应的列名，例如 ("EMA", 20) -> "ma_ema_20"
+    """
+    return f"ma_{ma_type.lower()}_{int(period)}"
+
+
+def build_ma_bank(
+    close: np.ndarray, periods_by_type: dict[str, Iterable[int]], extra_rows: int = 0
+) -> tuple[np.ndarray, list[str]]:
+    """
+    一次性计算均线库
+
+    :param close: 收盘价数组
+    :param periods_by_type: 每种均线类型需要的周期，例如 {"SMA": range(5, 101)}
+    :param extra_rows: 在末尾额外预留的（未初始化的）行数，供调用方写入其他指标
+    :return: (values, columns)。values 为二维数组，每一行对应一个 (均线类型, 周期)，
+             行名见 columns（由 ma_column 生成，不含预留行）
+    """
+    close = np.ascontiguousarray(close, dtype=np.float64)
+    rows = [
+        (ma_type, int(period))
+        for ma_type, periods in periods_by_type.items()
+        for period in sorted(set(periods))
+    ]
+    values = np.empty((len(rows) + extra_rows, len(close)), dtype=np.float64)
+    for i, (ma_type, period) in enumerate(rows):
+        values[i] = MA_FUNCTIONS[ma_type](close, timeperiod=period)
+    return values, [ma_column(ma_type, period) for ma_type, period in rows]
+
+
+def ma_bank_frame(
+    dataframe: DataFrame,
+    periods_by_type: dict[str, Iterable[int]],
+    volume_sma_period: int | None = None,
+) -> DataFrame:
+    """
+    以 DataFrame 形式返回均线库，索引与输入一致，可直接 concat 到原数据上
+
+    二维数组以转置视图传入，pandas 会把它保存为一个整块，不会逐列复制，
+    也不会产生逐列插入时的碎片化警告。
+
+    :param volume_sma_period: 指定时把成交量均线作为 volume_sma 列放进同一个块，
+                              每个交易对只需一次 concat
+    """
+    extra_rows = 0 if volume_sma_period is None else 1
+    values, columns = build_ma_bank(dataframe["close"].to_numpy(), periods_by_type, extra_rows)
+    if volume_sma_period is not None:
+        values[-1] = talib.SMA(
+            dataframe["volume"].to_numpy(dtype=np.float64), timeperiod=volume_sma_period
+        )
+        columns.append("volume_sma")
+    return DataFrame(values.T, index=dataframe.index, columns=columns, copy=False)
+
+
+def build_ema_bank(inputs: np.ndarray, spans: Iterable[int]) -> np.ndarray:
+    """
+    一次性计算多个输入序列在多个周期上的 EMA，写入同一个预先分配的二维数组
+
+    每一行仍由 TA-Lib 计算，结果与逐列调用 ta.EMA 完全相同；
+    省掉的是每次调用的 Series 包装、逐列插入 DataFrame 以及之后的块合并。
+    周期 1 的 EMA 就是输入本身，直接复制。
+
+    :param inputs: (输入数, K线) 数组，一维数组视为一个输入
+    :param spans: EMA 周期
+    :return: (输入数 × 周期数, K线) 数组，第 i 个输入、第 j 个周期在第 i * 周期数 + j 行
+    """
+    inputs = np.atleast_2d(np.asarray(inputs, dtype=np.float64))
+    spans = [int(span) for span in spans]
+    values = np.empty((len(inputs) * len(spans), inputs.shape[1]), dtype=np.float64)
+    for i, series in enumerate(inputs):
+        series = np.ascontiguousarray(series)
+        for j, span in enumerate(spans):
+            values[i * len(spans) + j] = series if span == 1 else talib.EMA(series, timeperiod=span)
+    return values
+
+
+def ema_bank_frame(
+    dataframe: DataFrame, sources: Iterable[str], spans: Iterable[int], columns: Iterable[str]
+) -> DataFrame:
+    """
+    以 DataFrame 形式返回 EMA 库（一个整块），索引与输入一致，可直接 concat 到原数据上
+
+    :param sources: 输入列
+    :param spans: EMA 周期
+    :param columns: 输出列名，与 build_ema_bank 的行一一对应（先按输入、再按周期）
+    """
+    inputs = np.stack([dataframe[source].to_numpy(dtype=np.float64) for source in sources])
+    values = build_ema_bank(inputs, spans)
+    return DataFrame(values.T, index=dataframe.index, columns=list(columns), copy=False)
+
+
+class CrossingIndex:
+    """
+    序列向上穿越各整数阈值的事件索引
+
+    与 qtpylib.crossed_above(series, 阈值) 的定义相同：当前值 > 阈值，且上一根 <= 阈值（与 NaN 的比较为 False）。
+    相邻两根K线 prev -> cur 向上穿越的是 [prev, cur) 中的所有整数阈值，因此一次遍历就能得到
+    [low, high] 中每个阈值的事件位置，按阈值分段存放（CSR 布局）。
+    查询某个阈值只是取一个切片，之后的信号计算只和事件数有关，而不是K线数。
+    """
+
+    def __init__(self, series: np.ndarray, low: int, high: int) -> None:
+        series = np.asarray(series, dtype=np.float64)
+        self.low, self.high = int(low), int(high)
+        prev, cur = series[:-1], series[1:]
+        rising = np.flatnonzero(cur > prev) + 1
+        # 穿越的阈值区间 [first, stop)，截到 [low, high] 内
+        first = np.maximum(np.ceil(series[rising - 1]), self.low).astype(np.int64)
+        stop = np.minimum(np.ceil(series[rising]), self.high + 1).astype(np.int64)
+        counts = np.maximum(stop - first, 0)
+
+        # 展开成 (阈值, 位置) 事件，再按阈值稳定排序（同一阈值内位置仍然递增）
+        positions = np.repeat(rising, counts)
+        starts = np.cumsum(counts) - counts
+        thresholds = np.repeat(first - starts, counts) + np.arange(counts.sum())
+        order = np.argsort(thresholds, kind="stable")
+        self.positions = positions[order]
+        self.offsets = np.searchsorted(
+            thresholds[order], np.arange(self.low, self.high + 2), side="left"
+        )
+
+    def above(self, threshold: int) -> np.ndarray:
+        """
+        向上穿越 threshold 的K线位置（递增）
+        """
+        i = int(threshold) - self.low
+        if int(threshold) != threshold or not 0 <= i <= self.high - self.low:
+            raise ValueError(f"threshold {threshold} is not an integer in [{self.low}, {self.high}]")
+        return self.positions[self.offsets[i]:self.offsets[i + 1]]
+
+
+def ma_cross_masks(
+    close: np.ndarray, fast_ma: np.ndarray, slow_ma: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    双均线策略中只依赖快慢线的部分
+
+    - 买入部分：金叉 & 收盘价 > 快线
+    - 卖出信号：死叉 | 收盘价 < 慢线
+
+    与 NaN 的比较结果为 False，和 pandas 相同。各参数沿最后一维（K线）计算，其余维度按 numpy 规则广播。
+
+    :return: (买入部分, 卖出信号)，布尔数组
+    """
+    shape = np.broadcast_shapes(np.shape(close), np.shape(fast_ma), np.shape(slow_ma))
+    enter = np.zeros(shape, dtype=bool)
+    exit_ = np.zeros(shape, dtype=bool)
+    if shape[-1] == 0:
+        return enter, exit_
+    buf = np.empty(shape, dtype=bool)
+
+    # 金叉：当前快线 > 慢线，且上一根快线 <= 慢线
+    np.greater(fast_ma, slow_ma, out=enter)
+    buf[..., 0] = False
+    np.less_equal(fast_ma[..., :-1], slow_ma[..., :-1], out=buf[..., 1:])
+    enter &= buf
+    np.greater(close, fast_ma, out=buf)
+    enter &= buf
+
+    # 死叉：当前快线 < 慢线，且上一根快线 >= 慢线；或收盘价跌破慢线
+    np.less(fast_ma, slow_ma, out=exit_)
+    buf[..., 0] = False
+    np.greater_equal(fast_ma[..., :-1], slow_ma[..., :-1], out=buf[..., 1:])
+    exit_ &= buf
+    np.less(close, slow_ma, out=buf)
+    exit_ |= buf
+    return enter, exit_
+
+
+def volume_mask(
+    volume: np.ndarray, volume_sma: np.ndarray, min_volume_multiplier: float | np.ndarray
+) -> np.ndarray:
+    """
+    成交量确认：成交量 > 成交量均线 * 倍数，且成交量 > 0
+    """
+    mask = np.greater(volume, volume_sma * min_volume_multiplier)
+    mask &= np.greater(volume, 0)
+    return mask
+
+
+def double_ma_signals(
+    close: np.ndarray,
+    volume: np.ndarray,
+    fast_ma: np.ndarray,
+    slow_ma: np.ndarray,
+    trend_filter: np.ndarray,
+    volume_sma: np.ndarray,
+    min_volume_multiplier: float | np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    双均线策略的信号内核
+
+    一次性生成买入/卖出信号，规则与 DoubleMAStrategy 原先的 pandas 写法完全一致：
+    - 买入：金叉 & 收盘价 > 快线 & 成交量 > 成交量均线 * 倍数 & 收盘价 > 趋势线 & 成交量 > 0
+    - 卖出：死叉 | 收盘价 < 慢线
+
+    各参数沿最后一维（K线）计算，其余维度按 numpy 规则广播，
+    因此可以一次算出多组参数的信号，例如快慢线为 (组合, 1, 1, K线)、
+    min_volume_multiplier 为 (1, 倍数, 1, 1) 数组（参数扫描时使用）。
+    均线、成交量、趋势三部分各自只在自己的形状上计算，最后再广播合并。
+
+    :return: (enter_long, exit_long)，int8 数组（0/1），形状为各参数广播后的形状
+    """
+    shape = np.broadcast_shapes(
+        np.shape(close), np.shape(volume), np.shape(fast_ma), np.shape(slow_ma),
+        np.shape(trend_filter), np.shape(volume_sma), np.shape(min_volume_multiplier),
+    )
+    ma_enter, ma_exit = ma_cross_masks(close, fast_ma, slow_ma)
+    enter = np.empty(shape, dtype=bool)
+    np.logical_and(ma_enter, volume_mask(volume, volume_sma, min_volume_multiplier), out=enter)
+    enter &= np.greater(close, trend_filter)
+    exit_ = np.empty(shape, dtype=bool)
+    exit_[...] = ma_exit
+
+    # bool 与 int8 内存布局相同，直接视图转换，无需复制
+    return enter.view(np.int8), exit_.view(np.int8)
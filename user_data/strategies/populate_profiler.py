@@ -0,0 +1,246 @@
+"""
+populate_* 方法的性能剖析
+
+记录每个 populate_* 阶段以及其中每个指标列的耗时、调用次数和（可选）内存分配，
+跨交易对、跨 epoch 累计，进程退出时输出 JSON 报告和折叠栈（collapsed stack）文件。
+折叠栈可以直接用 flamegraph.pl 或 speedscope 打开。
+
+按列统计的方式：剖析期间传给 populate_* 的 dataframe 换成记录列赋值的 DataFrame 子类
+（df["x"] = ... 和 df.loc[..., "x"] = ...），把上一次赋值之后到这次赋值结束的时间记到列 x 上，
+也就是"计算并写入 x 所用的时间"。最后一次赋值之后的时间（例如 return 前的 pd.concat）记到 <other> 上。
+只记录这个 dataframe 及由它派生（copy、切片、concat 等）的 DataFrame 上的赋值，不修改 pandas 本身；
+方法返回后结果转换回普通的 DataFrame。
+
+默认关闭，在配置文件中开启：
+
+    "populate_profile": {
+        "enabled": true,
+        "directory": "user_data/populate_profile",
+        "trace_allocations": false
+    }
+
+trace_allocations 为 true 时用 tracemalloc 记录每一段的内存峰值增量（peak_bytes），
+会让计算明显变慢，耗时数字只能做相对比较。
+"""
+import atexit
+import functools
+import json
+import logging
+import os
+import time
+import tracemalloc
+from collections import defaultdict
+from pathlib import Path
+
+from pandas import DataFrame
+
+
+logger = logging.getLogger(__name__)
+
+# 最后一次列赋值之后、方法返回之前的时间
+OTHER = "<other>"
+
+
+class _Segment:
+    """
+    一次 populate_* 调用中的计时状态
+    """
+
+    def __init__(self, profiler: "PopulateProfiler", strategy: str, phase: str) -> None:
+        self.profiler = profiler
+        self.strategy = strategy
+        self.phase = phase
+        self.started = self.last = time.perf_counter()
+        self.peak_bytes = 0
+        self._memory_base = self._reset_memory()
+
+    def _reset_memory(self) -> int:
+        if not self.profiler.trace_allocations:
+            return 0
+        tracemalloc.reset_peak()
+        return tracemalloc.get_traced_memory()[0]
+
+    def mark(self, column: str) -> None:
+        now = time.perf_counter()
+        peak = 0
+        if self.profiler.trace_allocations:
+            peak = max(tracemalloc.get_traced_memory()[1] - self._memory_base, 0)
+            self.peak_bytes = max(self.peak_bytes, peak)
+            self._memory_base = self._reset_memory()
+        self.profiler._add(self.profiler.columns[(self.strategy, self.phase, column)],
+                           now - self.last, peak)
+        # 记账本身的开销不计入下一列
+        self.last = time.perf_counter()
+
+
+def _column_label(key) -> str:
+    if isinstance(key, (list, tuple)):
+        return ",".join(map(str, key))
+    return str(key)
+
+
+def _record(label: str, assign, *args) -> None:
+    """
+    执行一次列赋值并记到当前剖析段的 label 列上；pandas 内部嵌套的赋值不重复记录
+    """
+    profiler = PopulateProfiler._instance
+    if profiler is None or not profiler._stack or profiler._assigning:
+        assign(*args)
+        return
+    profiler._assigning = True
+    try:
+        assign(*args)
+    finally:
+        profiler._assigning = False
+    profiler._stack[-1].mark(label)
+
+
+class _ProfiledLoc:
+    """
+    记录 df.loc[行, 列] = ... 的 .loc 索引器，其余操作原样转给 pandas 的索引器
+    """
+
+    def __init__(self, indexer) -> None:
+        self._indexer = indexer
+
+    def __getitem__(self, key):
+        return self._indexer[key]
+
+    def __setitem__(self, key, value) -> None:
+        if isinstance(key, tuple) and len(key) > 1:
+            _record(_column_label(key[1]), self._indexer.__setitem__, key, value)
+        else:
+            self._indexer[key] = value
+
+    def __call__(self, axis=None) -> "_ProfiledLoc":
+        return _ProfiledLoc(self._indexer(axis))
+
+    def __getattr__(self, name):
+        return getattr(self._indexer, name)
+
+
+class _ProfiledFrame(DataFrame):
+    """
+    记录列赋值的 DataFrame
+    """
+
+    @property
+    def _constructor(self):
+        return _ProfiledFrame
+
+    def __setitem__(self, key, value) -> None:
+        _record(_column_label(key), super().__setitem__, key, value)
+
+    @property
+    def loc(self) -> _ProfiledLoc:
+        return _ProfiledLoc(super().loc)
+
+
+class PopulateProfiler:
+    """
+    进程内的剖析结果累计器，同一进程中的所有策略实例共用一个
+    """
+
+    _instance: "PopulateProfiler | None" = None
+
+    def __init__(self, directory: Path, trace_allocations: bool = False) -> None:
+        self.directory = Path(directory)
+        self.trace_allocations = trace_allocations
+        # 键 -> [调用次数, 总耗时(秒), 最大内存峰值增量(字节)]
+        self.phases: dict[tuple[str, str], list] = defaultdict(lambda: [0, 0.0, 0])
+        self.columns: dict[tuple[str, str, str], list] = defaultdict(lambda: [0, 0.0, 0])
+        self._stack: list[_Segment] = []
+        # 正在执行一次被记录的列赋值
+        self._assigning = False
+        if trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        atexit.register(self.write)
+
+    @classmethod
+    def from_config(cls, config: dict) -> "PopulateProfiler | None":
+        """
+        按配置返回本进程的剖析器；未开启时返回 None
+        """
+        settings = config.get("populate_profile", {})
+        if not settings.get("enabled", False):
+            return None
+        if cls._instance is None:
+            directory = settings.get(
+                "directory", Path(config.get("user_data_dir", "user_data")) / "populate_profile"
+            )
+            cls._instance = cls(Path(directory), settings.get("trace_allocations", False))
+        return cls._instance
+
+    @staticmethod
+    def _add(entry: list, elapsed: float, peak_bytes: int) -> None:
+        entry[0] += 1
+        entry[1] += elapsed
+        entry[2] = max(entry[2], peak_bytes)
+
+    def call(self, strategy: str, phase: str, method, *args):
+        segment = _Segment(self, strategy, phase)
+        self._stack.append(segment)
+        try:
+            return method(*args)
+        finally:
+            segment.mark(OTHER)
+            self._stack.pop()
+            self._add(self.phases[(strategy, phase)], segment.last - segment.started,
+                      segment.peak_bytes)
+            # 外层调用不计入内层所用的时间
+            if self._stack:
+                self._stack[-1].last = time.perf_counter()
+
+    def report(self) -> dict:
+        """
+        {策略: {阶段: {calls, wall_ms, peak_bytes, columns: {列: {...}}}}}，列按总耗时降序
+        """
+        def entry(values: list) -> dict:
+            calls, wall, peak = values
+            return {"calls": calls, "wall_ms": round(wall * 1000, 3), "peak_bytes": peak}
+
+        result: dict = {}
+        for (strategy, phase), values in self.phases.items():
+            result.setdefault(strategy, {})[phase] = {**entry(values), "columns": {}}
+        for (strategy, phase, column), values in sorted(
+            self.columns.items(), key=lambda item: -item[1][1]
+        ):
+            result[strategy][phase]["columns"][column] = entry(values)
+        return result
+
+    def collapsed_stacks(self) -> list[str]:
+        """
+        折叠栈格式（"策略;阶段;列 微秒"），每行一个叶子节点
+        """
+        return [
+            f"{strategy};{phase};{column.replace(';', ',').replace(' ', '_')} "
+            f"{round(values[1] * 1e6)}"
+            for (strategy, phase, column), values in self.columns.items()
+        ]
+
+    def write(self) -> None:
+        if not self.phases:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # hyperopt 的每个工作进程各写一份，用 scripts/populate_profile_report.py 合并
+        stem = self.directory / f"populate-{os.getpid()}"
+        stem.with_suffix(".json").write_text(json.dumps(self.report(), indent=2))
+        stem.with_suffix(".folded").write_text("\n".join(self.collapsed_stacks()) + "\n")
+        logger.info(f"Populate profile written to {stem}.json / .folded")
+
+
+def profiled_populate(method):
+    """
+    剖析 populate_* 方法的装饰器，未开启 populate_profile 时直接调用原方法
+    """
+
+    @functools.wraps(method)
+    def wrapper(self, dataframe: DataFrame, metadata: dict) -> DataFrame:
+        profiler = PopulateProfiler.from_config(self.config)
+        if profiler is None:
+            return method(self, dataframe, metadata)
+        result = profiler.call(type(self).__name__, method.__name__, method, self,
+                               _ProfiledFrame(dataframe), metadata)
+        return DataFrame(result) if isinstance(result, _ProfiledFrame) else result
+
+    return wrapper
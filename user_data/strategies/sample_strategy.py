@@ -35,6 +35,13 @@ from freqtrade.strategy import (
 import talib.abstract as ta
 from technical import qtpylib
 
+import helper_paths  # noqa: F401
+from column_pruning import required_columns, wanted
+from indicator_kernels import CrossingIndex
+from populate_profiler import profiled_populate
+import shared_data
+from signal_cache import cached_populate, memoize
+
 
 # This class is a sample. Feel free to customize it.
 class SampleStrategy(IStrategy):
@@ -98,6 +105,17 @@ class SampleStrategy(IStrategy):
     short_rsi = IntParameter(low=51, high=100, default=70, space="sell", optimize=True, load=True)
     exit_short_rsi = IntParameter(low=1, high=50, default=30, space="buy", optimize=True, load=True)
 
+    # Indicator columns read by the entry/exit signals. With "indicator_pruning" enabled,
+    # backtesting and hyperopt compute only these (see column_pruning.py)
+    indicator_inputs = ("rsi", "tema", "bb_middleband")
+
+    # Signal parts that don't depend on any parameter, built once per pair and reused by every
+    # hyperopt epoch (see signal_cache.memoize)
+    signal_dependencies = {
+        "rsi_crossings": (),
+        "tema_guards": (),
+    }
+
     # Number of candles the strategy requires before producing valid signals
     startup_candle_count: int = 200
 
@@ -128,6 +146,39 @@ class SampleStrategy(IStrategy):
         },
     }
 
+    class HyperOpt:
+        # Runtime configuration and hyperopt pairlist, set in bot_start (generate_estimator
+        # only receives dimensions and random_state)
+        config: dict = {}
+        pairlist: list[str] | None = None
+
+        @staticmethod
+        def generate_estimator(dimensions: list, **kwargs):
+            """
+            freqtrade's default NSGAIIISampler; with "hyperopt_surrogate" enabled, the initial
+            points are pre-screened by a model trained on past epochs (see surrogate_screening.py)
+            """
+            config = SampleStrategy.HyperOpt.config
+            if not config.get("hyperopt_surrogate", {}).get("enabled", False):
+                return "NSGAIIISampler"
+            # user_data/hyperopts is on sys.path via helper_paths; the module needs scikit-learn,
+            # so it is only imported when screening is enabled
+            from surrogate_screening import surrogate_sampler
+            return surrogate_sampler(
+                SampleStrategy, dimensions, kwargs.get("random_state"), config,
+                pairlist=SampleStrategy.HyperOpt.pairlist,
+            )
+
+    def bot_start(self, **kwargs) -> None:
+        """
+        Remember the configuration and pairlist for HyperOpt.generate_estimator, and let hyperopt
+        epochs memory-map the preprocessed data instead of unpickling a copy (see shared_data.py)
+        """
+        self.HyperOpt.config = self.config
+        if self.dp.runmode.value == 'hyperopt':
+            self.HyperOpt.pairlist = self.dp.current_whitelist()
+        shared_data.install()
+
     def informative_pairs(self):
         """
         Define additional, informative pair/interval combinations to be cached from the exchange.
@@ -141,6 +192,45 @@ class SampleStrategy(IStrategy):
         """
         return []
 
+    def _rsi_crossings(self, dataframe: DataFrame, metadata: dict) -> CrossingIndex:
+        """
+        Candle positions where RSI crosses above each integer threshold any of the RSI
+        parameters can take, so a signal only has to check the guards on those candles
+        """
+        params = (self.buy_rsi, self.sell_rsi, self.short_rsi, self.exit_short_rsi)
+        return memoize(self, "rsi_crossings", dataframe, metadata, lambda: CrossingIndex(
+            dataframe["rsi"].to_numpy(dtype=np.float64),
+            min(param.low for param in params),
+            max(param.high for param in params),
+        ))
+
+    def _tema_guards(self, dataframe: DataFrame, metadata: dict) -> tuple[np.ndarray, np.ndarray]:
+        """
+        (rising, falling) guards shared by the signals, volume > 0 included:
+        - rising: tema below (or at) the BB middle band and rising
+        - falling: tema above the BB middle band and falling
+        """
+
+        def compute():
+            tema = dataframe["tema"].to_numpy(dtype=np.float64)
+            middle = dataframe["bb_middleband"].to_numpy(dtype=np.float64)
+            previous = np.r_[np.nan, tema[:-1]]
+            traded = dataframe["volume"].to_numpy() > 0
+            rising = (tema <= middle) & (tema > previous) & traded
+            falling = (tema > middle) & (tema < previous) & traded
+            return rising, falling
+
+        return memoize(self, "tema_guards", dataframe, metadata, compute)
+
+    @staticmethod
+    def _mark(dataframe: DataFrame, column: str, events: np.ndarray, guard: np.ndarray) -> None:
+        """
+        Set column to 1 on the event candles that pass the guard
+        """
+        dataframe.loc[dataframe.index[events[guard[events]]], column] = 1
+
+    @profiled_populate
+    @cached_populate
     def populate_indicators(self, dataframe: DataFrame, metadata: dict) -> DataFrame:
         """
         Adds several different TA indicators to the given DataFrame
@@ -153,11 +243,16 @@ class SampleStrategy(IStrategy):
         :return: a Dataframe with all mandatory indicators for the strategies
         """
 
+        # Indicators the signals don't read are skipped when "indicator_pruning" is enabled
+        # (see column_pruning.py); None means compute everything
+        required = required_columns(self, dataframe, metadata)
+
         # Momentum Indicators
         # ------------------------------------
 
         # ADX
-        dataframe["adx"] = ta.ADX(dataframe)
+        if wanted(required, "adx"):
+            dataframe["adx"] = ta.ADX(dataframe)
 
         # # Plus Directional Indicator / Movement
         # dataframe['plus_dm'] = ta.PLUS_DM(dataframe)
@@ -196,7 +291,8 @@ class SampleStrategy(IStrategy):
         # dataframe['cci'] = ta.CCI(dataframe)
 
         # RSI
-        dataframe["rsi"] = ta.RSI(dataframe)
+        if wanted(required, "rsi"):
+            dataframe["rsi"] = ta.RSI(dataframe)
 
         # # Inverse Fisher transform on RSI: values [-1.0, 1.0] (https://goo.gl/2JGGoy)
         # rsi = 0.1 * (dataframe['rsi'] - 50)
@@ -211,9 +307,10 @@ class SampleStrategy(IStrategy):
         # dataframe['slowk'] = stoch['slowk']
 
         # Stochastic Fast
-        stoch_fast = ta.STOCHF(dataframe)
-        dataframe["fastd"] = stoch_fast["fastd"]
-        dataframe["fastk"] = stoch_fast["fastk"]
+        if wanted(required, "fastd", "fastk"):
+            stoch_fast = ta.STOCHF(dataframe)
+            dataframe["fastd"] = stoch_fast["fastd"]
+            dataframe["fastk"] = stoch_fast["fastk"]
 
         # # Stochastic RSI
         # Please read https://github.com/freqtrade/freqtrade/issues/2961 before using this.
@@ -223,13 +320,15 @@ class SampleStrategy(IStrategy):
         # dataframe['fastk_rsi'] = stoch_rsi['fastk']
 
         # MACD
-        macd = ta.MACD(dataframe)
-        dataframe["macd"] = macd["macd"]
-        dataframe["macdsignal"] = macd["macdsignal"]
-        dataframe["macdhist"] = macd["macdhist"]
+        if wanted(required, "macd", "macdsignal", "macdhist"):
+            macd = ta.MACD(dataframe)
+            dataframe["macd"] = macd["macd"]
+            dataframe["macdsignal"] = macd["macdsignal"]
+            dataframe["macdhist"] = macd["macdhist"]
 
         # MFI
-        dataframe["mfi"] = ta.MFI(dataframe)
+        if wanted(required, "mfi"):
+            dataframe["mfi"] = ta.MFI(dataframe)
 
         # # ROC
         # dataframe['roc'] = ta.ROC(dataframe)
@@ -238,16 +337,22 @@ class SampleStrategy(IStrategy):
         # ------------------------------------
 
         # Bollinger Bands
-        bollinger = qtpylib.bollinger_bands(qtpylib.typical_price(dataframe), window=20, stds=2)
-        dataframe["bb_lowerband"] = bollinger["lower"]
-        dataframe["bb_middleband"] = bollinger["mid"]
-        dataframe["bb_upperband"] = bollinger["upper"]
-        dataframe["bb_percent"] = (dataframe["close"] - dataframe["bb_lowerband"]) / (
-            dataframe["bb_upperband"] - dataframe["bb_lowerband"]
-        )
-        dataframe["bb_width"] = (dataframe["bb_upperband"] - dataframe["bb_lowerband"]) / dataframe[
-            "bb_middleband"
-        ]
+        bb_columns = ("bb_lowerband", "bb_middleband", "bb_upperband", "bb_percent", "bb_width")
+        if wanted(required, *bb_columns):
+            bollinger = qtpylib.bollinger_bands(
+                qtpylib.typical_price(dataframe), window=20, stds=2
+            )
+            bands = {
+                "bb_lowerband": bollinger["lower"],
+                "bb_middleband": bollinger["mid"],
+                "bb_upperband": bollinger["upper"],
+                "bb_percent": (dataframe["close"] - bollinger["lower"])
+                / (bollinger["upper"] - bollinger["lower"]),
+                "bb_width": (bollinger["upper"] - bollinger["lower"]) / bollinger["mid"],
+            }
+            for column in bb_columns:
+                if wanted(required, column):
+                    dataframe[column] = bands[column]
 
         # Bollinger Bands - Weighted (EMA based instead of SMA)
         # weighted_bollinger = qtpylib.weighted_bollinger_bands(
@@ -282,17 +387,20 @@ class SampleStrategy(IStrategy):
         # dataframe['sma100'] = ta.SMA(dataframe, timeperiod=100)
 
         # Parabolic SAR
-        dataframe["sar"] = ta.SAR(dataframe)
+        if wanted(required, "sar"):
+            dataframe["sar"] = ta.SAR(dataframe)
 
         # TEMA - Triple Exponential Moving Average
-        dataframe["tema"] = ta.TEMA(dataframe, timeperiod=9)
+        if wanted(required, "tema"):
+            dataframe["tema"] = ta.TEMA(dataframe, timeperiod=9)
 
         # Cycle Indicator
         # ------------------------------------
         # Hilbert Transform Indicator - SineWave
-        hilbert = ta.HT_SINE(dataframe)
-        dataframe["htsine"] = hilbert["sine"]
-        dataframe["htleadsine"] = hilbert["leadsine"]
+        if wanted(required, "htsine", "htleadsine"):
+            hilbert = ta.HT_SINE(dataframe)
+            dataframe["htsine"] = hilbert["sine"]
+            dataframe["htleadsine"] = hilbert["leadsine"]
 
         # Pattern Recognition - Bullish candlestick patterns
         # ------------------------------------
@@ -361,6 +469,7 @@ class SampleStrategy(IStrategy):
 
         return dataframe
 
+    @profiled_populate
     def populate_entry_trend(self, dataframe: DataFrame, metadata: dict) -> DataFrame:
         """
         Based on TA indicators, populates the entry signal for the given dataframe
@@ -368,30 +477,18 @@ class SampleStrategy(IStrategy):
         :param metadata: Additional information, like the currently traded pair
         :return: DataFrame with entry columns populated
         """
-        dataframe.loc[
-            (
-                # Signal: RSI crosses above 30
-                (qtpylib.crossed_above(dataframe["rsi"], self.buy_rsi.value))
-                & (dataframe["tema"] <= dataframe["bb_middleband"])  # Guard: tema below BB middle
-                & (dataframe["tema"] > dataframe["tema"].shift(1))  # Guard: tema is raising
-                & (dataframe["volume"] > 0)  # Make sure Volume is not 0
-            ),
-            "enter_long",
-        ] = 1
-
-        dataframe.loc[
-            (
-                # Signal: RSI crosses above 70
-                (qtpylib.crossed_above(dataframe["rsi"], self.short_rsi.value))
-                & (dataframe["tema"] > dataframe["bb_middleband"])  # Guard: tema above BB middle
-                & (dataframe["tema"] < dataframe["tema"].shift(1))  # Guard: tema is falling
-                & (dataframe["volume"] > 0)  # Make sure Volume is not 0
-            ),
-            "enter_short",
-        ] = 1
+        crossings = self._rsi_crossings(dataframe, metadata)
+        rising, falling = self._tema_guards(dataframe, metadata)
+
+        # Signal: RSI crosses above 30; Guard: tema below BB middle and raising, volume not 0
+        self._mark(dataframe, "enter_long", crossings.above(self.buy_rsi.value), rising)
+
+        # Signal: RSI crosses above 70; Guard: tema above BB middle and falling, volume not 0
+        self._mark(dataframe, "enter_short", crossings.above(self.short_rsi.value), falling)
 
         return dataframe
 
+    @profiled_populate
     def populate_exit_trend(self, dataframe: DataFrame, metadata: dict) -> DataFrame:
         """
         Based on TA indicators, populates the exit signal for the given dataframe
@@ -399,28 +496,13 @@ class SampleStrategy(IStrategy):
         :param metadata: Additional information, like the currently traded pair
         :return: DataFrame with exit columns populated
         """
-        dataframe.loc[
-            (
-                # Signal: RSI crosses above 70
-                (qtpylib.crossed_above(dataframe["rsi"], self.sell_rsi.value))
-                & (dataframe["tema"] > dataframe["bb_middleband"])  # Guard: tema above BB middle
-                & (dataframe["tema"] < dataframe["tema"].shift(1))  # Guard: tema is falling
-                & (dataframe["volume"] > 0)  # Make sure Volume is not 0
-            ),
-            "exit_long",
-        ] = 1
-
-        dataframe.loc[
-            (
-                # Signal: RSI crosses above 30
-                (qtpylib.crossed_above(dataframe["rsi"], self.exit_short_rsi.value))
-                &
-                # Guard: tema below BB middle
-                (dataframe["tema"] <= dataframe["bb_middleband"])
-                & (dataframe["tema"] > dataframe["tema"].shift(1))  # Guard: tema is raising
-                & (dataframe["volume"] > 0)  # Make sure Volume is not 0
-            ),
-            "exit_short",
-        ] = 1
+        crossings = self._rsi_crossings(dataframe, metadata)
+        rising, falling = self._tema_guards(dataframe, metadata)
+
+        # Signal: RSI crosses above 70; Guard: tema above BB middle and falling, volume not 0
+        self._mark(dataframe, "exit_long", crossings.above(self.sell_rsi.value), falling)
+
+        # Signal: RSI crosses above 30; Guard: tema below BB middle and raising, volume not 0
+        self._mark(dataframe, "exit_short", crossings.above(self.exit_short_rsi.value), rising)
 
         return dataframe
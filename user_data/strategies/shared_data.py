@@ -0,0 +1,61 @@
+"""
+Hyperopt 工作进程共享预处理数据
+
+freqtrade hyperopt 计算完指标后把 {交易对: DataFrame} 用 joblib.dump 写到
+hyperopt_results/hyperopt_tickerdata.pkl，每个 epoch 再用 load(f, mmap_mode="r") 读回。
+但传给 joblib 的是已打开的文件对象，joblib 对文件对象会忽略 mmap_mode：
+每个工作进程的每个 epoch 都要把整个文件（5m、交易对多时几百 MB）反序列化成一份私有副本，
+耗时随文件大小增长，内存随工作进程数增长。
+
+本模块把 freqtrade.optimize.hyperopt.hyperopt_optimizer 中的 load 换成 mapped_load：
+按文件路径读取，数值列以 np.memmap 映射到文件上，只反序列化 DataFrame 的结构（几毫秒）。
+所有工作进程共享操作系统页缓存中的同一份数据，内存不随工作进程数增加。
+映射方式为 copy-on-write（mmap_mode="c"）：策略原地修改已有列时只复制被修改的页，
+不会写回文件，也不会影响其他进程和之后的 epoch，与原来读取私有副本的行为一致。
+
+策略在 bot_start 中调用 install()，-j 1（在主进程中回测）、distributed_hyperopt.py 的工作进程和
+walk_forward.py 由此生效；joblib 工作进程反序列化策略时会导入本模块（bot_start 引用了它），
+导入时即完成替换。只有 hyperopt 模块已被导入时才替换，实盘不受影响。
+"""
+import logging
+import sys
+from pathlib import Path
+
+import joblib
+
+
+logger = logging.getLogger(__name__)
+
+HYPEROPT_MODULE = "freqtrade.optimize.hyperopt.hyperopt_optimizer"
+
+
+def mapped_load(filename, mmap_mode=None, **kwargs):
+    """
+    joblib.load 的替代：传入文件对象并要求 mmap 时，改为按文件路径以 copy-on-write 方式映射
+    """
+    path = Path(getattr(filename, "name", ""))
+    if mmap_mode and hasattr(filename, "read") and path.is_file():
+        return joblib.load(path, mmap_mode="c", **kwargs)
+    return joblib.load(filename, mmap_mode=mmap_mode, **kwargs)
+
+
+def install() -> None:
+    """
+    让 hyperopt 的每个 epoch 以 mmap 方式读取预处理数据（hyperopt 模块未导入时什么也不做）
+    """
+    module = sys.modules.get(HYPEROPT_MODULE)
+    if module is None:
+        return
+    # 替换的是 freqtrade 的私有全局名，升级 freqtrade 后可能不存在
+    if not hasattr(module, "load"):
+        logger.warning("%s has no `load`, hyperopt data is not memory-mapped", HYPEROPT_MODULE)
+        return
+    # freqtrade 扫描策略目录时会再导入一份本模块，两份的 mapped_load 不是同一个对象
+    if getattr(module.load, "__module__", None) != __name__:
+        module.load = mapped_load
+        logger.info("Hyperopt data is memory-mapped: replaced %s.load with shared_data.mapped_load",
+                    HYPEROPT_MODULE)
+
+
+# joblib 工作进程中没有人调用 bot_start，在导入时替换
+install()
@@ -0,0 +1,323 @@
+"""
+指标/信号磁盘缓存
+
+同一份 feather 数据上反复跑 backtesting / hyperopt 时，相同参数的 populate_indicators 每次都会重新计算。
+本模块把它新增的列保存为 feather 文件，下次（包括重启之后）直接读取。
+
+只用于 populate_indicators：populate_entry_trend / populate_exit_trend 在 hyperopt 中每个 epoch 都会调用，
+本身只是几次数组比较，计算缓存键（数据指纹）和读写 feather 的开销反而更大（见 memoize）。
+
+缓存键由以下内容的哈希组成：
+- 策略类名和方法名
+- 所有可优化参数的当前值和取值范围
+- 交易对、时间周期
+- 输入K线（date/open/high/low/close/volume）的指纹
+- 策略目录下已加载的源文件内容（修改策略或指标代码后旧缓存自动失效）
+
+默认关闭，只在 backtesting / hyperopt 中生效，在配置文件中开启：
+
+    "signal_cache": {
+        "enabled": true,
+        "directory": "user_data/signal_cache",
+        "max_size_mb": 1024
+    }
+
+超过 max_size_mb 时按最近使用时间（文件 mtime）淘汰最旧的缓存。
+
+另外提供进程内的参数依赖记忆化（memoize）：策略声明每个中间结果依赖哪些参数，
+hyperopt 的每个 epoch 只重新计算依赖参数发生变化的部分。
+"""
+import atexit
+import functools
+import hashlib
+import logging
+import os
+import sys
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from column_pruning import required_columns
+
+
+logger = logging.getLogger(__name__)
+
+# 参与数据指纹的行情列
+FINGERPRINT_COLUMNS = ("date", "open", "high", "low", "close", "volume")
+
+# freqtrade 在调用 populate_entry_trend / populate_exit_trend 之前就会创建的列，
+# 策略改写这些列时也需要缓存
+SIGNAL_COLUMNS = ("enter_long", "enter_short", "exit_long", "exit_short", "enter_tag", "exit_tag")
+
+# 只在这些运行模式下启用（实盘数据每根K线都在变化，缓存没有意义）
+CACHE_RUNMODES = ("backtest", "hyperopt")
+
+# memoize 在每个进程中保存的数组总字节数上限（hyperopt 的每个工作进程各有一份）
+MEMO_MAX_BYTES = 256 * 1024 * 1024
+
+# (策略类名, 中间结果名, 键) -> (值, 字节数)，按最近使用排序。放在模块级别而不是策略实例上：
+# hyperopt 的并行任务每次都会重新反序列化策略对象，而本模块在工作进程中只导入一次
+_memos: OrderedDict[tuple, tuple] = OrderedDict()
+_memo_bytes = 0
+
+
+def _runmode(config: dict) -> str | None:
+    return getattr(config.get("runmode"), "value", config.get("runmode"))
+
+
+def data_fingerprint(dataframe: DataFrame) -> str:
+    """
+    K线数据的指纹：对 date 和 OHLCV 列的原始字节做哈希
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for column in FINGERPRINT_COLUMNS:
+        if column in dataframe.columns:
+            # .values 对带时区的 date 列返回 datetime64 数组（to_numpy 会返回对象数组）
+            digest.update(np.ascontiguousarray(dataframe[column].values).view(np.uint8))
+    return digest.hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def source_fingerprint(strategy_file: str) -> str:
+    """
+    策略源文件及同目录下已加载模块（indicator_kernels 等）的源文件指纹
+
+    freqtrade 加载策略时不会把策略模块放进 sys.modules，所以策略文件需要单独传入
+    """
+    strategy_file = Path(strategy_file).resolve()
+    digest = hashlib.blake2b(digest_size=16)
+    files = {strategy_file}
+    for module in list(sys.modules.values()):
+        file = getattr(module, "__file__", None)
+        if file and Path(file).resolve().parent == strategy_file.parent:
+            files.add(Path(file).resolve())
+    for file in sorted(files):
+        digest.update(file.name.encode())
+        digest.update(file.read_bytes())
+    return digest.hexdigest()
+
+
+def parameter_state(strategy) -> list[tuple]:
+    """
+    策略所有可优化参数的 (名称, 当前值, 取值范围)
+
+    取值范围也要参与缓存键：hyperopt 时 .range 返回整个搜索空间，
+    DoubleMAStrategy 等策略会据此一次性计算所有候选指标
+    """
+    return [
+        (name, repr(param.value), repr(list(param.range)))
+        for name, param in strategy.enumerate_parameters()
+    ]
+
+
+class SignalCache:
+    """
+    基于文件的 LRU 缓存，每个键对应目录下的一个 feather 文件
+
+    多个 hyperopt 进程可以共享同一个目录：写入先落到临时文件再原子替换，
+    命中时更新文件 mtime 作为最近使用时间。hits/misses 等计数只统计当前进程。
+    """
+
+    def __init__(self, directory: Path, max_bytes: int) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        # 目录总大小的估计值，超过上限时才重新扫描目录
+        self._size = sum(file.stat().st_size for file in self.directory.glob("*.feather"))
+
+    @classmethod
+    def from_config(cls, config: dict) -> "SignalCache | None":
+        """
+        按配置创建缓存；未开启或当前运行模式不适用时返回 None
+        """
+        settings = config.get("signal_cache", {})
+        if not settings.get("enabled", False) or _runmode(config) not in CACHE_RUNMODES:
+            return None
+        directory = settings.get(
+            "directory", Path(config.get("user_data_dir", "user_data")) / "signal_cache"
+        )
+        cache = cls(Path(directory), int(settings.get("max_size_mb", 1024) * 1024 * 1024))
+        atexit.register(cache.log_stats)
+        return cache
+
+    def key(self, *parts) -> str:
+        return hashlib.blake2b(repr(parts).encode(), digest_size=20).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.feather"
+
+    def get(self, key: str) -> DataFrame | None:
+        path = self._path(key)
+        try:
+            frame = pd.read_feather(path)
+            os.utime(path)
+        except (FileNotFoundError, OSError, ValueError):
+            # 文件不存在、正被其他进程淘汰或写了一半都按未命中处理
+            self.misses += 1
+            return None
+        self.hits += 1
+        return frame
+
+    def put(self, key: str, frame: DataFrame) -> None:
+        path = self._path(key)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        frame.reset_index(drop=True).to_feather(tmp)
+        os.replace(tmp, path)
+        self.writes += 1
+        self._size += path.stat().st_size
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def evict(self) -> None:
+        """
+        按 mtime 从旧到新删除缓存文件，直到总大小不超过上限
+        """
+        files = []
+        for file in self.directory.glob("*.feather"):
+            try:
+                stat = file.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, file))
+        files.sort()
+        self._size = sum(size for _, size, _ in files)
+        for _, size, file in files:
+            if self._size <= self.max_bytes:
+                break
+            file.unlink(missing_ok=True)
+            self._size -= size
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "evictions": self.evictions,
+            "size_mb": round(self._size / 1024 / 1024, 1),
+        }
+
+    def log_stats(self) -> None:
+        if self.hits or self.misses:
+            logger.info(f"Signal cache {self.directory}: {self.stats()}")
+
+
+def _strategy_cache(strategy) -> SignalCache | None:
+    """
+    每个策略实例第一次调用时按 strategy.config 创建缓存
+    """
+    if "_signal_cache" not in strategy.__dict__:
+        strategy._signal_cache = SignalCache.from_config(strategy.config)
+    return strategy._signal_cache
+
+
+def _sorted_or_none(columns):
+    return None if columns is None else sorted(columns)
+
+
+def cached_populate(method):
+    """
+    缓存 populate_indicators 结果的装饰器
+
+    只缓存方法新增的列和 SIGNAL_COLUMNS 中的信号列，命中时把它们重新拼回输入的 dataframe。
+    被装饰的方法除信号列外不应改写已有的列。
+    """
+
+    @functools.wraps(method)
+    def wrapper(self, dataframe: DataFrame, metadata: dict) -> DataFrame:
+        cache = _strategy_cache(self)
+        if cache is None:
+            return method(self, dataframe, metadata)
+
+        key = cache.key(
+            type(self).__name__,
+            method.__name__,
+            parameter_state(self),
+            metadata.get("pair"),
+            self.timeframe,
+            len(dataframe),
+            data_fingerprint(dataframe),
+            source_fingerprint(method.__code__.co_filename),
+            # 开启指标剪枝时，populate_* 的输出列取决于剪枝结果
+            _sorted_or_none(required_columns(self, dataframe, metadata)),
+        )
+        cached = cache.get(key)
+        if cached is not None:
+            cached.index = dataframe.index
+            existing = [column for column in cached.columns if column in dataframe.columns]
+            if existing:
+                dataframe[existing] = cached[existing]
+            added = cached.columns.difference(existing, sort=False)
+            if len(added) == 0:
+                return dataframe
+            return pd.concat([dataframe, cached[added]], axis=1)
+
+        before = set(dataframe.columns)
+        result = method(self, dataframe, metadata)
+        columns = [
+            column for column in result.columns
+            if column not in before or column in SIGNAL_COLUMNS
+        ]
+        cache.put(key, result[columns])
+        return result
+
+    return wrapper
+
+
+def memoize(strategy, name: str, dataframe: DataFrame, metadata: dict, compute):
+    """
+    按依赖参数的当前值记忆化中间结果
+
+    strategy.signal_dependencies[name] 声明该结果依赖的参数名，例如
+    {"trend_mask": ("trend_filter_period",)}；键由交易对、时间周期、数据的起止日期和长度、
+    以及这些参数的当前值组成，其他参数变化时直接复用。
+
+    compute 为无参函数，返回的数组会被保存，调用方不能原地修改返回值。
+    所有策略、所有中间结果共用一个按字节数计的 LRU（MEMO_MAX_BYTES）。
+    只在 backtesting / hyperopt 中生效，其余运行模式直接调用 compute。
+    """
+    if _runmode(strategy.config) not in CACHE_RUNMODES:
+        return compute()
+
+    dates = dataframe["date"].values
+    key = (
+        metadata.get("pair"),
+        strategy.timeframe,
+        len(dates),
+        dates[0] if len(dates) else None,
+        dates[-1] if len(dates) else None,
+        tuple(getattr(strategy, param).value for param in strategy.signal_dependencies[name]),
+    )
+    global _memo_bytes
+    key = (type(strategy).__name__, name, key)
+    if key in _memos:
+        _memos.move_to_end(key)
+        return _memos[key][0]
+    value = compute()
+    size = _nbytes(value)
+    _memos[key] = (value, size)
+    _memo_bytes += size
+    # 按最近使用淘汰，刚算出的结果总是保留
+    while _memo_bytes > MEMO_MAX_BYTES and len(_memos) > 1:
+        _memo_bytes -= _memos.popitem(last=False)[1][1]
+    return value
+
+
+def _nbytes(value) -> int:
+    """
+    记忆化结果占用的字节数：数组、数组的元组/列表，或属性为数组的对象（例如 CrossingIndex）
+    """
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (tuple, list)):
+        return sum(map(_nbytes, value))
+    if hasattr(value, "__dict__"):
+        return sum(map(_nbytes, vars(value).values()))
+    return sys.getsizeof(value)
@@ -0,0 +1,454 @@
+"""
+流式（增量）指标
+
+实盘/模拟盘中每根新K线只需更新最新一行：各指标保存自己的滚动状态，
+新K线到来时 O(1) 更新，不再对整个历史窗口重新计算。
+
+各状态类的递推公式与 TA-Lib 的实现保持一致（同样的累加顺序），
+因此 SMA/WMA 的结果与 TA-Lib 完全相同，滚动最高/最低价与 pandas rolling 完全相同；
+EMA、ATR 和 Heikin Ashi 因为状态会跨越 freqtrade 传入的滚动窗口持续累积，
+窗口开头附近的值会与"只看当前窗口"的批量计算略有不同，启动K线之后两者一致。
+"""
+import copy
+from abc import ABC, abstractmethod
+from collections import deque
+from math import nan
+
+import numpy as np
+from pandas import DataFrame
+
+
+class SMAState:
+    """
+    简单移动平均：环形缓冲区 + 滚动求和
+    """
+
+    def __init__(self, period: int) -> None:
+        self.period = period
+        self.reset()
+
+    def reset(self) -> None:
+        self._window: deque = deque(maxlen=self.period)
+        # 最近 period-1 个值之和（与 TA-Lib 的 periodTotal 一致）
+        self._total = 0.0
+
+    def update(self, value: float) -> float:
+        self._window.append(value)
+        if len(self._window) < self.period:
+            self._total += value
+            return nan
+        total = self._total + value
+        self._total = total - self._window[0]
+        return total / self.period
+
+
+class EMAState:
+    """
+    指数移动平均：以前 period 个值的 SMA 作为初值（TA-Lib 默认方式）
+    """
+
+    def __init__(self, period: int) -> None:
+        self.period = period
+        self.k = 2.0 / (period + 1)
+        self.reset()
+
+    def reset(self) -> None:
+        self._count = 0
+        self._seed_total = 0.0
+        self._value = nan
+
+    def update(self, value: float) -> float:
+        if self._count < self.period:
+            self._count += 1
+            self._seed_total += value
+            if self._count == self.period:
+                self._value = self._seed_total / self.period
+            return self._value
+        self._value = ((value - self._value) * self.k) + self._value
+        return self._value
+
+
+class WMAState:
+    """
+    加权移动平均：环形缓冲区 + 窗口和 + 加权和，新值权重为 period，最旧值权重为 1
+    """
+
+    def __init__(self, period: int) -> None:
+        self.period = period
+        self.divider = period * (period + 1) // 2
+        self.reset()
+
+    def reset(self) -> None:
+        self._window: deque = deque(maxlen=self.period)
+        self._period_sub = 0.0
+        self._period_sum = 0.0
+        self._trailing = 0.0
+
+    def update(self, value: float) -> float:
+        self._window.append(value)
+        if len(self._window) < self.period:
+            self._period_sub += value
+            self._period_sum += value * len(self._window)
+            return nan
+        self._period_sub += value
+        self._period_sub -= self._trailing
+        self._period_sum += value * self.period
+        self._trailing = self._window[0]
+        result = self._period_sum / self.divider
+        self._period_sum -= self._period_sub
+        return result
+
+
+class RollingMaxState:
+    """
+    滚动最高值：单调队列，队首为窗口内的最大值，每个值最多进出队列一次（均摊 O(1)）
+    """
+
+    def __init__(self, period: int) -> None:
+        self.period = period
+        self.reset()
+
+    def reset(self) -> None:
+        # (序号, 值)，值从队首到队尾单调不增
+        self._window: deque = deque()
+        self._index = 0
+
+    def _dominates(self, kept: float, value: float) -> bool:
+        return kept > value
+
+    def update(self, value: float) -> float:
+        window = self._window
+        while window and not self._dominates(window[-1][1], value):
+            window.pop()
+        window.append((self._index, value))
+        if window[0][0] <= self._index - self.period:
+            window.popleft()
+        self._index += 1
+        # 与 pandas rolling(period) 一样，窗口填满之前为 NaN
+        return window[0][1] if self._index >= self.period else nan
+
+
+class RollingMinState(RollingMaxState):
+    """
+    滚动最低值
+    """
+
+    def _dominates(self, kept: float, value: float) -> bool:
+        return kept < value
+
+
+class ShiftState:
+    """
+    延迟 periods 根K线输出，与 Series.shift(periods) 相同
+    """
+
+    def __init__(self, periods: int) -> None:
+        self.periods = periods
+        self.reset()
+
+    def reset(self) -> None:
+        self._window: deque = deque(maxlen=self.periods + 1)
+
+    def update(self, value: float) -> float:
+        self._window.append(value)
+        return self._window[0] if len(self._window) > self.periods else nan
+
+
+class HeikinAshiState:
+    """
+    Heikin Ashi K线：开盘价为上一根 HA K线开盘价和收盘价的均值，第一根为原始开盘价和收盘价的均值
+    （与 qtpylib.heikinashi 相同）
+    """
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self._open = nan
+        self._close = nan
+
+    def update(self, open_: float, high: float, low: float, close: float) -> tuple:
+        if self._open != self._open:
+            ha_open = (open_ + close) / 2
+        else:
+            ha_open = (self._open + self._close) / 2
+        ha_close = (open_ + high + low + close) / 4
+        self._open = ha_open
+        self._close = ha_close
+        return ha_open, max(high, ha_open, ha_close), min(low, ha_open, ha_close), ha_close
+
+
+class ATRState:
+    """
+    平均真实波幅：前 period 个真实波幅的 SMA 作为初值，之后 Wilder 平滑（与 TA-Lib 相同）。
+    第一根K线没有前收盘价，不计真实波幅
+    """
+
+    def __init__(self, period: int) -> None:
+        self.period = period
+        self.reset()
+
+    def reset(self) -> None:
+        self._prev_close = None
+        self._count = 0
+        self._total = 0.0
+        self._value = nan
+
+    def update(self, high: float, low: float, close: float) -> float:
+        prev_close = self._prev_close
+        self._prev_close = close
+        if prev_close is None:
+            return nan
+        true_range = max(high - low, abs(high - prev_close), abs(low - prev_close))
+        if self._count < self.period:
+            self._count += 1
+            self._total += true_range
+            if self._count == self.period:
+                self._value = self._total / self.period
+            return self._value
+        self._value = (self._value * (self.period - 1) + true_range) / self.period
+        return self._value
+
+
+class CrossState:
+    """
+    交叉检测：只保存上一根K线的两条线，规则与 qtpylib.crossed_above/below 相同
+    """
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self._prev_a = nan
+        self._prev_b = nan
+
+    def update(self, a: float, b: float) -> tuple[bool, bool]:
+        # 与 NaN 比较的结果均为 False，和 pandas 的行为一致
+        up = a > b and self._prev_a <= self._prev_b
+        down = a < b and self._prev_a >= self._prev_b
+        self._prev_a = a
+        self._prev_b = b
+        return up, down
+
+
+MA_STATES = {
+    "SMA": SMAState,
+    "EMA": EMAState,
+    "WMA": WMAState,
+}
+
+
+class IndicatorStream(ABC):
+    """
+    按K线日期对齐的流式计算基类
+
+    子类声明 inputs（读取的行情列）和 columns（输出列），并实现 reset()/update()。
+    process() 只对上次处理之后新增的K线调用 update()；如果传入的数据与已处理的
+    历史接不上（首次调用、数据缺口、重启等），会重置状态并从头重放一次。
+    还在形成中的最后一根K线在状态的副本上计算，不写入状态，已收盘的行不会被改动。
+    """
+
+    inputs: tuple[str, ...] = ()
+    columns: tuple[str, ...] = ()
+    bool_columns: tuple[str, ...] = ()
+
+    def __init__(self) -> None:
+        self._last_date = None
+        self._values = np.empty((0, len(self.columns)), dtype=np.float64)
+        self._size = 0
+        # 形成中K线的 (输入, 输出)，输入不变时直接复用
+        self._forming: tuple | None = None
+
+    @abstractmethod
+    def reset(self) -> None:
+        """
+        清空所有状态，回到第一根K线之前
+        """
+
+    @abstractmethod
+    def update(self, *values: float) -> tuple:
+        """
+        处理一根K线：参数依次为 inputs 各列的值，返回 columns 各列的值
+        """
+
+    def _resume_index(self, dates: np.ndarray) -> int | None:
+        """
+        返回第一根未处理K线的位置；历史接不上时返回 None
+        """
+        if self._last_date is None:
+            return None
+        pos = int(np.searchsorted(dates, self._last_date))
+        if pos >= len(dates) or dates[pos] != self._last_date or pos + 1 > self._size:
+            return None
+        return pos + 1
+
+    def _reserve(self, keep: int, extra: int) -> None:
+        """
+        保证缓冲区还能追加 extra 行，必要时只保留最近 keep 行并压缩到开头
+        """
+        if self._size + extra <= len(self._values):
+            return
+        values = np.empty((max(2 * (keep + extra), 64), len(self.columns)), dtype=np.float64)
+        values[:keep] = self._values[self._size - keep:self._size]
+        self._values = values
+        self._size = keep
+
+    def _provisional(self, values: tuple) -> tuple:
+        """
+        在状态的副本上计算形成中的K线，不改变已提交的状态
+        """
+        if self._forming is not None and self._forming[0] == values:
+            return self._forming[1]
+        saved = copy.deepcopy({key: value for key, value in self.__dict__.items() if key != "_values"})
+        row = self.update(*values)
+        self.__dict__.update(saved)
+        self._forming = (values, row)
+        return row
+
+    def process(self, dataframe: DataFrame, forming: bool = False) -> DataFrame:
+        """
+        增量处理 dataframe，返回与之对齐的输出列
+
+        :param forming: 最后一行是还在形成中的K线（交易所返回未收盘的K线时），
+                        每次调用都按它最新的价格重新计算
+        """
+        dates = dataframe["date"].values
+        n = len(dates)
+        closed = n - 1 if forming and n else n
+        start = self._resume_index(dates[:closed])
+        if start is None:
+            self.reset()
+            self._size = 0
+            start = 0
+            self._forming = None
+
+        self._reserve(keep=start, extra=n - start)
+        inputs = [dataframe[column].to_numpy(dtype=np.float64) for column in self.inputs]
+        for i in range(start, closed):
+            self._values[self._size] = self.update(*(column[i] for column in inputs))
+            self._size += 1
+        if closed > start:
+            self._forming = None
+        if closed:
+            self._last_date = dates[closed - 1]
+        if closed < n:
+            self._values[self._size] = self._provisional(tuple(column[-1] for column in inputs))
+
+        # 复制一份：缓冲区中形成中K线所在的行下次调用时会被改写
+        result = DataFrame(
+            self._values[self._size - closed:self._size - closed + n].copy(),
+            index=dataframe.index,
+            columns=list(self.columns),
+        )
+        # 逐列替换：astype({...}) 会把整个结果拆成单列再重新拼接
+        for column in self.bool_columns:
+            result[column] = result[column].astype(bool)
+        return result
+
+
+class DoubleMAStream(IndicatorStream):
+    """
+    DoubleMAStrategy 的流式指标：快线、慢线、趋势线、成交量均线、交叉信号和斜率
+    """
+
+    inputs = ("close", "volume")
+    columns = (
+        "fast_ma", "slow_ma", "trend_filter", "volume_sma",
+        "ma_cross_up", "ma_cross_down", "fast_ma_slope", "slow_ma_slope",
+    )
+    bool_columns = ("ma_cross_up", "ma_cross_down")
+
+    def __init__(self, ma_type: str, fast_period: int, slow_period: int, trend_period: int,
+                 volume_period: int = 20) -> None:
+        self.params = (ma_type, fast_period, slow_period, trend_period)
+        self.fast = MA_STATES[ma_type](fast_period)
+        self.slow = MA_STATES[ma_type](slow_period)
+        self.trend = EMAState(trend_period)
+        self.volume = SMAState(volume_period)
+        self.cross = CrossState()
+        super().__init__()
+
+    def reset(self) -> None:
+        for state in (self.fast, self.slow, self.trend, self.volume, self.cross):
+            state.reset()
+        self._prev_fast = nan
+        self._prev_slow = nan
+
+    def update(self, close: float, volume: float) -> tuple:
+        fast = self.fast.update(close)
+        slow = self.slow.update(close)
+        cross_up, cross_down = self.cross.update(fast, slow)
+        row = (
+            fast, slow, self.trend.update(close), self.volume.update(volume),
+            cross_up, cross_down, fast - self._prev_fast, slow - self._prev_slow,
+        )
+        self._prev_fast = fast
+        self._prev_slow = slow
+        return row
+
+
+class IchiV1Stream(IndicatorStream):
+    """
+    ichiV1 的流式指标：Heikin Ashi 开盘/最高/最低价、趋势扇面 EMA、扇面幅度、Ichimoku 各线和 ATR
+
+    与 ichiV1 的批量计算相同：Ichimoku 和 ATR 使用 Heikin Ashi 的最高/最低价和原始收盘价，
+    趋势扇面使用原始收盘价和 Heikin Ashi 开盘价。
+    chikou_span 是收盘价向过去平移，取决于之后的K线，不在这里计算。
+    """
+
+    inputs = ("open", "high", "low", "close")
+    bool_columns = ("cloud_green", "cloud_red")
+
+    def __init__(self, trend_spans: dict[str, int], conversion_line_period: int = 20,
+                 base_line_periods: int = 60, laggin_span: int = 120, displacement: int = 30,
+                 atr_period: int = 14) -> None:
+        self.trend_labels = tuple(trend_spans)
+        self.columns = (
+            "ha_open", "ha_high", "ha_low",
+            *(f"trend_{source}_{label}" for source in ("close", "open") for label in trend_spans),
+            "fan_magnitude", "fan_magnitude_gain",
+            "tenkan_sen", "kijun_sen", "senkou_a", "senkou_b",
+            "leading_senkou_span_a", "leading_senkou_span_b", "cloud_green", "cloud_red", "atr",
+        )
+        self.heikinashi = HeikinAshiState()
+        # 周期 1 即价格本身，不需要状态
+        self.trend_close = [EMAState(span) if span > 1 else None for span in trend_spans.values()]
+        self.trend_open = [EMAState(span) if span > 1 else None for span in trend_spans.values()]
+        self.fan_fast = self.trend_labels.index("1h")
+        self.fan_slow = self.trend_labels.index("8h")
+        self.high_low = [
+            (RollingMaxState(period), RollingMinState(period))
+            for period in (conversion_line_period, base_line_periods, laggin_span)
+        ]
+        self.senkou_a = ShiftState(displacement - 1)
+        self.senkou_b = ShiftState(displacement - 1)
+        self.atr = ATRState(atr_period)
+        super().__init__()
+
+    def reset(self) -> None:
+        states = [self.heikinashi, self.senkou_a, self.senkou_b, self.atr]
+        states += [state for state in self.trend_close + self.trend_open if state is not None]
+        states += [state for pair in self.high_low for state in pair]
+        for state in states:
+            state.reset()
+        self._prev_fan = nan
+
+    def update(self, open_: float, high: float, low: float, close: float) -> tuple:
+        ha_open, ha_high, ha_low, _ = self.heikinashi.update(open_, high, low, close)
+        trend_close = [state.update(close) if state is not None else close for state in self.trend_close]
+        trend_open = [state.update(ha_open) if state is not None else ha_open for state in self.trend_open]
+        fan = trend_close[self.fan_fast] / trend_close[self.fan_slow]
+        fan_gain = fan / self._prev_fan
+        self._prev_fan = fan
+
+        tenkan, kijun, leading_b = (
+            (highest.update(ha_high) + lowest.update(ha_low)) / 2 for highest, lowest in self.high_low
+        )
+        leading_a = (tenkan + kijun) / 2
+        senkou_a = self.senkou_a.update(leading_a)
+        senkou_b = self.senkou_b.update(leading_b)
+        return (
+            ha_open, ha_high, ha_low, *trend_close, *trend_open, fan, fan_gain,
+            tenkan, kijun, senkou_a, senkou_b, leading_a, leading_b,
+            senkou_a > senkou_b, senkou_b > senkou_a, self.atr.update(ha_high, ha_low, close),
+        )
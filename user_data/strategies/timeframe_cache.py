@@ -0,0 +1,185 @@
+"""
+多时间周期K线缓存
+
+由基础周期（例如 5m）的K线聚合出更大周期（15m、1h、8h ...）的 OHLCV，不需要额外向交易所请求
+informative 数据，也不必每次对整个历史 resample：
+- 每个交易对第一次调用时一次性聚合（np.*.reduceat，向量化）
+- 之后只聚合上次之后新增的基础K线，并与缓存中最后一根（可能还没走完的）大周期K线合并；
+  数据接不上（缺口、重启、换了时间范围）时重新聚合
+- 合并回基础周期时用"前向填充索引表"：每根基础K线对应收盘时间不晚于它收盘时间的最后一根大周期K线，
+  与 freqtrade merge_informative_pair(ffill=True) 一样不会用到未来数据；
+  基础K线有缺口时，大周期K线仍在它实际走完后的第一根基础K线上出现
+
+大周期K线按 UTC 整点对齐（时间戳整除周期长度，与交易所一致，例如 8h 为 0/8/16 点）。
+窗口开头不完整的大周期K线会被丢弃。成交量由增量累加得到，与一次性求和可能有浮点舍入上的差别。
+"""
+from typing import Iterable
+
+import numpy as np
+from pandas import DataFrame
+
+from freqtrade.exchange import timeframe_to_seconds
+
+
+OHLCV = ("open", "high", "low", "close", "volume")
+
+
+def _epoch_seconds(dates) -> np.ndarray:
+    """
+    K线日期（datetime64，可以带时区）-> 秒级时间戳
+    """
+    return np.asarray(dates, dtype="datetime64[s]").astype(np.int64)
+
+
+def aggregate(starts: np.ndarray, values: np.ndarray, seconds: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    把基础K线聚合成周期为 seconds 的K线
+
+    :param starts: 基础K线的开盘时间戳（秒，递增）
+    :param values: (K线, 5) 数组，列顺序为 OHLCV
+    :return: (大周期K线开盘时间戳, (大周期K线, 5) 数组)
+    """
+    buckets = starts - starts % seconds
+    if not len(buckets):
+        return buckets, values[:0].copy()
+    first = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    last = np.r_[first[1:], len(buckets)] - 1
+    result = np.empty((len(first), 5), dtype=np.float64)
+    result[:, 0] = values[first, 0]
+    result[:, 1] = np.maximum.reduceat(values[:, 1], first)
+    result[:, 2] = np.minimum.reduceat(values[:, 2], first)
+    result[:, 3] = values[last, 3]
+    result[:, 4] = np.add.reduceat(values[:, 4], first)
+    return buckets[first], result
+
+
+class _Candles:
+    """
+    一个交易对、一个周期的K线：开盘时间戳和 OHLCV，按需扩容
+    """
+
+    def __init__(self) -> None:
+        self.starts = np.empty(0, dtype=np.int64)
+        self.values = np.empty((0, 5), dtype=np.float64)
+        self.size = 0
+
+    def extend(self, starts: np.ndarray, values: np.ndarray) -> None:
+        if not len(starts):
+            return
+        if self.size and starts[0] == self.starts[self.size - 1]:
+            # 与最后一根（还没走完的）K线属于同一周期：合并
+            current = self.values[self.size - 1]
+            current[1] = max(current[1], values[0, 1])
+            current[2] = min(current[2], values[0, 2])
+            current[3] = values[0, 3]
+            current[4] += values[0, 4]
+            starts, values = starts[1:], values[1:]
+        needed = self.size + len(starts)
+        if needed > len(self.starts):
+            capacity = max(2 * needed, 64)
+            self.starts = np.resize(self.starts, capacity)
+            self.values = np.resize(self.values, (capacity, 5))
+        self.starts[self.size:needed] = starts
+        self.values[self.size:needed] = values
+        self.size = needed
+
+
+class TimeframeCache:
+    """
+    按交易对缓存由基础周期聚合出的大周期K线
+
+    :param base_timeframe: 基础周期，例如 "5m"
+    :param timeframes: 需要的大周期，必须是基础周期的整数倍
+    """
+
+    def __init__(self, base_timeframe: str, timeframes: Iterable[str]) -> None:
+        self.base_seconds = timeframe_to_seconds(base_timeframe)
+        self.seconds = {timeframe: timeframe_to_seconds(timeframe) for timeframe in timeframes}
+        for timeframe, seconds in self.seconds.items():
+            if seconds % self.base_seconds:
+                raise ValueError(f"{timeframe} is not a multiple of {base_timeframe}")
+        self._candles: dict[tuple[str, str], _Candles] = {}
+        # 每个交易对已聚合到的最后一根基础K线的开盘时间戳
+        self._last: dict[str, int] = {}
+        # 每个交易对重新聚合时的第一根基础K线的开盘时间戳，更早开盘的大周期K线不完整
+        self._first: dict[str, int] = {}
+
+    def update(self, pair: str, dataframe: DataFrame, forming: bool = False) -> None:
+        """
+        聚合 dataframe 中上次之后新增的基础K线
+
+        :param forming: 最后一行是还在形成中的K线，不参与聚合
+        """
+        starts = _epoch_seconds(dataframe["date"].values)
+        values = dataframe[list(OHLCV)].to_numpy(dtype=np.float64)
+        if forming:
+            starts, values = starts[:-1], values[:-1]
+        if not len(starts):
+            return
+
+        last = self._last.get(pair)
+        pos = len(starts) if last is None else int(np.searchsorted(starts, last))
+        rebuild = pos == len(starts) or starts[pos] != last
+        if rebuild:
+            # 第一次调用或接不上：丢弃该交易对的缓存，从头聚合
+            for timeframe in self.seconds:
+                self._candles[(pair, timeframe)] = _Candles()
+            self._first[pair] = int(starts[0])
+        else:
+            starts, values = starts[pos + 1:], values[pos + 1:]
+            if not len(starts):
+                return
+
+        first = self._first[pair]
+        for timeframe, seconds in self.seconds.items():
+            buckets, candles = aggregate(starts, values, seconds)
+            if len(buckets) and buckets[0] < first:
+                # 窗口开头的大周期K线缺少前面的基础K线，开盘价和最高/最低价都不完整；
+                # 之后的增量更新中它剩下的基础K线也不能再聚合成一根新的K线
+                buckets, candles = buckets[1:], candles[1:]
+            self._candles[(pair, timeframe)].extend(buckets, candles)
+        self._last[pair] = int(starts[-1])
+
+    def candles(self, pair: str, timeframe: str) -> DataFrame:
+        """
+        已聚合的大周期K线（最后一根可能还没走完），date 为开盘时间戳（秒）
+        """
+        candles = self._candles[(pair, timeframe)]
+        frame = DataFrame(candles.values[:candles.size].copy(), columns=list(OHLCV))
+        frame.insert(0, "date", candles.starts[:candles.size].copy())
+        return frame
+
+    def index_map(self, pair: str, timeframe: str, dates) -> np.ndarray:
+        """
+        前向填充索引表：每根基础K线收盘时已经走完的最后一根大周期K线的位置，没有时为 -1
+
+        只算已经聚合进来的基础K线：形成中的K线即使到了大周期的收盘时间，对应的大周期K线也还不算走完。
+        """
+        candles = self._candles[(pair, timeframe)]
+        closes = candles.starts[:candles.size] + self.seconds[timeframe]
+        bars = np.minimum(_epoch_seconds(dates), self._last[pair]) + self.base_seconds
+        return np.searchsorted(closes, bars, side="right") - 1
+
+    def merge(self, pair: str, dataframe: DataFrame, columns: Iterable[str] = OHLCV,
+              forming: bool = False) -> DataFrame:
+        """
+        更新缓存，返回与 dataframe 对齐的各周期K线列（列名为 <列>_<周期>，与 merge_informative_pair 相同）
+
+        :param forming: 最后一行是还在形成中的K线（见 update）
+        """
+        self.update(pair, dataframe, forming=forming)
+        columns = list(columns)
+        positions = [OHLCV.index(column) for column in columns]
+        dates = dataframe["date"].values
+        values = np.full((len(dates), len(self.seconds) * len(columns)), np.nan)
+        names = []
+        for i, timeframe in enumerate(self.seconds):
+            names += [f"{column}_{timeframe}" for column in columns]
+            candles = self._candles.get((pair, timeframe))
+            if candles is None or not candles.size:
+                continue
+            index = self.index_map(pair, timeframe, dates)
+            known = index >= 0
+            block = candles.values[index[known]][:, positions]
+            values[known, i * len(columns):(i + 1) * len(columns)] = block
+        return DataFrame(values, index=dataframe.index, columns=names, copy=False)
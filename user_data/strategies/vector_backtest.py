@@ -0,0 +1,490 @@
+"""
+向量化回测
+
+把 enter_long/exit_long 信号矩阵（每行一组参数）直接转换成交易，
+用于参数扫描、在完整回测之前快速筛掉明显不好的参数等需要大量评估的场景。
+
+撮合规则与 freqtrade 回测保持一致：
+- 第 i 根K线收盘产生的信号，在第 i+1 根K线开盘价成交
+- 同时有买入和卖出信号时不开仓；最后一根K线不开仓
+- 从开仓那根K线起，每根K线依次检查：卖出信号 -> 止损 -> minimal_roi -> 追踪止损；
+  止损和 ROI 用该K线的最高价/最低价判断（与 freqtrade 相同：先用最高价上移追踪止损，
+  再用最低价判断是否触发）
+- 每个交易对同一时间只持有一笔交易；各交易对互不影响，
+  即假设 max_open_trades 和可用资金都足够，不会因为仓位已满而拒绝信号
+- 回测结束时仍未平仓的交易，以最后一根K线的开盘价强制平仓（force_exit）
+
+未模拟：价格精度取整、custom_stoploss / custom_exit 等回调、仓位调整、timeframe_detail。
+"""
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from freqtrade.strategy import timeframe_to_minutes
+
+
+# 平仓原因（取值与 freqtrade 的 ExitType 相同），交易表中以下标存储
+EXIT_REASONS = ("exit_signal", "force_exit", "stop_loss", "roi", "trailing_stop_loss")
+EXIT_SIGNAL, FORCE_EXIT, STOP_LOSS, ROI, TRAILING_STOP_LOSS = range(len(EXIT_REASONS))
+
+
+class ExitRules:
+    """
+    平仓规则，各参数与策略中的同名属性含义相同
+
+    :param timeframe_minutes: K线周期（分钟），用于判断新的 ROI 档位是否恰好在开盘时生效
+    """
+
+    def __init__(
+        self,
+        timeframe_minutes: int,
+        minimal_roi: dict | None = None,
+        stoploss: float = -1.0,
+        trailing_stop: bool = False,
+        trailing_stop_positive: float | None = None,
+        trailing_stop_positive_offset: float = 0.0,
+        trailing_only_offset_is_reached: bool = False,
+        use_exit_signal: bool = True,
+        exit_profit_only: bool = False,
+        exit_profit_offset: float = 0.0,
+        ignore_roi_if_entry_signal: bool = False,
+    ) -> None:
+        self.timeframe_minutes = timeframe_minutes
+        roi = sorted((int(k), float(v)) for k, v in (minimal_roi or {}).items())
+        self.roi_minutes = np.array([k for k, _ in roi], dtype=np.int64)
+        self.roi_values = np.array([v for _, v in roi], dtype=np.float64)
+        self.stoploss = abs(stoploss)
+        self.trailing_stop = trailing_stop
+        self.trailing_stop_positive = trailing_stop_positive
+        self.trailing_stop_positive_offset = trailing_stop_positive_offset or 0.0
+        self.trailing_only_offset_is_reached = trailing_only_offset_is_reached
+        self.use_exit_signal = use_exit_signal
+        self.exit_profit_only = exit_profit_only
+        self.exit_profit_offset = exit_profit_offset
+        self.ignore_roi_if_entry_signal = ignore_roi_if_entry_signal
+
+    @classmethod
+    def from_strategy(cls, strategy, params: dict | None = None) -> "ExitRules":
+        """
+        从策略类（或实例）的属性构造
+
+        :param params: 参数文件（如 DoubleMAStrategy.json）中的 "params" 部分，
+                       其中的 roi / stoploss / trailing 会覆盖策略中的默认值
+        """
+        params = params or {}
+        trailing = params.get("trailing", {})
+
+        def trailing_value(name, default):
+            return trailing.get(name, getattr(strategy, name, default))
+
+        return cls(
+            timeframe_minutes=timeframe_to_minutes(strategy.timeframe),
+            minimal_roi=params.get("roi", strategy.minimal_roi),
+            stoploss=params.get("stoploss", {}).get("stoploss", strategy.stoploss),
+            trailing_stop=trailing_value("trailing_stop", False),
+            trailing_stop_positive=trailing_value("trailing_stop_positive", None),
+            trailing_stop_positive_offset=trailing_value("trailing_stop_positive_offset", 0.0),
+            trailing_only_offset_is_reached=trailing_value("trailing_only_offset_is_reached", False),
+            use_exit_signal=getattr(strategy, "use_exit_signal", True),
+            exit_profit_only=getattr(strategy, "exit_profit_only", False),
+            exit_profit_offset=getattr(strategy, "exit_profit_offset", 0.0),
+            ignore_roi_if_entry_signal=getattr(strategy, "ignore_roi_if_entry_signal", False),
+        )
+
+
+def next_true_index(mask: np.ndarray) -> np.ndarray:
+    """
+    (行 × K线) 布尔矩阵中，每个位置及其之后第一个 True 所在的列号
+
+    :return: (行 × (K线 + 1)) int32 数组，找不到时为 K线数量；
+             多出的最后一列同样为 K线数量，便于用越界位置查询
+    """
+    rows, n = mask.shape
+    index = np.full((rows, n + 1), n, dtype=np.int32)
+    np.copyto(index[:, :n], np.arange(n, dtype=np.int32), where=mask)
+    # 从右向左取累计最小值
+    np.minimum.accumulate(index[:, ::-1], axis=1, out=index[:, ::-1])
+    return index
+
+
+def _entry_index(enter: np.ndarray, exit_: np.ndarray, start: int) -> np.ndarray:
+    """
+    可开仓信号的 next_true_index
+    """
+    n = enter.shape[1]
+    can_enter = enter & ~exit_
+    # 信号在下一根K线成交：start 之前的信号、以及会在最后一根K线成交的信号都无效
+    can_enter[:, :start] = False
+    can_enter[:, max(n - 2, 0):] = False
+    return next_true_index(can_enter)
+
+
+def _stack(parts: list, dtype) -> np.ndarray:
+    return np.concatenate(parts).astype(dtype) if parts else np.empty(0, dtype=dtype)
+
+
+def signal_trades(
+    enter: np.ndarray, exit_: np.ndarray, start: int = 0
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    只按信号撮合交易（不含 ROI/止损），所有行（参数组合）同时推进
+
+    每一轮为每个仍可开仓的行找到下一笔交易：下一个可开仓信号 -> 之后第一个卖出信号。
+    循环次数等于单行最多的交易笔数，与行数无关。
+
+    :param enter: (行 × K线) 买入信号
+    :param exit_: (行 × K线) 卖出信号
+    :param start: 回测区间的第一根K线（之前为启动K线，只用于计算指标）。
+                  与 freqtrade 相同，区间第一根K线的信号在下一根成交
+    :return: (rows, entry_idx, exit_idx)：交易所属的行、开仓K线、平仓K线（均为K线位置）
+    """
+    enter = np.asarray(enter, dtype=bool)
+    exit_ = np.asarray(exit_, dtype=bool)
+    rows, n = enter.shape
+    next_enter = _entry_index(enter, exit_, start)
+    next_exit = next_true_index(exit_)
+
+    trade_rows, entries, exits = [], [], []
+    active = np.arange(rows)
+    pos = np.zeros(rows, dtype=np.int64)
+    while len(active):
+        signal = next_enter[active, pos]
+        found = signal < n
+        active = active[found]
+        entry = signal[found] + 1
+        # 开仓K线上检查的是开仓信号那根K线的卖出信号（此时必为 False），从开仓K线起找卖出信号
+        exit_signal = next_exit[active, entry]
+        trade_rows.append(active)
+        entries.append(entry)
+        exits.append(np.minimum(exit_signal + 1, n - 1))
+        pos = exit_signal + 1
+        still = pos < n
+        active = active[still]
+        pos = pos[still]
+
+    return _stack(trade_rows, np.int64), _stack(entries, np.int64), _stack(exits, np.int64)
+
+
+def signal_exit_reasons(exit_: np.ndarray, rows: np.ndarray, exit_idx: np.ndarray) -> np.ndarray:
+    """
+    signal_trades 结果的平仓原因：平仓K线前一根有卖出信号即为信号平仓，否则是强制平仓
+    """
+    by_signal = np.asarray(exit_, dtype=bool)[rows, exit_idx - 1]
+    return np.where(by_signal, EXIT_SIGNAL, FORCE_EXIT).astype(np.int8)
+
+
+def rule_trades(
+    enter: np.ndarray,
+    exit_: np.ndarray,
+    dates: np.ndarray,
+    open_: np.ndarray,
+    high: np.ndarray,
+    low: np.ndarray,
+    rules: ExitRules,
+    fee: float,
+    start: int = 0,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    按信号开仓，按 rules 中的卖出信号、minimal_roi、stoploss、trailing_stop 平仓
+
+    与 signal_trades 一样所有行同时推进。每一轮对本轮开出的全部交易，
+    在开仓之后的一段K线窗口上一次性算出止损线（最高价的累计最大值）、ROI 阈值和卖出信号，
+    取第一个触发的位置；窗口内没有平仓的交易带着止损线进入下一个（加倍的）窗口。
+
+    :param dates: K线开盘时间（UTC 的 datetime64[ns]）
+    :param fee: 单边手续费率（ROI、追踪止损 offset 都按扣除手续费后的利润率判断）
+    :return: (rows, entry_idx, exit_idx, close_rate, exit_reason)
+    """
+    enter = np.asarray(enter, dtype=bool)
+    exit_ = np.asarray(exit_, dtype=bool)
+    rows, n = enter.shape
+    next_enter = _entry_index(enter, exit_, start)
+    # 第 k 根K线检查第 k-1 根的信号：有卖出信号且没有买入信号
+    signal_exit = exit_ & ~enter if rules.use_exit_signal else np.zeros_like(exit_)
+    candles = (
+        np.asarray(dates).astype("datetime64[m]").astype(np.int64),
+        np.asarray(open_, dtype=np.float64),
+        np.asarray(high, dtype=np.float64),
+        np.asarray(low, dtype=np.float64),
+    )
+
+    trade_rows, entries, exits, close_rates, reasons = [], [], [], [], []
+    active = np.arange(rows)
+    pos = np.zeros(rows, dtype=np.int64)
+    while len(active):
+        signal = next_enter[active, pos]
+        found = signal < n
+        active = active[found]
+        entry = signal[found].astype(np.int64) + 1
+        exit_idx, close_rate, reason = _resolve_exits(
+            active, entry, enter, signal_exit, candles, rules, fee,
+        )
+        trade_rows.append(active)
+        entries.append(entry)
+        exits.append(exit_idx)
+        close_rates.append(close_rate)
+        reasons.append(reason)
+        # 平仓那根K线上不会再开仓，从它的信号开始找下一笔
+        pos = exit_idx
+        still = pos < n - 1
+        active = active[still]
+        pos = pos[still]
+
+    return (
+        _stack(trade_rows, np.int64), _stack(entries, np.int64), _stack(exits, np.int64),
+        _stack(close_rates, np.float64), _stack(reasons, np.int8),
+    )
+
+
+def _resolve_exits(
+    rows: np.ndarray,
+    entry: np.ndarray,
+    enter: np.ndarray,
+    signal_exit: np.ndarray,
+    candles: tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray],
+    rules: ExitRules,
+    fee: float,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    为一批同时开出的交易找到平仓K线、平仓价和平仓原因
+    """
+    minutes, open_, high, low = candles
+    n = len(open_)
+    count = len(entry)
+    open_rate = open_[entry]
+    # 利润率 = 价格 / cost - 1，cost 为扣除双边手续费后的保本价
+    cost = open_rate * (1 + fee) / (1 - fee)
+    initial_stop = open_rate * (1 - rules.stoploss)
+    positive = rules.trailing_stop_positive
+    offset_profit = rules.trailing_stop_positive_offset
+
+    exit_idx = np.full(count, n - 1, dtype=np.int64)
+    close_rate = np.full(count, open_[n - 1])
+    reason = np.full(count, FORCE_EXIT, dtype=np.int8)
+
+    pending = np.arange(count)
+    stop = initial_stop.copy()
+    offset, width = 0, 32
+    while len(pending):
+        k = entry[pending, None] + offset + np.arange(width)
+        inside = k < n
+        k = np.minimum(k, n - 1)
+        o, h, lo = open_[k], high[k], low[k]
+        p_cost = cost[pending, None]
+        p_rows = rows[pending, None]
+        duration = minutes[k] - minutes[entry[pending], None]
+
+        # 止损线：每根K线先按最高价上移（追踪止损），然后用最低价判断是否触发
+        stop_pct = np.full(h.shape, rules.stoploss)
+        if rules.trailing_stop:
+            best_profit = h / p_cost - 1
+            if positive is not None:
+                stop_pct[best_profit > offset_profit] = abs(positive)
+            candidate = h * (1 - stop_pct)
+            if rules.trailing_only_offset_is_reached:
+                candidate[best_profit < offset_profit] = -np.inf
+            candidate[:, 0] = np.maximum(candidate[:, 0], stop[pending])
+            stop_path = np.maximum.accumulate(candidate, axis=1)
+        else:
+            stop_path = np.repeat(stop[pending, None], width, axis=1)
+        prev_stop = np.empty_like(stop_path)
+        prev_stop[:, 0] = stop[pending]
+        prev_stop[:, 1:] = stop_path[:, :-1]
+        stop_hit = stop_path >= lo
+        # 上一根的止损线已经不低于最低价时不会再上移，按原止损线触发
+        used_stop = np.where(prev_stop >= lo, prev_stop, stop_path)
+        trailing = used_stop > initial_stop[pending, None]
+
+        # minimal_roi：按持仓时间取当前档位，用最高价判断
+        roi_slot = np.searchsorted(rules.roi_minutes, duration, side="right") - 1
+        has_roi = roi_slot >= 0
+        if len(rules.roi_values):
+            roi = np.where(has_roi, rules.roi_values[np.maximum(roi_slot, 0)], np.nan)
+        else:
+            roi = np.full(h.shape, np.nan)
+        roi_hit = has_roi & (h / p_cost - 1 > roi)
+        if rules.ignore_roi_if_entry_signal:
+            roi_hit &= ~enter[p_rows, k - 1]
+
+        sig_hit = signal_exit[p_rows, k - 1]
+        if rules.exit_profit_only:
+            sig_hit &= o / p_cost - 1 > rules.exit_profit_offset
+
+        hit = (sig_hit | stop_hit | roi_hit) & inside
+        found = hit.any(axis=1)
+        r = np.flatnonzero(found)
+        j = hit[r].argmax(axis=1)
+        done = pending[r]
+        o_at, h_at, lo_at = o[r, j], h[r, j], lo[r, j]
+        exit_idx[done] = k[r, j]
+
+        # freqtrade 的顺序：卖出信号 -> 止损 -> ROI -> 追踪止损
+        stop_at = stop_hit[r, j]
+        trailing_at = trailing[r, j]
+        code = np.select(
+            [sig_hit[r, j], stop_at & ~trailing_at, roi_hit[r, j], stop_at & trailing_at],
+            [EXIT_SIGNAL, STOP_LOSS, ROI, TRAILING_STOP_LOSS],
+        ).astype(np.int8)
+        reason[done] = code
+
+        # 止损价：止损线高于整根K线时按开盘价；开仓当根触发追踪止损时按最不利的价格
+        stop_rate = used_stop[r, j]
+        gap = stop_rate > h_at
+        same_candle = (duration[r, j] == 0) & ~gap & (code == TRAILING_STOP_LOSS)
+        if rules.trailing_only_offset_is_reached and offset_profit and positive:
+            worst = o_at * (1 + abs(offset_profit) - abs(positive))
+        else:
+            worst = o_at * (1 - stop_pct[r, j])
+        stop_rate = np.where(gap, o_at, np.where(same_candle, np.maximum(lo_at, worst), stop_rate))
+
+        # ROI 价：恰好达到目标利润的价格并限制在K线范围内；
+        # 新档位在开盘时生效且开盘价已经更高时按开盘价
+        roi_at = roi[r, j]
+        roi_entry = rules.roi_minutes[np.maximum(roi_slot[r, j], 0)] if len(rules.roi_minutes) else 0
+        on_open = roi_entry % rules.timeframe_minutes == 0
+        roi_rate = open_rate[done] * (roi_at + 1 + fee) / (1 - fee)
+        dur_at = duration[r, j]
+        new_slot = (dur_at > 0) & (dur_at == roi_entry) & on_open & (o_at > roi_rate)
+        roi_rate = np.where(new_slot | ((roi_at == -1) & on_open), o_at,
+                            np.minimum(np.maximum(roi_rate, lo_at), h_at))
+
+        close_rate[done] = np.select(
+            [code == EXIT_SIGNAL, code == ROI], [o_at, roi_rate], stop_rate,
+        )
+
+        # 窗口内未平仓：已到最后一根K线的保持强制平仓，其余带着止损线进入下一个窗口
+        carry = ~found & (k[:, -1] < n - 1)
+        stop[pending[carry]] = stop_path[carry, -1]
+        pending = pending[carry]
+        offset += width
+        width = min(width * 2, 4096)
+
+    return exit_idx, close_rate, reason
+
+
+def trade_table(
+    pair: str,
+    dates: np.ndarray,
+    open_: np.ndarray,
+    rows: np.ndarray,
+    entry_idx: np.ndarray,
+    exit_idx: np.ndarray,
+    exit_reason: np.ndarray,
+    fee: float,
+    close_rate: np.ndarray | None = None,
+) -> dict[str, np.ndarray]:
+    """
+    把撮合结果整理成按列存放的交易表（numpy 数组字典）
+
+    :param dates: K线开盘时间（UTC 的 datetime64[ns]，即 dataframe["date"].values）
+    :param open_: 开盘价
+    :param exit_reason: 平仓原因（EXIT_REASONS 的下标）
+    :param fee: 单边手续费率
+    :param close_rate: 平仓价；不指定时为平仓K线的开盘价（只按信号撮合时）
+    """
+    open_rate = open_[entry_idx]
+    if close_rate is None:
+        close_rate = open_[exit_idx]
+    return {
+        "row": rows,
+        "pair": np.full(len(rows), pair, dtype=object),
+        "open_date": dates[entry_idx],
+        "close_date": dates[exit_idx],
+        "open_rate": open_rate,
+        "close_rate": close_rate,
+        "profit_ratio": close_rate * (1 - fee) / (open_rate * (1 + fee)) - 1,
+        "exit_reason": np.asarray(exit_reason, dtype=np.int8),
+    }
+
+
+def concat_trade_tables(tables: list[dict[str, np.ndarray]]) -> dict[str, np.ndarray]:
+    """
+    合并多个交易对的交易表，并按 (行, 平仓时间, 交易对) 排序
+
+    没有交易表时返回各列都为空的交易表
+    """
+    if not tables:
+        empty = np.empty(0, dtype=np.int64)
+        return trade_table("", np.empty(0, dtype="datetime64[ns]"), np.empty(0), empty, empty, empty,
+                           empty, fee=0.0)
+    table = {key: np.concatenate([t[key] for t in tables]) for key in tables[0]}
+    order = np.lexsort((table["pair"], table["close_date"], table["row"]))
+    return {key: values[order] for key, values in table.items()}
+
+
+def split_by_row(table: dict[str, np.ndarray], rows: int) -> np.ndarray:
+    """
+    已按行排序的交易表中，每一行交易的起止位置
+
+    :return: 长度为 rows + 1 的数组，第 r 行的交易位于 [bounds[r], bounds[r + 1])
+    """
+    return np.searchsorted(table["row"], np.arange(rows + 1))
+
+
+def results_frame(
+    table: dict[str, np.ndarray], stake_amount: float, fee: float,
+    start: int = 0, stop: int | None = None,
+) -> DataFrame:
+    """
+    把交易表（或其中 [start, stop) 一段）转换成 freqtrade 回测 results 格式的 DataFrame
+
+    只包含 IHyperOptLoss 常用的列：pair、open_date、close_date、open_rate、close_rate、
+    fee_open、fee_close、trade_duration（分钟）、profit_ratio、profit_abs、exit_reason、is_short
+    """
+    part = {key: values[start:stop] for key, values in table.items()}
+    open_date = pd.DatetimeIndex(part["open_date"], tz="UTC")
+    close_date = pd.DatetimeIndex(part["close_date"], tz="UTC")
+    duration = (part["close_date"] - part["open_date"]).astype("timedelta64[m]").astype(np.int64)
+    profit_ratio = part["profit_ratio"]
+    return DataFrame({
+        "pair": part["pair"],
+        "open_date": open_date,
+        "close_date": close_date,
+        "open_rate": part["open_rate"],
+        "close_rate": part["close_rate"],
+        "fee_open": fee,
+        "fee_close": fee,
+        "trade_duration": duration,
+        "profit_ratio": profit_ratio,
+        # 开仓价值 = 投入金额 * (1 + 手续费)
+        "profit_abs": profit_ratio * stake_amount * (1 + fee),
+        "exit_reason": np.asarray(EXIT_REASONS, dtype=object)[part["exit_reason"].astype(np.int64)],
+        "is_short": False,
+    })
+
+
+def backtest_frames(
+    processed: dict[str, DataFrame],
+    rules: ExitRules,
+    fee: float,
+    stake_amount: float,
+    start_date=None,
+) -> DataFrame:
+    """
+    对已生成信号的 DataFrame（含 date/open/high/low/enter_long/exit_long）做快速回测
+
+    :param processed: {交易对: DataFrame}，例如 strategy.ft_advise_signals 的结果
+    :param start_date: 回测区间开始时间，之前的K线只用于指标预热；不指定时从第一根开始
+    :return: freqtrade 回测 results 格式的 DataFrame，可直接传给 IHyperOptLoss
+    """
+    start_ts = None
+    if start_date is not None:
+        start_ts = pd.Timestamp(start_date)
+        if start_ts.tzinfo is not None:
+            start_ts = start_ts.tz_convert("UTC").tz_localize(None)
+
+    tables = []
+    for pair, df in processed.items():
+        dates = df["date"].values
+        start = 0 if start_ts is None else int(np.searchsorted(dates, start_ts.to_datetime64()))
+        open_ = df["open"].to_numpy(dtype=np.float64)
+        enter = df["enter_long"].to_numpy(dtype=np.float64, na_value=0)[None, :] == 1
+        exit_ = df["exit_long"].to_numpy(dtype=np.float64, na_value=0)[None, :] == 1
+        rows, entry_idx, exit_idx, close_rate, reason = rule_trades(
+            enter, exit_, dates, open_, df["high"].to_numpy(), df["low"].to_numpy(),
+            rules, fee, start,
+        )
+        tables.append(trade_table(pair, dates, open_, rows, entry_idx, exit_idx, reason, fee,
+                                  close_rate))
+    table = concat_trade_tables(tables)
+    return results_frame(table, stake_amount, fee)